@@ -0,0 +1,81 @@
+"""
+    Benchmarks of :class:`gdshortener.GDAliasAllocator` over the in-process fake transport, without any network access.
+
+    Stems are made crowded by aliases taken beforehand, then the same allocations run with an empty index (cold) and
+    with an index that already knows the taken aliases (warm, e.g. loaded from a previous run). Every run reports the
+    allocation throughput, the requests per allocation and the collision rate::
+
+        python -m benchmarks.alias_benchmarks --allocations 5000 --taken 20 --workers 8
+"""
+
+import argparse
+import sys
+import time
+
+import gdshortener
+
+_SHORTENER_URL_ = 'https://is.gd'
+
+
+def _crowded_transport(stems, taken):
+    """
+        Fake transport where the stems and their first *taken* template aliases already belong to somebody else.
+    """
+    transport = gdshortener.GDFakeTransport()
+    shortener = gdshortener.GDBaseShortener(shortener_url=_SHORTENER_URL_, session=transport)
+    for stem in stems:
+        for counter in range(taken + 1):
+            alias = stem if counter == 0 else '{0}_{1}'.format(stem, counter)
+            shortener.shorten('http://www.example.org/{0}'.format(alias), alias)
+    return transport
+
+
+def run(allocations=2000, stems=10, taken=20, max_workers=8):
+    """
+        Allocate *allocations* aliases over *stems* crowded stems with a cold and a warm index and return
+        ``{'cold': {...}, 'warm': {...}}``, each with ``throughput``, ``requests_per_allocation`` and ``collision_rate``.
+    """
+    names = ['promo{0}'.format(index) for index in range(stems)]
+    items = [('http://www.example.com/{0}'.format(index), names[index % stems]) for index in range(allocations)]
+    results = {}
+    known = gdshortener.GDAliasIndex(capacity=max(1000, stems * (taken + 1)))
+    for name in names:
+        for counter in range(taken + 1):
+            known.mark_taken(name if counter == 0 else '{0}_{1}'.format(name, counter))
+    for case, index in (('cold', gdshortener.GDAliasIndex()), ('warm', known)):
+        transport = _crowded_transport(names, taken)
+        shortener = gdshortener.GDBaseShortener(shortener_url=_SHORTENER_URL_, session=transport)
+        allocator = gdshortener.GDAliasAllocator(shortener, index, max_attempts=taken + 2)
+        started = time.time()
+        failures = sum(isinstance(result, gdshortener.GDBaseException)
+                       for result in allocator.iallocate_many(items, max_workers=max_workers))
+        elapsed = time.time() - started
+        results[case] = {
+            'allocations': allocator.allocations,
+            'failures': failures,
+            'throughput': round(allocator.allocations / elapsed, 1) if elapsed > 0 else None,
+            'requests_per_allocation': round(allocator.requests / float(max(1, allocator.allocations)), 3),
+            'collision_rate': round(allocator.collision_rate, 4),
+            'skipped': allocator.skipped,
+        }
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the allocation of custom short URLs')
+    parser.add_argument('--allocations', type=int, default=2000, help='Aliases allocated in every run')
+    parser.add_argument('--stems', type=int, default=10, help='Stems the allocations are spread across')
+    parser.add_argument('--taken', type=int, default=20, help='Template aliases of every stem already taken')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent allocations')
+    arguments = parser.parse_args(argv)
+    results = run(arguments.allocations, arguments.stems, arguments.taken, arguments.workers)
+    sys.stdout.write('{0:<8}{1:>14}{2:>14}{3:>16}{4:>12}\n'.format('index', 'alloc/s', 'req/alloc', 'collision rate', 'failures'))
+    for case in ('cold', 'warm'):
+        result = results[case]
+        sys.stdout.write('{0:<8}{1:>14.1f}{2:>14.3f}{3:>16.4f}{4:>12}\n'.format(
+            case, result['throughput'], result['requests_per_allocation'], result['collision_rate'], result['failures']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""
+    Benchmarks of :class:`gdshortener.GDConcurrencyLimiter` against fixed worker counts, without any network access.
+
+    A congested in-process service serves *capacity* requests at a time in *service_time* seconds; beyond that,
+    requests queue up (latency grows with the requests in flight) and beyond *reject_above* they are refused with the
+    rate limit error. Bulk shortening runs with several fixed worker counts, then with the adaptive limiter over the
+    largest one. Every run reports the URLs shortened per second, the rate limit errors and the final limit::
+
+        python -m benchmarks.concurrency_benchmarks --urls 2000 --workers 4 16 64 --capacity 8 --reject-above 24
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+
+import gdshortener
+
+
+class _CongestedTransport(gdshortener.GDFakeTransport):
+    """
+        Fake transport whose latency grows with the requests in flight beyond *capacity*, refusing the ones beyond
+        *reject_above* with the .gd rate limit error.
+    """
+
+    def request(self, url, params, headers, verify_ssl=True, timeout=None):
+        with self._congestion:
+            self._in_flight += 1
+            in_flight = self._in_flight
+        try:
+            if in_flight > self.reject_above:
+                return json.dumps({'errorcode': 3, 'errormessage': 'Rate limit exceeded'}).encode('utf-8')
+            time.sleep(self.service_time * max(1.0, in_flight / float(self.capacity)))
+            return gdshortener.GDFakeTransport.request(self, url, params, headers, verify_ssl, timeout)
+        finally:
+            with self._congestion:
+                self._in_flight -= 1
+
+    def __init__(self, capacity, reject_above, service_time):
+        gdshortener.GDFakeTransport.__init__(self)
+        self.capacity = capacity
+        self.reject_above = reject_above
+        self.service_time = service_time
+        self._in_flight = 0
+        self._congestion = threading.Lock()
+
+
+def _run_case(urls, workers, limiter, capacity, reject_above, service_time):
+    transport = _CongestedTransport(capacity, reject_above, service_time)
+    with gdshortener.GDBaseShortener(session=transport, concurrency_limiter=limiter) as shortener:
+        started = time.time()
+        results = shortener.shorten_many(['http://www.example.com/{0}'.format(index) for index in range(urls)],
+                                         max_workers=workers)
+        elapsed = time.time() - started
+    shortened = sum(not isinstance(result, gdshortener.GDBaseException) for result in results)
+    return {
+        'workers': workers,
+        'adaptive': limiter is not None,
+        'shortened': shortened,
+        'rate_limited': sum(isinstance(result, gdshortener.GDRateLimitError) for result in results),
+        'throughput': round(shortened / elapsed, 1) if elapsed > 0 else None,
+        'final_limit': None if limiter is None else limiter.limit,
+        'changes': None if limiter is None else len(limiter.history),
+    }
+
+
+def run(urls=1000, workers=(4, 16, 64), capacity=8, reject_above=24, service_time=0.002):
+    """
+        Shorten *urls* URLs on a congested service with every fixed count of *workers*, then with an adaptive limiter
+        over the largest one, and return a list of dicts with ``throughput``, ``rate_limited`` and ``final_limit``.
+    """
+    results = [_run_case(urls, count, None, capacity, reject_above, service_time) for count in workers]
+    limiter = gdshortener.GDConcurrencyLimiter(initial_limit=min(4, max(workers)), max_limit=max(workers))
+    results.append(_run_case(urls, max(workers), limiter, capacity, reject_above, service_time))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark adaptive concurrency against fixed worker counts')
+    parser.add_argument('--urls', type=int, default=1000, help='URLs shortened in every run')
+    parser.add_argument('--workers', type=int, nargs='+', default=[4, 16, 64], help='Fixed worker counts')
+    parser.add_argument('--capacity', type=int, default=8, help='Requests the service serves at a time without queuing')
+    parser.add_argument('--reject-above', type=int, default=24, help='Requests in flight beyond which the service refuses them')
+    parser.add_argument('--service-time', type=float, default=0.002, help='Seconds the service takes for a request')
+    arguments = parser.parse_args(argv)
+    results = run(arguments.urls, arguments.workers, arguments.capacity, arguments.reject_above, arguments.service_time)
+    sys.stdout.write('{0:<10}{1:>9}{2:>12}{3:>14}{4:>13}\n'.format('mode', 'workers', 'URLs/s', 'rate limited', 'final limit'))
+    for result in results:
+        sys.stdout.write('{0:<10}{1:>9}{2:>12.1f}{3:>14}{4:>13}\n'.format(
+            'adaptive' if result['adaptive'] else 'fixed', result['workers'], result['throughput'],
+            result['rate_limited'], '-' if result['final_limit'] is None else result['final_limit']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
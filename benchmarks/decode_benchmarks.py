@@ -0,0 +1,133 @@
+"""
+    Micro-benchmarks of the decoding of .gd responses, without any network access.
+
+    Every case times the per-call CPU cost of the current decoding layer against the decoding previously inlined
+    in :meth:`gdshortener.GDBaseShortener.shorten` and :meth:`gdshortener.GDBaseShortener.lookup`::
+
+        python -m benchmarks.decode_benchmarks --number 200000
+"""
+
+import argparse
+import json
+import sys
+import timeit
+
+from html import unescape
+from urllib.parse import unquote
+
+import requests
+
+import gdshortener
+
+_SHORTENER_URL_ = 'https://is.gd'
+
+_RESPONSES_ = {
+    'shorten': b'{"shorturl":"https://is.gd/Ab3xYz"}',
+    'lookup': b'{"url":"http://www.example.com/some/long/path?query=value"}',
+    'lookup_escaped': b'{"url":"http://www.example.com/some%20path?a=1&amp;b=2"}',
+    'error': b'{"errorcode":3,"errormessage":"Rate limit exceeded, please wait a minute before trying again."}',
+}
+
+
+def _legacy_raise_error(response):
+    error_code = int(response['errorcode'])
+    error_description = str(response['errormessage'])
+    if error_code == 1:
+        raise gdshortener.GDMalformedURLError(error_description)
+    if error_code == 2:
+        raise gdshortener.GDShortURLError(error_description)
+    if error_code == 3:
+        raise gdshortener.GDRateLimitError(error_description)
+    if error_code == 4:
+        raise gdshortener.GDGenericError(error_description)
+
+
+def _legacy_shorten(f_desc):
+    response = json.loads(f_desc.text)
+    if 'shorturl' in response:
+        return (str(response['shorturl']),
+                '{0}/stats.php?url={1}'.format(_SHORTENER_URL_, str(response['shorturl'])[str(response['shorturl']).rindex('/') + 1:]))
+    _legacy_raise_error(response)
+
+
+def _legacy_lookup(f_desc):
+    response = json.loads(f_desc.text)
+    if 'url' in response:
+        return unescape(unquote(response['url']))
+    _legacy_raise_error(response)
+
+
+def _shorten(f_desc):
+    return gdshortener._shorten_result(gdshortener._decode_json(f_desc.content), _SHORTENER_URL_, True)
+
+
+def _lookup(f_desc):
+    return gdshortener._lookup_result(gdshortener._decode_json(f_desc.content))
+
+
+def _ignore_errors(function):
+    def call(f_desc):
+        try:
+            function(f_desc)
+        except gdshortener.GDBaseException:
+            pass
+    return call
+
+
+def _response(content):
+    # Response as received by the shorteners, whose text is decoded anew on every access
+    f_desc = requests.models.Response()
+    f_desc.status_code = 200
+    f_desc.headers['Content-Type'] = 'application/json'
+    f_desc._content = content
+    return f_desc
+
+
+def _cases():
+    return [
+        ('shorten', _RESPONSES_['shorten'], _legacy_shorten, _shorten),
+        ('lookup', _RESPONSES_['lookup'], _legacy_lookup, _lookup),
+        ('lookup_escaped', _RESPONSES_['lookup_escaped'], _legacy_lookup, _lookup),
+        ('error', _RESPONSES_['error'], _ignore_errors(_legacy_lookup), _ignore_errors(_lookup)),
+    ]
+
+
+def _time(legacy, current, f_desc, number, repeat):
+    # Best of *repeat* interleaved runs, in nanoseconds per call
+    legacy_runs, current_runs = [], []
+    for _ in range(repeat):
+        legacy_runs.append(timeit.timeit(lambda: legacy(f_desc), number=number))
+        current_runs.append(timeit.timeit(lambda: current(f_desc), number=number))
+    return min(legacy_runs) / number * 1e9, min(current_runs) / number * 1e9
+
+
+def run(number=100000, repeat=5):
+    """
+        Time every case and return a dict of ``{case: {'legacy_ns': ..., 'current_ns': ..., 'speedup': ...}}``.
+    """
+    results = {}
+    for name, content, legacy, current in _cases():
+        f_desc = _response(content)
+        if legacy(f_desc) != current(f_desc):
+            raise AssertionError('Decoding of {0} changed'.format(name))
+        legacy_ns, current_ns = _time(legacy, current, f_desc, number, repeat)
+        results[name] = {'legacy_ns': round(legacy_ns, 1), 'current_ns': round(current_ns, 1),
+                         'speedup': round(legacy_ns / current_ns, 2)}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Micro-benchmark the decoding of .gd responses')
+    parser.add_argument('--number', type=int, default=100000, help='Calls timed by every run')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs of every case, the best one is reported')
+    arguments = parser.parse_args(argv)
+    sys.stdout.write('JSON backend: {0}\n'.format('orjson' if gdshortener._load_dependency('orjson') is not None else 'json'))
+    sys.stdout.write('{0:<16}{1:>12}{2:>12}{3:>9}\n'.format('case', 'legacy ns', 'current ns', 'speedup'))
+    for name, result in sorted(run(arguments.number, arguments.repeat).items()):
+        sys.stdout.write('{0:<16}{1:>12.1f}{2:>12.1f}{3:>9.2f}\n'.format(
+            name, result['legacy_ns'], result['current_ns'], result['speedup']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+    Benchmark of the time taken to import :mod:`gdshortener`, measured with ``python -X importtime`` in fresh interpreters.
+
+    Every run reports the import time of the module alone and with the dependencies it imports on first network use,
+    and the heavy modules loaded by the import itself (there should be none). With ``--max-ms`` the command fails when
+    the best import time exceeds the budget, so it could guard against regressions::
+
+        python -m benchmarks.import_benchmarks --runs 10 --max-ms 30
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+# Modules that must only be imported on first use, not by "import gdshortener"
+HEAVY_MODULES = ('requests', 'urllib3', 'http.client', 'ssl', 'sqlite3', 'asyncio', 'aiohttp', 'multiprocessing',
+                 'concurrent.futures', 'html', 'logging', 'argparse', 'csv', 'orjson', 'opentelemetry')
+
+# Cumulative time and name of the modules imported at top level (nested ones are indented)
+_IMPORT_TIME_PATTERN_ = re.compile(r'import time:\s*\d+\s*\|\s*(\d+)\s*\| (\S+)\s*$')
+
+# Modules imported by every case
+_CASES_ = {
+    'gdshortener': ('gdshortener',),
+    'gdshortener+network': ('gdshortener', 'requests', 'urllib3', 'http.client'),
+}
+
+
+def _root():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _import_time(modules):
+    """
+        Import *modules* in a fresh interpreter and return the time it took in microseconds, their dependencies included.
+    """
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + ', '.join(modules)], cwd=_root(),
+                            stderr=subprocess.PIPE, check=True).stderr.decode('utf-8')
+    matches = (_IMPORT_TIME_PATTERN_.match(line) for line in output.splitlines())
+    return sum(int(match.group(1)) for match in matches if match is not None and match.group(2) in modules)
+
+
+def heavy_modules():
+    """
+        Return the heavy modules (see :data:`HEAVY_MODULES`) loaded by ``import gdshortener`` in a fresh interpreter.
+    """
+    code = 'import sys, gdshortener; print(" ".join(sorted(sys.modules)))'
+    loaded = subprocess.run([sys.executable, '-c', code], cwd=_root(), stdout=subprocess.PIPE,
+                            check=True).stdout.decode('utf-8').split()
+    return sorted(name for name in HEAVY_MODULES if name in loaded)
+
+
+def run(runs=5):
+    """
+        Time the imports *runs* times and return ``{case: {'best_ms': ..., 'median_ms': ...}, 'heavy_modules': [...]}``.
+    """
+    # Compile the module first, so that the first run does not measure compilation
+    subprocess.run([sys.executable, '-m', 'compileall', '-q', os.path.join(_root(), 'gdshortener.py')], check=True)
+    results = {}
+    for case, modules in sorted(_CASES_.items()):
+        times = sorted(_import_time(modules) / 1000.0 for _ in range(runs))
+        results[case] = {'best_ms': round(times[0], 2), 'median_ms': round(times[len(times) // 2], 2)}
+    results['heavy_modules'] = heavy_modules()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the import time of gdshortener')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters started for every case')
+    parser.add_argument('--max-ms', type=float, help='Fail if the best import time of gdshortener exceeds this budget')
+    arguments = parser.parse_args(argv)
+    results = run(arguments.runs)
+    heavy = results.pop('heavy_modules')
+    sys.stdout.write('{0:<24}{1:>12}{2:>12}\n'.format('ms', 'best', 'median'))
+    for case, result in sorted(results.items()):
+        sys.stdout.write('{0:<24}{1:>12.2f}{2:>12.2f}\n'.format(case, result['best_ms'], result['median_ms']))
+    sys.stdout.write('Heavy modules loaded by the import: {0}\n'.format(', '.join(heavy) or 'none'))
+    if heavy or (arguments.max_ms is not None and results['gdshortener']['best_ms'] > arguments.max_ms):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
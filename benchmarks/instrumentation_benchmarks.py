@@ -0,0 +1,78 @@
+"""
+    Micro-benchmarks of the cost of :class:`gdshortener.GDInstrumentation`, without any network access.
+
+    Every case times ``shorten`` calls answered by a warm cache or by :class:`gdshortener.GDFakeTransport`:
+
+    - *bare* calls the body of ``shorten`` directly, as if instrumentation did not exist
+    - *disabled* calls ``shorten`` on a shortener without instrumentation
+    - *memory* and *prometheus* call ``shorten`` on a shortener instrumented with that sink
+
+    so that *disabled* minus *bare* is the price paid by shorteners that do not use instrumentation::
+
+        python -m benchmarks.instrumentation_benchmarks --number 200000
+"""
+
+import argparse
+import sys
+import timeit
+
+import gdshortener
+
+_URL_ = 'http://www.example.com/some/long/path'
+
+
+def _shortener(cache, instrumentation=None):
+    shortener = gdshortener.GDBaseShortener(shortener_url='https://is.gd', session=gdshortener.GDFakeTransport(),
+                                            cache=gdshortener.GDMemoryCache() if cache else None, coalesce=False,
+                                            instrumentation=instrumentation)
+    # Warm the cache, if any
+    shortener.shorten(_URL_)
+    return shortener
+
+
+def _variants(cache):
+    bare = _shortener(cache)
+    disabled = _shortener(cache)
+    memory = _shortener(cache, gdshortener.GDInstrumentation([gdshortener.GDMemorySink()]))
+    prometheus = _shortener(cache, gdshortener.GDInstrumentation([gdshortener.GDPrometheusSink()]))
+    return [
+        ('bare', lambda: bare._shorten(_URL_, None, False, True, None, None, None)),
+        ('disabled', lambda: disabled.shorten(_URL_)),
+        ('memory', lambda: memory.shorten(_URL_)),
+        ('prometheus', lambda: prometheus.shorten(_URL_)),
+    ]
+
+
+def run(number=100000, repeat=5):
+    """
+        Time every variant of every case and return ``{case: {variant: nanoseconds per call, ...}}``;
+        ``disabled_overhead_ns`` is the extra cost of a shortener without instrumentation over the bare call.
+    """
+    results = {}
+    for case, cache in (('cache_hit', True), ('fake_request', False)):
+        variants = _variants(cache)
+        runs = dict((name, []) for name, function in variants)
+        # Interleaved runs, so that a noisy moment does not weigh on a single variant
+        for _ in range(repeat):
+            for name, function in variants:
+                runs[name].append(timeit.timeit(function, number=number))
+        result = dict((name, round(min(times) / number * 1e9, 1)) for name, times in runs.items())
+        result['disabled_overhead_ns'] = round(result['disabled'] - result['bare'], 1)
+        results[case] = result
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Micro-benchmark the cost of shortener instrumentation')
+    parser.add_argument('--number', type=int, default=100000, help='Calls timed by every run')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs of every variant, the best one is reported')
+    arguments = parser.parse_args(argv)
+    columns = ('bare', 'disabled', 'memory', 'prometheus', 'disabled_overhead_ns')
+    sys.stdout.write('{0:<14}'.format('ns per call') + ''.join('{0:>22}'.format(column) for column in columns) + '\n')
+    for case, result in sorted(run(arguments.number, arguments.repeat).items()):
+        sys.stdout.write('{0:<14}'.format(case) + ''.join('{0:>22.1f}'.format(result[column]) for column in columns) + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
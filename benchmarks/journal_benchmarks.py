@@ -0,0 +1,67 @@
+"""
+    Benchmarks of :class:`gdshortener.GDJournal`, on a temporary file and without any network access.
+
+    Every run times the recording of *lines* results (in microseconds per line, fsyncs included), the indexing of the
+    journal when it is opened again and the replay of every result, for each *sync_every* batch size::
+
+        python -m benchmarks.journal_benchmarks --lines 1000000 --sync-every 1 100 1000
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import gdshortener
+
+
+def _url(index):
+    return 'http://www.example.com/some/long/path/{0}'.format(index)
+
+
+def run(lines=100000, sync_every=(1, 100, 1000)):
+    """
+        Fill a journal for every *sync_every* value and return ``{sync_every: {'record_us': ..., 'open_s': ..., 'replay_us': ...}}``.
+    """
+    directory = tempfile.mkdtemp()
+    results = {}
+    try:
+        for batch in sync_every:
+            path = os.path.join(directory, 'journal-{0}'.format(batch))
+            journal = gdshortener.GDJournal(path, sync_every=batch, sync_interval=float('inf'))
+            started = time.time()
+            for index in range(lines):
+                journal.record(_url(index), None, False, ('https://is.gd/c{0}'.format(index), None))
+            journal.close()
+            recorded = time.time()
+            journal = gdshortener.GDJournal(path)
+            opened = time.time()
+            for index in range(lines):
+                journal.replay(_url(index))
+            replayed = time.time()
+            journal.close()
+            results[batch] = {'record_us': round((recorded - started) / lines * 1e6, 2),
+                              'open_s': round(opened - recorded, 3),
+                              'replay_us': round((replayed - opened) / lines * 1e6, 2),
+                              'bytes': os.path.getsize(path)}
+    finally:
+        shutil.rmtree(directory)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the recording, indexing and replay of a shorten journal')
+    parser.add_argument('--lines', type=int, default=100000, help='Results recorded in every journal')
+    parser.add_argument('--sync-every', type=int, nargs='+', default=[1, 100, 1000], help='Lines between two fsyncs')
+    arguments = parser.parse_args(argv)
+    sys.stdout.write('{0:<12}{1:>14}{2:>12}{3:>14}{4:>14}\n'.format('sync_every', 'record us', 'open s', 'replay us', 'bytes'))
+    for batch, result in sorted(run(arguments.lines, arguments.sync_every).items()):
+        sys.stdout.write('{0:<12}{1:>14.2f}{2:>12.3f}{3:>14.2f}{4:>14}\n'.format(
+            batch, result['record_us'], result['open_s'], result['replay_us'], result['bytes']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""
+    Benchmarks of the throughput scaling of :class:`gdshortener.GDProcessPool` across cores, without any network access.
+
+    Every worker process shortens its share of the URLs over :class:`gdshortener.GDFakeTransport`, so the work measured
+    is the CPU bound part of a call (validation, encoding, decoding and pickling of results); a thread pool in a single
+    process is timed as the baseline::
+
+        python -m benchmarks.process_benchmarks --operations 200000 --processes 1 2 4 8
+"""
+
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+
+import gdshortener
+
+
+def fake_shortener():
+    """
+        Shortener of every worker process, answered in process.
+    """
+    return gdshortener.GDBaseShortener(shortener_url='https://is.gd', session=gdshortener.GDFakeTransport(), coalesce=False)
+
+
+def _urls(operations):
+    return ('http://www.example.com/some/long/path/{0}'.format(index) for index in range(operations))
+
+
+def _time(function):
+    started = time.perf_counter()
+    results = function()
+    seconds = time.perf_counter() - started
+    errors = sum(1 for result in results if isinstance(result, gdshortener.GDBaseException))
+    return {'operations': len(results), 'errors': errors, 'seconds': round(seconds, 6),
+            'throughput': round(len(results) / seconds, 2)}
+
+
+def run(operations=20000, processes=(1, 2, 4), chunk_size=500, max_workers=1):
+    """
+        Time a thread pool and a :class:`gdshortener.GDProcessPool` of every size in *processes* shortening *operations* URLs.
+
+        Return ``{'cores': ..., 'threads': {...}, 'processes': {count: {...}}}``; the result of every process pool states
+        its ``scaling``, i.e. its throughput over the one of a single process.
+    """
+    with fake_shortener() as shortener:
+        report = {'cores': multiprocessing.cpu_count(),
+                  'threads': _time(lambda: shortener.shorten_many(_urls(operations), max_workers=10)),
+                  'processes': {}}
+    for count in processes:
+        with gdshortener.GDProcessPool(fake_shortener, processes=count, chunk_size=chunk_size, max_workers=max_workers) as pool:
+            # Start the workers before the clock does
+            pool.shorten_many(['http://www.example.com/'] * count)
+            report['processes'][count] = _time(lambda: pool.shorten_many(_urls(operations)))
+    single = report['processes'].get(1)
+    for result in report['processes'].values():
+        result['scaling'] = round(result['throughput'] / single['throughput'], 2) if single else None
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the throughput scaling of process pools across cores')
+    parser.add_argument('--operations', type=int, default=20000, help='URLs shortened by every run')
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4], help='Sizes of the process pools timed')
+    parser.add_argument('--chunk-size', type=int, default=500, help='URLs sent to a worker process at once')
+    parser.add_argument('--max-workers', type=int, default=1, help='Threads of every worker process')
+    arguments = parser.parse_args(argv)
+    json.dump(run(arguments.operations, arguments.processes, arguments.chunk_size, arguments.max_workers),
+              sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
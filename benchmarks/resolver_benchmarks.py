@@ -0,0 +1,91 @@
+"""
+    Benchmarks of :class:`gdshortener.GDLookupResolver` over the in-process fake transport, without any network access.
+
+    Synthetic log lines hold is.gd and v.gd short URLs drawn from a small set of popular codes and a long tail, so
+    most of them are duplicates. Every run reports the lines scanned per second, the lookups sent per short URL found
+    and the peak memory traced while resolving, which must not grow with the number of lines::
+
+        python -m benchmarks.resolver_benchmarks --lines 100000 200000 --codes 5000 --window 10000
+"""
+
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+
+import gdshortener
+
+_LINE_ = '127.0.0.1 - - [17/Oct/2026:10:00:00 +0000] "GET /landing?utm_source={0} HTTP/1.1" 200 512 "-" "Mozilla/5.0"'
+
+
+def _shorteners(codes):
+    """
+        Fake is.gd and v.gd transports and shorteners, each with *codes* short URLs already created.
+    """
+    transports = [gdshortener.GDFakeTransport(), gdshortener.GDFakeTransport()]
+    shorteners = [gdshortener.GDBaseShortener(shortener_url=shortener_url, session=transport)
+                  for shortener_url, transport in zip(('http://is.gd', 'http://v.gd'), transports)]
+    short_urls = [shortener.shorten('http://www.example.com/{0}'.format(index))[0]
+                  for shortener in shorteners for index in range(codes)]
+    for transport in transports:
+        transport.requests = 0
+    return transports, shorteners, short_urls
+
+
+def _lines(count, short_urls, seed=42):
+    """
+        Yield *count* log lines; half of them point to one of the 1% most popular short URLs.
+    """
+    generator = random.Random(seed)
+    popular = short_urls[:max(1, len(short_urls) // 100)]
+    for _ in range(count):
+        yield _LINE_.format(generator.choice(popular if generator.random() < 0.5 else short_urls))
+
+
+def run(lines=(20000, 40000), codes=1000, window=10000, max_workers=8):
+    """
+        Resolve every count of *lines* and return, for each one, a dict with ``lines``, ``lines_per_second``,
+        ``lookups_per_found`` and ``peak_kib``.
+    """
+    results = []
+    # Warm up imports and compiled patterns, so that they are not traced in the first run
+    list(gdshortener.GDLookupResolver(_shorteners(1)[1]).iresolve(['http://is.gd/1']))
+    for count in lines:
+        transports, shorteners, short_urls = _shorteners(codes)
+        resolver = gdshortener.GDLookupResolver(shorteners, window=window, max_workers=max_workers)
+        tracemalloc.start()
+        started = time.time()
+        resolved = sum(1 for _ in resolver.iresolve(_lines(count, short_urls)))
+        elapsed = time.time() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        lookups = sum(transport.requests for transport in transports)
+        results.append({
+            'lines': count,
+            'resolved': resolved,
+            'failed': resolver.failed,
+            'lines_per_second': round(count / elapsed, 1) if elapsed > 0 else None,
+            'lookups_per_found': round(lookups / float(max(1, resolver.found)), 4),
+            'peak_kib': round(peak / 1024.0, 1),
+        })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the streaming resolution of short URLs found in log lines')
+    parser.add_argument('--lines', type=int, nargs='+', default=[20000, 40000], help='Log lines resolved in every run')
+    parser.add_argument('--codes', type=int, default=1000, help='Distinct short URLs of every service')
+    parser.add_argument('--window', type=int, default=10000, help='Distinct short URLs remembered to drop duplicates')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent lookups')
+    arguments = parser.parse_args(argv)
+    results = run(arguments.lines, arguments.codes, arguments.window, arguments.workers)
+    sys.stdout.write('{0:>10}{1:>14}{2:>12}{3:>16}{4:>12}\n'.format('lines', 'lines/s', 'resolved', 'lookups/found', 'peak KiB'))
+    for result in results:
+        sys.stdout.write('{0:>10}{1:>14.1f}{2:>12}{3:>16.4f}{4:>12.1f}\n'.format(
+            result['lines'], result['lines_per_second'], result['resolved'], result['lookups_per_found'], result['peak_kib']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
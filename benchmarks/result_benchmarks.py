@@ -0,0 +1,113 @@
+"""
+    Memory benchmarks of bulk results, without any network access.
+
+    The same synthetic shorten results (a share of them with stats, a share failed) are held as the tuples and exceptions
+    returned by earlier versions, as :class:`gdshortener.GDShortenResult` objects, and in a
+    :class:`gdshortener.GDResultTable`. Every layout reports the bytes traced per result; the table also reports how
+    fast it is exported to CSV and JSONL::
+
+        python -m benchmarks.result_benchmarks --results 1000000
+"""
+
+import argparse
+import io
+import sys
+import time
+import tracemalloc
+
+import gdshortener
+
+_SHORTENER_URL_ = 'http://is.gd'
+
+_ALPHABET_ = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+
+
+def _code(index):
+    code = ''
+    index += 1
+    while index:
+        index, digit = divmod(index, len(_ALPHABET_))
+        code = _ALPHABET_[digit] + code
+    return code
+
+
+def _outcomes(count, stats_every=4, error_every=50):
+    """
+        Yield ``(url, short_url, stats_url, error_code)`` for *count* synthetic results, built on the fly.
+    """
+    for index in range(count):
+        url = 'https://www.example.com/articles/{0}?utm_source=newsletter'.format(index)
+        if index % error_every == error_every - 1:
+            yield url, None, None, 3
+            continue
+        short_url = '{0}/{1}'.format(_SHORTENER_URL_, _code(index))
+        stats_url = '{0}/stats.php?url={1}'.format(_SHORTENER_URL_, _code(index)) if index % stats_every == 0 else None
+        yield url, short_url, stats_url, 0
+
+
+def _tuples(count):
+    return [(url, gdshortener.GDRateLimitError('Rate limit exceeded') if error_code else (short_url, stats_url))
+            for url, short_url, stats_url, error_code in _outcomes(count)]
+
+
+def _results(count):
+    return [(url, gdshortener.GDRateLimitError('Rate limit exceeded') if error_code else
+             gdshortener.GDShortenResult(short_url, stats_url))
+            for url, short_url, stats_url, error_code in _outcomes(count)]
+
+
+def _table(count):
+    table = gdshortener.GDResultTable()
+    for url, short_url, stats_url, error_code in _outcomes(count):
+        if error_code:
+            table.append_shortened(url, gdshortener.GDRateLimitError('Rate limit exceeded'))
+        else:
+            table.append_shortened(url, (short_url, stats_url))
+    return table
+
+
+def _traced(build, count):
+    """
+        Build the results and return them with the bytes they hold (the peak is not relevant: inputs are transient).
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    results = build(count)
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return results, held
+
+
+def run(results=100000):
+    """
+        Hold *results* shorten results in every layout and return ``{layout: {'bytes_per_result': ...}}``; the table
+        also reports ``csv_seconds`` and ``jsonl_seconds``.
+    """
+    report = {}
+    for layout, build in (('tuples', _tuples), ('results', _results), ('table', _table)):
+        held, size = _traced(build, results)
+        report[layout] = {'bytes_per_result': round(size / float(results), 1)}
+        if layout == 'table':
+            for name, write in (('csv', held.write_csv), ('jsonl', held.write_jsonl)):
+                started = time.time()
+                write(io.StringIO())
+                report[layout]['{0}_seconds'.format(name)] = round(time.time() - started, 3)
+        del held
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the memory held by bulk shorten results')
+    parser.add_argument('--results', type=int, default=100000, help='Results held in every layout')
+    arguments = parser.parse_args(argv)
+    report = run(arguments.results)
+    sys.stdout.write('{0:<10}{1:>18}\n'.format('layout', 'bytes/result'))
+    for layout in ('tuples', 'results', 'table'):
+        sys.stdout.write('{0:<10}{1:>18.1f}\n'.format(layout, report[layout]['bytes_per_result']))
+    sys.stdout.write('table export: CSV {0:.3f}s, JSONL {1:.3f}s\n'.format(report['table']['csv_seconds'],
+                                                                           report['table']['jsonl_seconds']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
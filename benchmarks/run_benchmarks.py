@@ -0,0 +1,272 @@
+"""
+    Offline benchmarks of the module against the local .gd stub server.
+
+    Every scenario measures throughput and p50/p95/p99 latency of single calls; results are written as JSON
+    and could be compared with the ones of a previous run (e.g. of a previous version)::
+
+        python -m benchmarks.run_benchmarks --operations 2000 --latency 0.002 --output current.json --compare previous.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import platform
+import sys
+import time
+
+import gdshortener
+from tests.stub_server import StubGDServer
+
+
+def percentile(values, fraction):
+    """
+        Nearest-rank percentile of *values* (already sorted).
+    """
+    if not values:
+        return None
+    return values[min(len(values), max(1, int(math.ceil(fraction * len(values))))) - 1]
+
+
+class _Timings(object):
+    """
+        Collects the latency of every call made by the timed shorteners.
+    """
+
+    def add(self, elapsed, failed):
+        self.latencies.append(elapsed)
+        self.errors += 1 if failed else 0
+
+    def summary(self, seconds):
+        latencies = sorted(self.latencies)
+        return {
+            'operations': len(latencies),
+            'errors': self.errors,
+            'seconds': round(seconds, 6),
+            'throughput': round(len(latencies) / seconds, 2) if seconds > 0 else None,
+            'p50': percentile(latencies, 0.50),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99),
+        }
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+
+
+class _TimedShortener(gdshortener.GDBaseShortener):
+    """
+        Shortener that records the latency of every shorten and lookup, bulk calls included.
+    """
+
+    def shorten(self, *args, **kwargs):
+        return self._timed(gdshortener.GDBaseShortener.shorten, args, kwargs)
+
+    def lookup(self, *args, **kwargs):
+        return self._timed(gdshortener.GDBaseShortener.lookup, args, kwargs)
+
+    def _timed(self, function, args, kwargs):
+        started = time.perf_counter()
+        try:
+            result = function(self, *args, **kwargs)
+        except gdshortener.GDBaseException:
+            self.timings.add(time.perf_counter() - started, True)
+            raise
+        self.timings.add(time.perf_counter() - started, False)
+        return result
+
+    def __init__(self, *args, **kwargs):
+        gdshortener.GDBaseShortener.__init__(self, *args, **kwargs)
+        self.timings = _Timings()
+
+
+if gdshortener._load_dependency('aiohttp') is not None:
+    class _TimedAsyncShortener(gdshortener.AsyncGDBaseShortener):
+        """
+            Asyncio shortener that records the latency of every shorten and lookup, bulk calls included.
+        """
+
+        async def shorten(self, *args, **kwargs):
+            return await self._timed(gdshortener.AsyncGDBaseShortener.shorten, args, kwargs)
+
+        async def lookup(self, *args, **kwargs):
+            return await self._timed(gdshortener.AsyncGDBaseShortener.lookup, args, kwargs)
+
+        async def _timed(self, function, args, kwargs):
+            started = time.perf_counter()
+            try:
+                result = await function(self, *args, **kwargs)
+            except gdshortener.GDBaseException:
+                self.timings.add(time.perf_counter() - started, True)
+                raise
+            self.timings.add(time.perf_counter() - started, False)
+            return result
+
+        def __init__(self, *args, **kwargs):
+            gdshortener.AsyncGDBaseShortener.__init__(self, *args, **kwargs)
+            self.timings = _Timings()
+
+
+_TRANSPORTS_ = {
+    'requests': lambda workers: gdshortener.GDSession(pool_maxsize=workers),
+    'urllib3': lambda workers: gdshortener.GDUrllib3Transport(pool_maxsize=workers),
+    'http.client': lambda workers: gdshortener.GDHTTPClientTransport(),
+}
+
+
+def _urls(prefix, operations):
+    return ['http://www.example.com/{0}/{1}'.format(prefix, index) for index in range(operations)]
+
+
+def _measure(shortener, function):
+    started = time.perf_counter()
+    function()
+    return shortener.timings.summary(time.perf_counter() - started)
+
+
+def _sync_scenarios(shortener_url, transport, short_urls_of, operations, workers):
+    def timed_shortener():
+        return _TimedShortener(shortener_url=shortener_url, session=transport())
+
+    results = {}
+    urls = _urls('serial', operations)
+    with timed_shortener() as shortener:
+        results['shorten'] = _measure(shortener, lambda: [_ignore(shortener.shorten, url) for url in urls])
+    short_urls = short_urls_of(urls)
+    with timed_shortener() as shortener:
+        results['lookup'] = _measure(shortener, lambda: [_ignore(shortener.lookup, url) for url in short_urls])
+    with timed_shortener() as shortener:
+        results['shorten_many'] = _measure(shortener, lambda: shortener.shorten_many(_urls('bulk', operations),
+                                                                                   max_workers=workers))
+    with timed_shortener() as shortener:
+        results['lookup_many'] = _measure(shortener, lambda: shortener.lookup_many(short_urls, max_workers=workers))
+    return results
+
+
+def _async_scenarios(server, operations, workers):
+    async def scenario(name, function):
+        async with _TimedAsyncShortener(shortener_url=server.url, limit_per_host=workers) as shortener:
+            started = time.perf_counter()
+            await function(shortener)
+            return name, shortener.timings.summary(time.perf_counter() - started)
+
+    short_urls = [server.create({'url': url})['shorturl'] for url in _urls('serial', operations)]
+    loop = asyncio.new_event_loop()
+    try:
+        return dict([
+            loop.run_until_complete(scenario('async_shorten_many', lambda shortener: shortener.shorten_many(
+                _urls('async', operations), max_concurrency=workers))),
+            loop.run_until_complete(scenario('async_lookup_many', lambda shortener: shortener.lookup_many(
+                short_urls, max_concurrency=workers))),
+        ])
+    finally:
+        loop.close()
+
+
+def _ignore(function, *args):
+    try:
+        return function(*args)
+    except gdshortener.GDBaseException as ex:
+        return ex
+
+
+class _ClosingTransports(object):
+    """
+        Transport factory for the scenarios, that closes every transport it created on exit.
+    """
+
+    def __call__(self):
+        transport = self._factory()
+        self._transports.append(transport)
+        return transport
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for transport in self._transports:
+            transport.close()
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._transports = []
+
+
+def run(operations=500, workers=10, latency=0.002, error_rate=0.0, rate_limit=None, label=None, transport='requests'):
+    """
+        Run every scenario and return the results as a JSON serializable dict.
+
+        Scenarios run against a fresh stub server, unless *transport* is ``'fake'``: then requests are answered in process
+        by :class:`gdshortener.GDFakeTransport`, ignoring *latency*, *error_rate* and *rate_limit*.
+    """
+    report = {
+        'label': label,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': {'operations': operations, 'workers': workers, 'latency': latency, 'error_rate': error_rate,
+                       'rate_limit': rate_limit, 'transport': transport},
+        'results': {},
+    }
+    if transport == 'fake':
+        fake = gdshortener.GDFakeTransport()
+        shortener = gdshortener.GDBaseShortener(shortener_url='https://is.gd', session=fake, coalesce=False)
+        report['results'].update(_sync_scenarios('https://is.gd', lambda: fake,
+                                                 lambda urls: [shortener.shorten(url)[0] for url in urls],
+                                                 operations, workers))
+        return report
+    with StubGDServer(latency=latency, error_rate=error_rate, rate_limit=rate_limit, seed=0) as server, \
+            _ClosingTransports(lambda: _TRANSPORTS_[transport](workers)) as transports:
+        report['results'].update(_sync_scenarios(
+            server.url, transports, lambda urls: [server.create({'url': url})['shorturl'] for url in urls],
+            operations, workers))
+        if gdshortener._load_dependency('aiohttp') is not None:
+            report['results'].update(_async_scenarios(server, operations, workers))
+    return report
+
+
+def compare(current, previous):
+    """
+        Return a text table comparing the throughput and p95 latency of two reports.
+    """
+    lines = ['{0:<22}{1:>14}{2:>14}{3:>9}{4:>12}{5:>12}{6:>9}'.format(
+        'scenario', 'ops/s', 'prev ops/s', 'ratio', 'p95 ms', 'prev p95 ms', 'ratio')]
+    for name, result in sorted(current['results'].items()):
+        other = previous['results'].get(name)
+        if other is None:
+            continue
+        lines.append('{0:<22}{1:>14.1f}{2:>14.1f}{3:>9.2f}{4:>12.2f}{5:>12.2f}{6:>9.2f}'.format(
+            name, result['throughput'], other['throughput'], result['throughput'] / other['throughput'],
+            result['p95'] * 1000, other['p95'] * 1000, result['p95'] / other['p95']))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark gdshortener against a local .gd stub server')
+    parser.add_argument('--operations', type=int, default=500, help='Calls made by every scenario')
+    parser.add_argument('--workers', type=int, default=10, help='Concurrency of bulk scenarios')
+    parser.add_argument('--latency', type=float, default=0.002, help='Seconds the stub waits before every answer')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Probability of an injected error (codes 1-4)')
+    parser.add_argument('--rate-limit', type=int, help='Requests per second accepted by the stub')
+    parser.add_argument('--transport', choices=sorted(_TRANSPORTS_) + ['fake'], default='requests',
+                        help='Transport of the threaded scenarios; fake answers in process, without the stub server')
+    parser.add_argument('--label', help='Label stored in the results, e.g. the version under test')
+    parser.add_argument('--output', help='File the JSON results are written to (standard output if omitted)')
+    parser.add_argument('--compare', help='JSON results of a previous run to compare with')
+    arguments = parser.parse_args(argv)
+    report = run(arguments.operations, arguments.workers, arguments.latency, arguments.error_rate, arguments.rate_limit,
+                 arguments.label, arguments.transport)
+    if arguments.output:
+        with open(arguments.output, 'w') as stream:
+            json.dump(report, stream, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    if arguments.compare:
+        with open(arguments.compare) as stream:
+            sys.stderr.write(compare(report, json.load(stream)) + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+    Benchmarks of :class:`gdshortener.GDPriorityScheduler` against a plain FIFO thread pool, without any network access.
+
+    A flood of batch URLs is submitted at once to a slow in-process service, then interactive URLs arrive at a steady
+    pace while the flood is served. Both the scheduler (whose batch class may use every worker but one) and a
+    ``ThreadPoolExecutor`` with the same number of workers report the p50/p95/p99 latency of interactive requests,
+    from submission to result, and the batch throughput::
+
+        python -m benchmarks.scheduler_benchmarks --batch 2000 --interactive 50 --workers 8 --service-time 0.005
+"""
+
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import gdshortener
+
+from benchmarks.run_benchmarks import percentile
+
+
+class _SlowTransport(gdshortener.GDFakeTransport):
+    """
+        Fake transport taking *service_time* seconds for every request.
+    """
+
+    def request(self, url, params, headers, verify_ssl=True, timeout=None):
+        time.sleep(self.service_time)
+        return gdshortener.GDFakeTransport.request(self, url, params, headers, verify_ssl, timeout)
+
+    def __init__(self, service_time):
+        gdshortener.GDFakeTransport.__init__(self)
+        self.service_time = service_time
+
+
+def _run_case(mode, batch, interactive, workers, service_time, interval):
+    shortener = gdshortener.GDBaseShortener(session=_SlowTransport(service_time))
+    if mode == 'fifo':
+        executor = ThreadPoolExecutor(workers)
+        submit = lambda url, priority: executor.submit(shortener.shorten, url)
+    else:
+        classes = [gdshortener.GDPriorityClass('interactive', 0),
+                   gdshortener.GDPriorityClass('batch', 1, max_concurrency=max(1, workers - 1))]
+        executor = gdshortener.GDPriorityScheduler(shortener, classes, max_concurrency=workers)
+        submit = lambda url, priority: executor.submit(url, priority=priority)
+    started = time.time()
+    flood = [submit('http://www.example.com/batch/{0}'.format(index), 'batch') for index in range(batch)]
+    latencies = []
+    pending = []
+    for index in range(interactive):
+        submitted = time.time()
+        future = submit('http://www.example.com/interactive/{0}'.format(index), 'interactive')
+        future.add_done_callback(lambda future, submitted=submitted: latencies.append(time.time() - submitted))
+        pending.append(future)
+        time.sleep(interval)
+    for future in pending + flood:
+        future.result()
+    elapsed = time.time() - started
+    if mode == 'fifo':
+        executor.shutdown()
+    else:
+        executor.close()
+    latencies.sort()
+    return {
+        'mode': mode,
+        'interactive_p50_ms': round(percentile(latencies, 0.5) * 1000, 2),
+        'interactive_p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'interactive_p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'batch_throughput': round(batch / elapsed, 1),
+    }
+
+
+def run(batch=1000, interactive=20, workers=8, service_time=0.005, interval=0.01):
+    """
+        Serve a batch flood and interactive requests through a FIFO pool and through the scheduler and return a list
+        of dicts with the interactive latency percentiles (in milliseconds) and the batch throughput.
+    """
+    return [_run_case(mode, batch, interactive, workers, service_time, interval) for mode in ('fifo', 'scheduler')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark interactive latency under a batch flood')
+    parser.add_argument('--batch', type=int, default=1000, help='Batch URLs submitted at once')
+    parser.add_argument('--interactive', type=int, default=20, help='Interactive URLs submitted one at a time')
+    parser.add_argument('--workers', type=int, default=8, help='Requests in flight at most')
+    parser.add_argument('--service-time', type=float, default=0.005, help='Seconds the service takes for a request')
+    parser.add_argument('--interval', type=float, default=0.01, help='Seconds between interactive requests')
+    arguments = parser.parse_args(argv)
+    results = run(arguments.batch, arguments.interactive, arguments.workers, arguments.service_time, arguments.interval)
+    sys.stdout.write('{0:<11}{1:>10}{2:>10}{3:>10}{4:>12}\n'.format('mode', 'p50 ms', 'p95 ms', 'p99 ms', 'batch/s'))
+    for result in results:
+        sys.stdout.write('{0:<11}{1:>10.2f}{2:>10.2f}{3:>10.2f}{4:>12.1f}\n'.format(
+            result['mode'], result['interactive_p50_ms'], result['interactive_p95_ms'], result['interactive_p99_ms'],
+            result['batch_throughput']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
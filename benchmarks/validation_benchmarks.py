@@ -0,0 +1,65 @@
+"""
+    Micro-benchmarks of the local validation and canonicalization of URLs, without any network access.
+
+    Every case times :meth:`gdshortener.GDURLValidator.normalize_many` over a batch of URLs, in nanoseconds per URL,
+    with and without canonicalization::
+
+        python -m benchmarks.validation_benchmarks --size 1000000
+"""
+
+import argparse
+import sys
+import timeit
+
+import gdshortener
+
+_CASES_ = {
+    'canonical': 'http://www.example.com/some/long/path/{0}',
+    'denormalized': 'HTTP://WWW.Example.COM:80/some%2dlong%2fpath/{0}?q=a b#',
+    'invalid': 'javascript://alert({0})',
+    'custom_url': 'custom_{0}',
+}
+
+
+def _batch(case, size):
+    return [_CASES_[case].format(index) for index in range(size)]
+
+
+def run(size=100000, repeat=3):
+    """
+        Time every case and return ``{case: {'normalize_ns': ..., 'validate_ns': ...}}``, ``validate_ns`` being the cost
+        of a validator that does not canonicalize (or of :meth:`gdshortener.GDURLValidator.is_valid_custom_url` for custom URLs).
+    """
+    normalizer = gdshortener.GDURLValidator()
+    validator = gdshortener.GDURLValidator(normalize=False)
+    results = {}
+    for case in sorted(_CASES_):
+        batch = _batch(case, size)
+        if case == 'custom_url':
+            functions = (lambda: [normalizer.check_custom_url(custom_url) for custom_url in batch],
+                         lambda: [gdshortener.GDURLValidator.is_valid_custom_url(custom_url) for custom_url in batch])
+        else:
+            functions = (lambda: list(normalizer.normalize_many(batch)), lambda: list(validator.normalize_many(batch)))
+        runs = ([], [])
+        # Interleaved runs, so that a noisy moment does not weigh on a single variant
+        for _ in range(repeat):
+            for times, function in zip(runs, functions):
+                times.append(timeit.timeit(function, number=1))
+        results[case] = {'normalize_ns': round(min(runs[0]) / size * 1e9, 1),
+                         'validate_ns': round(min(runs[1]) / size * 1e9, 1)}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Micro-benchmark the local validation of URLs')
+    parser.add_argument('--size', type=int, default=100000, help='URLs in every batch')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs of every case, the best one is reported')
+    arguments = parser.parse_args(argv)
+    sys.stdout.write('{0:<16}{1:>16}{2:>16}\n'.format('ns per URL', 'normalize', 'validate'))
+    for case, result in sorted(run(arguments.size, arguments.repeat).items()):
+        sys.stdout.write('{0:<16}{1:>16.1f}{2:>16.1f}\n'.format(case, result['normalize_ns'], result['validate_ns']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,18 +4,85 @@
     :synopsis: Module that enables the use of `is.gd - v.gd url shortener <http://is.gd/developers.php>`_.
 """
 
-try:
-    import HTMLParser
-except:
-    import html.parser as HTMLParser
+from urllib.parse import unquote, urlencode, urlsplit
 
-try:
-    from urllib import unquote
-except:
-    from urllib.parse import unquote
-    
-import requests
+# Heavy dependencies (requests, urllib3, http.client, ssl, sqlite3, asyncio, aiohttp, ...) are imported where they are
+# first used, so that importing this module stays cheap for code that only needs its exceptions or its validation
+import collections
+import importlib
+import itertools
 import json
+import math
+import os
+import random
+import re
+import struct
+import sys
+import threading
+import time
+import weakref
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Modules once imported at load time, still offered as attributes of this module (imported on first use)
+_LAZY_ATTRIBUTES_ = {
+    'requests': 'requests',
+    'urllib3': 'urllib3',
+    'aiohttp': 'aiohttp',
+    'otel_trace': 'opentelemetry.trace',
+    'orjson': 'orjson',
+}
+
+
+def _optional_import(name):
+    """
+        Import an optional dependency on first use, returning ``None`` if it is not installed.
+    """
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+def _load_dependency(name):
+    """
+        Return the module offered as attribute *name* of this module (``None`` if not installed), importing it and
+        keeping it as a module global on first use.
+
+        Code of this module calls it rather than reading the attribute, which only Python 3.7+ resolves on its own.
+    """
+    try:
+        return globals()[name]
+    except KeyError:
+        module = globals()[name] = _optional_import(_LAZY_ATTRIBUTES_[name])
+        return module
+
+
+def __getattr__(name):
+    # Python 3.7+ calls this for missing module attributes only, so that callers could read gdshortener.requests & co.
+    if name not in _LAZY_ATTRIBUTES_:
+        raise AttributeError("module 'gdshortener' has no attribute '{0}'".format(name))
+    return _load_dependency(name)
+
+
+def _escape(text):
+    """
+        Escape *text* for HTML, importing ``html`` on first use.
+    """
+    from html import escape
+    return escape(text)
+
+
+def _unescape(text):
+    """
+        Unescape the HTML entities of *text*, importing ``html`` (and its large entity table) on first use.
+    """
+    from html import unescape
+    return unescape(text)
+
 
 _V_GD_SHORTENER_URL_ = 'http://v.gd'
 _IS_GD_SHORTENER_URL_ = 'http://is.gd'
@@ -46,6 +113,11 @@ class GDBaseException(Exception):
             - error code *2*: there was a problem with the short URL provided (for custom short URLs)
             - error code *3*: our rate limit was exceeded (your app should wait before trying again)
             - error code *4*: any other error (includes potential problems with our service such as a maintenance period)
+
+            Errors detected by this module use further codes:
+
+            - error code *5*: the SSL certificate of the remote url could not be verified
+            - error code *6*: .gd service did not answer in time
             
             :returns: int.
         """
@@ -170,206 +242,5755 @@ class GDSSLError(GDBaseException):
         GDBaseException.__init__(self, 5, error_description)
 
 
-class GDBaseShortener(object):
+class GDTimeoutError(GDBaseException):
     """
-        Base shortener for `is.gd - v.gd url shortener <http://is.gd/developers.php>`_.
-        
-        :type shortener_url: str.  
-        :param shortener_url: base is.gd - v.gd API URL to create shorten link.
+        This exceptions is raised when .gd service does not answer within the timeout, or when the deadline of a call expires.
 
-            Possible values are:
-            
-            1. **_IS_GD_SHORTENER_URL_** to obtain *is.gd* shortened url
-            2. **_V_GD_SHORTENER_URL_** to obtain *v.gd* shortened url
-            
+        It is kept apart from :class:`gdshortener.GDGenericError`, which is only raised for errors stated by .gd service.
 
-        :param timeout: Timeout in seconds used to connect and obtain shortened URL from .gd service
-        :type timeout: int.
-        :param user_agent: User Agent used when querying .gd services
-        :type user_agent: str.
+        :param error_description: Error description obtained from exception
+        :type error_description: str.
     """
-    
-    def lookup(self, short_url, verify_ssl=True):
+
+    def __init__(self, error_description=None):
         """
-            Lookup an URL shortened with `is.gd - v.gd url service <http://is.gd/developers.php>`_ and return the real url
-            
-            :param short_url: the url shortened with .gd service
-            :type short_url: str.
-            :param verify_ssl: allow remote url ssl certificate verification (if True) or disable it (if False)
-            :type verify_ssl: bool.
-            
-            :returns: str. -- The original url that was shortened with .gd service
-            
-            :raises: **IOError** when timeout with .gd service occurs
-                **ValueError** if .gd response is malformed
-                :class:`gdshortener.GDMalformedURLError` if the previously shortened URL provided is malformed
-                :class:`gdshortener.GDShortURLError` if the custom URL requested is not available or disabled by .gd service
-                :class:`gdshortener.GDRateLimitError` if the request rate is exceeded for .gd service
-                :class:`gdshortener.GDGenericError` in case of generic error from .gd service (mainteinance)
+            Init the exception with message taken from raised exception.
+
+            :param error_description: Error description obtained from exception
+            :type error_description: str.
         """
-        if short_url is None or not isinstance(short_url, str) or len(short_url.strip()) == 0:
-            raise GDMalformedURLError('The shortened URL must be a non empty string')
-        # Build data for post
-        data = {
-            'format': 'json',
-            'shorturl': short_url
-        }
-        headers = {'User-Agent': self._user_agent}
+        GDBaseException.__init__(self, 6, error_description)
 
-        try:
-            f_desc = requests.get("{0}/forward.php".format(self.shortener_url), params=data, headers=headers,
-                                  verify=verify_ssl)
-            response = json.loads(f_desc.text)
-            if 'url' in response:
-                # Success!
-                return HTMLParser.HTMLParser().unescape(unquote(response['url']))
-            else:
-                # Error
-                error_code = int(response['errorcode'])
-                error_description = str(response['errormessage'])
-                if error_code == 1:
-                    raise GDMalformedURLError(error_description)
-                if error_code == 2:
-                    raise GDShortURLError(error_description)
-                if error_code == 3:
-                    raise GDRateLimitError(error_description)
-                if error_code == 4:
-                    raise GDGenericError(error_description)
-        except requests.exceptions.SSLError as ex:
-            raise GDSSLError(str(ex))
-        except Exception as ex:
-            raise GDGenericError(str(ex))
 
-    def shorten(self, url, custom_url=None, log_stat=False, verify_ssl=True):
+_FAKE_CODE_ALPHABET_ = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+
+# Stats page served by GDFakeTransport, laid out as the ones of .gd services
+_FAKE_STATS_PAGE_ = '''<html>
+<head><title>Statistics for {short_url}</title></head>
+<body>
+<h1>Statistics for <a href="{short_url}">{short_url}</a></h1>
+<p>Original URL: <a href="{url}">{url}</a></p>
+<p>Total clicks: <b>{clicks}</b></p>
+</body>
+</html>
+'''
+
+# Fields of .gd stats pages: click count and link to the original URL, whatever markup surrounds them
+_STATS_CLICKS_PATTERN_ = re.compile(r'clicks\s*:?\s*(?:<[^>]*>\s*)*([0-9][0-9,]*)', re.IGNORECASE)
+_STATS_URL_PATTERN_ = re.compile(r'original\s+url\s*:?\s*(?:<[^>]*>\s*)*?<a\s[^>]*href="([^"]*)"', re.IGNORECASE)
+
+# Exceptions raised for the error codes stated by .gd service
+_ERROR_CLASSES_ = {
+    1: GDMalformedURLError,
+    2: GDShortURLError,
+    3: GDRateLimitError,
+    4: GDGenericError,
+}
+
+# Exceptions rebuilt from the error codes recorded in a GDJournal, errors detected by this module included
+_JOURNAL_ERROR_CLASSES_ = dict(_ERROR_CLASSES_)
+_JOURNAL_ERROR_CLASSES_.update({5: GDSSLError, 6: GDTimeoutError})
+
+
+# Custom short URLs accepted by .gd services
+_CUSTOM_URL_PATTERN_ = re.compile(r'[A-Za-z0-9_]{5,30}\Z')
+
+# Runs of characters that could not appear in a custom short URL, replaced in the stems of GDAliasAllocator
+_ALIAS_UNSAFE_PATTERN_ = re.compile(r'[^A-Za-z0-9_]+')
+
+# Leading scheme of an URL, a "://" further on (e.g. in the query) not being one
+_SCHEME_PATTERN_ = re.compile(r'[A-Za-z][A-Za-z0-9+.\-]*://')
+
+# scheme://netloc path ?query #fragment, without control characters
+_URL_PATTERN_ = re.compile(r'([A-Za-z][A-Za-z0-9+.\-]*)://([^/?#\x00-\x1f\x7f]*)([^?#\x00-\x1f\x7f]*)'
+                           r'(?:\?([^#\x00-\x1f\x7f]*))?(?:#([^\x00-\x1f\x7f]*))?\Z')
+
+_CONTROL_CHARACTERS_ = re.compile(r'[\x00-\x1f\x7f]')
+
+_PERCENT_ENCODED_ = re.compile(r'%([0-9A-Fa-f]{2})')
+
+_UNRESERVED_CHARACTERS_ = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~')
+
+_DEFAULT_PORTS_ = {'http': '80', 'https': '443', 'ftp': '21'}
+
+
+def _normalize_escape(match):
+    """
+        Decode a percent-encoded unreserved character, uppercase the hexadecimal digits of any other one.
+    """
+    character = chr(int(match.group(1), 16))
+    return character if character in _UNRESERVED_CHARACTERS_ else '%' + match.group(1).upper()
+
+
+def _normalize_escapes(part):
+    """
+        Percent-encode spaces and normalize the percent-encodings of a path, query or fragment.
+    """
+    if ' ' in part:
+        part = part.replace(' ', '%20')
+    if '%' in part:
+        part = _PERCENT_ENCODED_.sub(_normalize_escape, part)
+    return part
+
+
+class GDURLValidator(object):
+    """
+        Local validation and canonicalization of the URLs and custom short URLs given to shorteners, so that requests
+        .gd service would refuse are never sent and equivalent URLs share cache entries.
+
+        URLs are refused with :class:`gdshortener.GDMalformedURLError` if they contain control characters, have no host,
+        have a scheme not in *schemes* or are longer than *max_length* characters; URLs without scheme get *default_scheme*.
+        Canonicalization only applies the equivalences of RFC 3986: scheme and host are lowercased, the default port,
+        an empty query and an empty fragment are dropped, an empty path becomes ``/``, spaces are percent-encoded,
+        percent-encoded unreserved characters are decoded and other percent-encodings are uppercased.
+
+        Custom short URLs are refused with :class:`gdshortener.GDShortURLError` unless they are 5 to 30 letters, digits or underscores.
+
+        Patterns are compiled once, so a validator could check millions of URLs (see :meth:`normalize_many`) and be shared among shorteners and threads.
+
+        :param normalize: If False, URLs are validated but sent as they are (only stripped of surrounding whitespace)
+        :type normalize: bool.
+        :param max_length: Maximum length of an URL
+        :type max_length: int.
+        :param schemes: Accepted URL schemes
+        :type schemes: iterable of str.
+        :param default_scheme: Scheme given to URLs without one
+        :type default_scheme: str.
+    """
+
+    def normalize(self, url):
         """
-            Shorten an URL using `is.gd - v.gd url shortener service <http://is.gd/developers.php>`_.
-            
+            Validate an URL and return its canonical form.
+
             :param url: URL that had to be shortened
             :type url: str.
-            
-            :param custom_url: if specified, the url generated will be http://is.gd/<custom_url> (or http://v.gd/<custom_url>).
-            
-                Please note that if this custom url is unavailable (because it is already used, for example), a :class:`gdshortener.GDShortURLError` will be raised
-            
-            :type custom_url: str.
-            :param log_stat: States if the generated url has statistical analisys attached.
-                If the stats are enabled, a special url will show the stats on this shortened url. This special url is returned as second parameters of this function.
-                
-                Please notice that a stat enabled shorten url counts double in .gd rate exceeding monitor system.
-                
-                More information on `.gd FAQ <http://is.gd/faq.php#stats>`_ and `.gd rate limit <http://is.gd/usagelimits.php>`_.
-            :type log_stat: bool.
-            :param verify_ssl: allow remote url ssl certificate verification (if True) or disable it (if False)
-            :type verify_ssl: bool.
 
-            :returns:  (str,str) -- Shortened URL obtained by .gd service and Stat URL if requested (otherwhise is ``None``).
-            :raises: **IOError** when timeout with .gd service occurs
-                **ValueError** if .gd response is malformed
-                :class:`gdshortener.GDMalformedURLError` if the URL provided for shortening is malformed
-                :class:`gdshortener.GDShortURLError` if the custom URL requested is not available
-                :class:`gdshortener.GDRateLimitError` if the request rate is exceeded for .gd service
-                :class:`gdshortener.GDGenericError` in case of generic error from .gd service (mainteinance)
+            :returns: str. -- The canonical URL (the stripped URL if the validator does not normalize)
+            :raises: :class:`gdshortener.GDMalformedURLError` if the URL is not valid
         """
         if url is None or not isinstance(url, str) or len(url.strip()) == 0:
             raise GDMalformedURLError('The URL that had to be shorten must be a non empty string')
-        # Build data to post
-        data = {
-            'format': 'json',
-            'url': url,
-            'logstats': 1 if log_stat else 0
-        }
-        if custom_url is not None and isinstance(custom_url, str) and len(custom_url.strip()) > 0:
-            data['shorturl'] = custom_url
-        headers = {'User-Agent': self._user_agent}
+        url = url.strip()
+        if _SCHEME_PATTERN_.match(url) is None:
+            url = '{0}://{1}'.format(self.default_scheme, url)
+        match = _URL_PATTERN_.match(url)
+        if match is None:
+            if _CONTROL_CHARACTERS_.search(url) is not None:
+                raise GDMalformedURLError('The URL must not contain control characters')
+            raise GDMalformedURLError('The URL is malformed')
+        scheme, netloc, path, query, fragment = match.groups()
+        scheme = scheme.lower()
+        if scheme not in self.schemes:
+            raise GDMalformedURLError('The URL scheme "{0}" is not supported'.format(scheme))
+        userinfo, at, hostport = netloc.rpartition('@')
+        if hostport.startswith('['):
+            host, bracket, port = hostport.partition(']')
+            host += bracket
+            if port and port[0] != ':':
+                raise GDMalformedURLError('The URL host is malformed')
+            port = port[1:]
+        else:
+            host, _, port = hostport.partition(':')
+        if not host or (port and not port.isdigit()):
+            raise GDMalformedURLError('The URL host is malformed')
+        if self.normalize_urls:
+            if port == _DEFAULT_PORTS_.get(scheme):
+                port = ''
+            url = '{0}://{1}{2}{3}{4}{5}{6}{7}'.format(
+                scheme, userinfo, at, host.lower(), ':' if port else '', port, _normalize_escapes(path) or '/',
+                '?' + _normalize_escapes(query) if query else '')
+            if fragment:
+                url += '#' + _normalize_escapes(fragment)
+        if len(url) > self.max_length:
+            raise GDMalformedURLError('The URL is longer than {0} characters'.format(self.max_length))
+        return url
 
-        try:
-            f_desc = requests.get("{0}/create.php".format(self.shortener_url), params=data, headers=headers,
-                                  verify=verify_ssl)
-            response = json.loads(f_desc.text)
-            if 'shorturl' in response:
-                # Success!
-                return (str(response['shorturl']),
-                        None if not log_stat else '{0}/stats.php?url={1}'.format(self.shortener_url, str(response['shorturl'])[str(response['shorturl']).rindex('/') + 1:]))
-            else:
-                # Error
-                error_code = int(response['errorcode'])
-                error_description = str(response['errormessage'])
-                if error_code == 1:
-                    raise GDMalformedURLError(error_description)
-                if error_code == 2:
-                    raise GDShortURLError(error_description)
-                if error_code == 3:
-                    raise GDRateLimitError(error_description)
-                if error_code == 4:
-                    raise GDGenericError(error_description)
-        except requests.exceptions.SSLError as ex:
-            raise GDSSLError(str(ex))
-        except Exception as ex:
-            raise GDGenericError(str(ex))
+    def normalize_many(self, urls):
+        """
+            Lazy bulk version of :meth:`normalize`.
 
-    def __init__(self, shortener_url=_IS_GD_SHORTENER_URL_, timeout=60,
-                 user_agent='Mozilla/5.0 (compatible; GD Shortener Python Module - https://github.com/torre76/gd_shortener/)'):
+            :param urls: URLs that had to be shortened
+            :type urls: iterable of str.
+
+            :returns: generator -- For each url, in input order, its canonical form or the :class:`gdshortener.GDMalformedURLError` raised for it.
         """
-            Init URL Shortener class
-            
-            :type shortener_url: str.
-            :param shortener_url: base is.gd - v.gd API URL to create shorten link.
+        normalize = self.normalize
+        for url in urls:
+            try:
+                yield normalize(url)
+            except GDMalformedURLError as ex:
+                yield ex
 
-                Possible values are:
-                
-                1. **_IS_GD_SHORTENER_URL_** to obtain *is.gd* shortened url
-                2. **_V_GD_SHORTENER_URL_** to obtain *v.gd* shortened url
-                
+    def check_custom_url(self, custom_url):
+        """
+            Validate a custom short URL.
 
-            :param timeout: Timeout in seconds used to connect and obtain shortened URL from .gd service
-            :type timeout: int.
-            :param user_agent: User Agent used when querying .gd services
-            :type user_agent: str.
+            :param custom_url: Custom short URL requested; ``None`` or blank strings are ignored, as by shorteners
+            :type custom_url: str.
+
+            :returns: str. -- The custom short URL, or ``None`` if it is ignored
+            :raises: :class:`gdshortener.GDShortURLError` if the custom short URL could not be accepted by .gd service
         """
-        self.shortener_url = shortener_url
-        self._timeout = timeout
-        self._user_agent = user_agent
+        if custom_url is None or not isinstance(custom_url, str) or len(custom_url.strip()) == 0:
+            return None
+        if _CUSTOM_URL_PATTERN_.match(custom_url) is None:
+            raise GDShortURLError('Custom short URLs must be 5 to 30 characters long and contain only letters, numbers and underscores')
+        return custom_url
 
+    @staticmethod
+    def is_valid_custom_url(custom_url):
+        """
+            State if a custom short URL could be accepted by .gd service, without raising.
 
-class ISGDShortener(GDBaseShortener):
+            :returns: bool.
+        """
+        return isinstance(custom_url, str) and _CUSTOM_URL_PATTERN_.match(custom_url) is not None
+
+    def __init__(self, normalize=True, max_length=5000, schemes=('http', 'https', 'ftp'), default_scheme='http'):
+        """
+            Init the validator.
+
+            :param normalize: If False, URLs are validated but sent as they are (only stripped of surrounding whitespace)
+            :type normalize: bool.
+            :param max_length: Maximum length of an URL
+            :type max_length: int.
+            :param schemes: Accepted URL schemes
+            :type schemes: iterable of str.
+            :param default_scheme: Scheme given to URLs without one
+            :type default_scheme: str.
+        """
+        self.normalize_urls = normalize
+        self.max_length = max_length
+        self.schemes = frozenset(scheme.lower() for scheme in schemes)
+        self.default_scheme = default_scheme
+
+
+# Validator of shorteners that are not given their own
+_DEFAULT_URL_VALIDATOR_ = GDURLValidator()
+
+
+# Seconds the calling thread spent opening connections, read by instrumented shorteners around every request
+_connect_timer = threading.local()
+
+_clock = time.perf_counter
+
+
+def _timed_connect(connect):
     """
-        Shortener for `is.gd url shortener <http://is.gd/developers.php>`_.
+        Wrap the ``connect`` method of a connection class so that the time it takes is added to :data:`_connect_timer`.
+    """
+    def timed(self):
+        started = _clock()
+        try:
+            return connect(self)
+        finally:
+            _connect_timer.elapsed = getattr(_connect_timer, 'elapsed', 0) + _clock() - started
+    return timed
 
-        :param timeout: Timeout in seconds used to connect and obtain shortened URL from .gd service
-        :type timeout: int.  
-        :param user_agent: User Agent used when querying .gd services
-        :type user_agent: str.
+
+# Pool classes of the urllib3 pool managers used by transports (requests included), timing every new connection
+_TIMED_POOL_CLASSES_ = None
+
+
+def _timed_pool_classes():
+    """
+        Return the pool classes of :data:`_TIMED_POOL_CLASSES_`, building them (and importing ``urllib3``) on first use.
+    """
+    global _TIMED_POOL_CLASSES_
+    if _TIMED_POOL_CLASSES_ is None:
+        import urllib3
+
+        class _TimedHTTPConnection(urllib3.connection.HTTPConnection):
+            connect = _timed_connect(urllib3.connection.HTTPConnection.connect)
+
+        class _TimedHTTPSConnection(urllib3.connection.HTTPSConnection):
+            connect = _timed_connect(urllib3.connection.HTTPSConnection.connect)
+
+        class _TimedHTTPConnectionPool(urllib3.HTTPConnectionPool):
+            ConnectionCls = _TimedHTTPConnection
+
+        class _TimedHTTPSConnectionPool(urllib3.HTTPSConnectionPool):
+            ConnectionCls = _TimedHTTPSConnection
+
+        _TIMED_POOL_CLASSES_ = {'http': _TimedHTTPConnectionPool, 'https': _TimedHTTPSConnectionPool}
+    return _TIMED_POOL_CLASSES_
+
+
+class _ThreadResource(object):
+    """
+        Holder of a resource (connection, session) opened by a thread, to be kept in a ``threading.local``.
+
+        *resource* is added to the *resources* set of its owner; when the thread exits its holder is dropped and the
+        resource is removed from the set (and closed if *close* is True), unless the owner closed it first.
+    """
+
+    __slots__ = ('resource', 'pid', '__weakref__')
+
+    def __init__(self, resource, lock, resources, close=True):
+        self.resource = resource
+        self.pid = os.getpid()
+        with lock:
+            resources.add(resource)
+        weakref.finalize(self, _release_thread_resource, resource, self.pid, lock, resources, close)
+
+
+def _release_thread_resource(resource, pid, lock, resources, close):
+    """
+        Forget *resource*, whose thread exited, closing it unless it was already closed or belongs to the parent process.
     """
+    with lock:
+        if resource not in resources:
+            return
+        resources.discard(resource)
+    # A forked child must not close what its parent still uses
+    if close and os.getpid() == pid:
+        resource.close()
 
-    def __init__(self, timeout=60, user_agent='Mozilla/5.0 (compatible; GD Shortener Python Module - https://github.com/torre76/gd_shortener/)'):
+
+class GDTransport(object):
+    """
+        Base class of the transports used by shorteners to send their requests to `is.gd - v.gd url shortener <http://is.gd/developers.php>`_.
+
+        A transport performs a GET request and returns the body of the response, mapping its own errors to the ones of this module,
+        so that shorteners behave the same whatever transport they use. Time spent opening connections is reported to
+        :class:`gdshortener.GDInstrumentation` by the transports of this module:
+
+        - :class:`gdshortener.GDSession` works over ``requests`` (the default one)
+        - :class:`gdshortener.GDUrllib3Transport` works over ``urllib3`` directly
+        - :class:`gdshortener.GDHTTPClientTransport` works over ``http.client`` keep-alive connections
+        - :class:`gdshortener.GDFakeTransport` answers in process, without any network access
+    """
+
+    def request(self, url, params, headers, verify_ssl=True, timeout=None):
         """
-            Init URL Shortener class
-            
-            :param timeout: Timeout in seconds used to connect and obtain shortened URL from .gd service
-            :type timeout: int.
-            :param user_agent: User Agent used when querying .gd services
-            :type user_agent: str.
+            Perform a GET request and return the body of its response.
+
+            :param url: URL to request
+            :type url: str.
+            :param params: Query parameters of the request
+            :type params: dict.
+            :param headers: Headers of the request
+            :type headers: dict.
+            :param verify_ssl: allow remote url ssl certificate verification (if True) or disable it (if False)
+            :type verify_ssl: bool.
+            :param timeout: Timeout in seconds, either a single value or a ``(connect, read)`` tuple (no timeout if ``None``)
+            :type timeout: float or tuple.
+
+            :returns: bytes. -- Body of the response, whatever its status
+            :raises: :class:`gdshortener.GDSSLError` if the SSL certificate of the remote url could not be verified
+                :class:`gdshortener.GDTimeoutError` if the server does not answer in time
+                :class:`gdshortener.GDGenericError` in case of any other connection error
+        """
+        raise NotImplementedError()
+
+    def fetch(self, url, params, headers, verify_ssl=True, timeout=None):
         """
-        GDBaseShortener.__init__(self, _IS_GD_SHORTENER_URL_, timeout, user_agent)
+            Perform a GET request and return its whole response, e.g. to send conditional requests.
 
+            Arguments and errors are the ones of :meth:`request`; this default implementation, for transports that only
+            implement :meth:`request`, reports every response as a ``200`` without headers.
 
-class VGDShortener(GDBaseShortener):
+            :returns: (int, mapping, bytes) -- Status, headers (looked up by lowercase name) and body of the response
+        """
+        return 200, {}, self.request(url, params, headers, verify_ssl, timeout)
+
+    def close(self):
+        """
+            Close every connection held by this transport.
+        """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class GDSession(GDTransport):
     """
-        Shortener for `v.gd url shortener <http://is.gd/developers.php>`_.
+        Pooled HTTP session used to talk with `is.gd - v.gd url shortener <http://is.gd/developers.php>`_.
 
-        :param timeout: Timeout in seconds used to connect and obtain shortened URL from .gd service
-        :type timeout: int.       
-        :param user_agent: User Agent used when querying .gd services
-        :type user_agent: str.    
+        Connections are kept alive and reused between calls, so only the first request to a host pays the TCP (and TLS) handshake.
+
+        A single session could be shared by several shorteners (for example an :class:`gdshortener.ISGDShortener` and
+        a :class:`gdshortener.VGDShortener`) and used by multiple threads at once: the connection pool is shared,
+        while every thread works on its own ``requests.Session`` so that no cookie or header state is shared between threads.
+
+        :param pool_connections: Number of host connection pools to keep
+        :type pool_connections: int.
+        :param pool_maxsize: Maximum number of connections kept open for each host
+        :type pool_maxsize: int.
+        :param pool_block: If True, requests wait for a free connection when *pool_maxsize* is reached instead of opening a throw-away one
+        :type pool_block: bool.
+        :param keep_alive: If False, every connection is closed after its request
+        :type keep_alive: bool.
     """
 
-    def __init__(self, timeout=60, user_agent='Mozilla/5.0 (compatible; GD Shortener Python Module - https://github.com/torre76/gd_shortener/)'):
+    def get(self, url, **kwargs):
         """
-            Init URL Shortener class
-            
-            :param timeout: Timeout in seconds used to connect and obtain shortened URL from .gd service
-            :type timeout: int.
-            :param user_agent: User Agent used when querying .gd services
-            :type user_agent: str.
+            Perform a GET request reusing a pooled connection.
+
+            :param url: URL to request
+            :type url: str.
+            :param kwargs: Further arguments accepted by ``requests.Session.get``
+
+            :returns: requests.Response.
+        """
+        return self._thread_session().get(url, **kwargs)
+
+    def request(self, url, params, headers, verify_ssl=True, timeout=None):
+        """
+            Perform a GET request over ``requests``, see :meth:`gdshortener.GDTransport.request`.
+        """
+        return self.fetch(url, params, headers, verify_ssl, timeout)[2]
+
+    def fetch(self, url, params, headers, verify_ssl=True, timeout=None):
+        """
+            Perform a GET request over ``requests``, see :meth:`gdshortener.GDTransport.fetch`.
+        """
+        import requests
+        try:
+            response = self.get(url, params=params, headers=headers, verify=verify_ssl, timeout=timeout)
+            return response.status_code, response.headers, response.content
+        except requests.exceptions.SSLError as ex:
+            raise GDSSLError(str(ex))
+        except requests.exceptions.Timeout as ex:
+            raise GDTimeoutError(str(ex))
+        except requests.exceptions.RequestException as ex:
+            raise GDGenericError(str(ex))
+
+    def close(self):
+        """
+            Close every pooled connection held by this session.
+        """
+        with self._lock:
+            sessions = list(self._sessions)
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+        if self._adapter is not None:
+            self._adapter.close()
+
+    def _thread_session(self):
+        """
+            Obtain the ``requests.Session`` bound to the calling thread, creating it on first use.
+
+            The session is forgotten when the thread exits; it is not closed, since that would close the shared pool.
+
+            :returns: requests.Session.
         """
-        GDBaseShortener.__init__(self, _V_GD_SHORTENER_URL_, timeout, user_agent)
+        holder = getattr(self._local, 'session', None)
+        if holder is None:
+            import requests
+            import requests.adapters
+            session = requests.Session()
+            with self._lock:
+                # The pool is shared by every thread; it is created on first use, so that requests is imported then
+                if self._adapter is None:
+                    self._adapter = requests.adapters.HTTPAdapter(**self._pool_settings)
+                    self._adapter.poolmanager.pool_classes_by_scheme = _timed_pool_classes()
+            session.mount('http://', self._adapter)
+            session.mount('https://', self._adapter)
+            if not self.keep_alive:
+                session.headers['Connection'] = 'close'
+            holder = self._local.session = _ThreadResource(session, self._lock, self._sessions, close=False)
+        return holder.resource
+
+    def __init__(self, pool_connections=2, pool_maxsize=10, pool_block=False, keep_alive=True):
+        """
+            Init the connection pool.
+
+            :param pool_connections: Number of host connection pools to keep
+            :type pool_connections: int.
+            :param pool_maxsize: Maximum number of connections kept open for each host
+            :type pool_maxsize: int.
+            :param pool_block: If True, requests wait for a free connection when *pool_maxsize* is reached instead of opening a throw-away one
+            :type pool_block: bool.
+            :param keep_alive: If False, every connection is closed after its request
+            :type keep_alive: bool.
+        """
+        self.keep_alive = keep_alive
+        self._pool_settings = {'pool_connections': pool_connections, 'pool_maxsize': pool_maxsize, 'pool_block': pool_block}
+        self._adapter = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._sessions = set()
+
+
+class GDUrllib3Transport(GDTransport):
+    """
+        Transport that works over ``urllib3`` connection pools directly, skipping the per-request overhead of ``requests``.
+
+        Like :class:`gdshortener.GDSession` it could be shared among shorteners and threads.
+
+        :param pool_connections: Number of host connection pools to keep
+        :type pool_connections: int.
+        :param pool_maxsize: Maximum number of connections kept open for each host
+        :type pool_maxsize: int.
+        :param pool_block: If True, requests wait for a free connection when *pool_maxsize* is reached instead of opening a throw-away one
+        :type pool_block: bool.
+        :param keep_alive: If False, every connection is closed after its request
+        :type keep_alive: bool.
+    """
+
+    def request(self, url, params, headers, verify_ssl=True, timeout=None):
+        """
+            Perform a GET request over ``urllib3``, see :meth:`gdshortener.GDTransport.request`.
+        """
+        return self.fetch(url, params, headers, verify_ssl, timeout)[2]
+
+    def fetch(self, url, params, headers, verify_ssl=True, timeout=None):
+        """
+            Perform a GET request over ``urllib3``, see :meth:`gdshortener.GDTransport.fetch`.
+        """
+        import urllib3
+        connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        if not self.keep_alive:
+            headers = dict(headers, Connection='close')
+        try:
+            response = self._managers[bool(verify_ssl)].request(
+                'GET', url, fields=params, headers=headers, retries=False,
+                timeout=urllib3.Timeout(connect=connect_timeout, read=read_timeout))
+        except urllib3.exceptions.SSLError as ex:
+            raise GDSSLError(str(ex))
+        except urllib3.exceptions.NewConnectionError as ex:
+            # Subclass of ConnectTimeoutError, but a refused connection is no timeout (as for requests)
+            raise GDGenericError(str(ex))
+        except urllib3.exceptions.TimeoutError as ex:
+            raise GDTimeoutError(str(ex))
+        except urllib3.exceptions.HTTPError as ex:
+            raise GDGenericError(str(ex))
+        return response.status, response.headers, response.data
+
+    def close(self):
+        """
+            Close every pooled connection held by this transport.
+        """
+        for manager in self._managers.values():
+            manager.clear()
+
+    def __init__(self, pool_connections=2, pool_maxsize=10, pool_block=False, keep_alive=True):
+        """
+            Init the connection pools.
+
+            :param pool_connections: Number of host connection pools to keep
+            :type pool_connections: int.
+            :param pool_maxsize: Maximum number of connections kept open for each host
+            :type pool_maxsize: int.
+            :param pool_block: If True, requests wait for a free connection when *pool_maxsize* is reached instead of opening a throw-away one
+            :type pool_block: bool.
+            :param keep_alive: If False, every connection is closed after its request
+            :type keep_alive: bool.
+        """
+        import urllib3
+        self.keep_alive = keep_alive
+        # Certificate verification is set per pool manager, so verified and unverified requests use different ones
+        self._managers = dict(
+            (verify_ssl, urllib3.PoolManager(num_pools=pool_connections, maxsize=pool_maxsize, block=pool_block,
+                                             cert_reqs='CERT_REQUIRED' if verify_ssl else 'CERT_NONE'))
+            for verify_ssl in (True, False))
+        for manager in self._managers.values():
+            manager.pool_classes_by_scheme = _timed_pool_classes()
+
+
+class _IdleConnections(object):
+    """
+        Idle ``http.client`` connections of a thread, keyed by scheme, host and certificate verification.
+    """
+
+    __slots__ = ('connections',)
+
+    def close(self):
+        connections = list(self.connections.values())
+        self.connections.clear()
+        for connection in connections:
+            connection.close()
+
+    def __init__(self):
+        self.connections = {}
+
+
+class GDHTTPClientTransport(GDTransport):
+    """
+        Transport that works over ``http.client`` connections, the lowest overhead option available in the standard library.
+
+        Every thread keeps one keep-alive connection for each host it talks with; a request that finds its idle connection
+        closed by the server is sent again once on a new connection. Certificates are verified against the system CA store.
+
+        :param keep_alive: If False, every connection is closed after its request
+        :type keep_alive: bool.
+    """
+
+    def request(self, url, params, headers, verify_ssl=True, timeout=None):
+        """
+            Perform a GET request over ``http.client``, see :meth:`gdshortener.GDTransport.request`.
+        """
+        return self.fetch(url, params, headers, verify_ssl, timeout)[2]
+
+    def fetch(self, url, params, headers, verify_ssl=True, timeout=None):
+        """
+            Perform a GET request over ``http.client``, see :meth:`gdshortener.GDTransport.fetch`.
+        """
+        import socket
+        import ssl
+        import http.client as httplib
+        scheme, netloc, path = urlsplit(url)[:3]
+        target = '{0}?{1}'.format(path or '/', urlencode(params)) if params else path or '/'
+        connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        if not self.keep_alive:
+            headers = dict(headers, Connection='close')
+        key = (scheme, netloc, bool(verify_ssl))
+        connections = self._thread_connections()
+        while True:
+            connection = connections.pop(key, None)
+            reused = connection is not None
+            if connection is None:
+                connection = self._connection(scheme, netloc, verify_ssl, connect_timeout)
+            try:
+                if connection.sock is None:
+                    started = _clock()
+                    try:
+                        connection.connect()
+                    finally:
+                        _connect_timer.elapsed = getattr(_connect_timer, 'elapsed', 0) + _clock() - started
+                connection.sock.settimeout(read_timeout)
+                connection.request('GET', target, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except ssl.SSLError as ex:
+                connection.close()
+                raise GDSSLError(str(ex))
+            except socket.timeout as ex:
+                connection.close()
+                raise GDTimeoutError(str(ex) or 'Timeout while waiting for .gd service')
+            except (httplib.HTTPException, socket.error) as ex:
+                connection.close()
+                if reused:
+                    # The server closed the idle connection: send the request again on a new one
+                    continue
+                raise GDGenericError(str(ex))
+            if self.keep_alive and not response.will_close:
+                connections[key] = connection
+            else:
+                connection.close()
+            return response.status, response.msg, body
+
+    def close(self):
+        """
+            Close every connection held by this transport, whatever thread opened it.
+        """
+        with self._lock:
+            pools = list(self._pools)
+            self._pools.clear()
+            # The old holders must be released after the lock, so that they find their connections forgotten
+            local, self._local = self._local, threading.local()
+        for connections in pools:
+            connections.close()
+
+    def _connection(self, scheme, netloc, verify_ssl, timeout):
+        """
+            Create a not yet connected ``http.client`` connection to *netloc*.
+        """
+        import ssl
+        import http.client as httplib
+        if scheme == 'https':
+            context = ssl.create_default_context() if verify_ssl else ssl._create_unverified_context()
+            return httplib.HTTPSConnection(netloc, timeout=timeout, context=context)
+        return httplib.HTTPConnection(netloc, timeout=timeout)
+
+    def _thread_connections(self):
+        """
+            Obtain the idle connections of the calling thread, keyed by scheme, host and certificate verification.
+
+            They are closed when the thread exits, so that threads started by every bulk call do not pile up sockets
+            until :meth:`close`.
+
+            :returns: dict.
+        """
+        local = self._local
+        holder = getattr(local, 'connections', None)
+        if holder is None or holder.pid != os.getpid():
+            holder = local.connections = _ThreadResource(_IdleConnections(), self._lock, self._pools)
+        return holder.resource.connections
+
+    def __init__(self, keep_alive=True):
+        """
+            Init the transport.
+
+            :param keep_alive: If False, every connection is closed after its request
+            :type keep_alive: bool.
+        """
+        self.keep_alive = keep_alive
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pools = set()
+
+
+class GDFakeTransport(GDTransport):
+    """
+        In-process stand-in for .gd services: requests are answered in memory, without opening any socket.
+
+        It is meant to test and load test applications: short codes are generated from a counter, so the same sequence
+        of calls always yields the same short URLs, and shortening an URL again returns its previous short URL.
+        Requests served are counted in :attr:`requests`.
+
+        Short URLs created with stats count the lookups of their short code, served by ``stats.php`` pages that carry
+        an ``ETag`` and answer conditional requests with ``304 Not Modified``.
+    """
+
+    def inject(self, error_code, times=1):
+        """
+            Answer the next *times* requests with the .gd error *error_code*.
+
+            :param error_code: Error code stated by .gd service (1 to 4)
+            :type error_code: int.
+            :param times: Number of requests answered with the error
+            :type times: int.
+        """
+        with self._lock:
+            self._failures.extend([error_code] * times)
+
+    def request(self, url, params, headers, verify_ssl=True, timeout=None):
+        """
+            Answer a request to a .gd API page in process, see :meth:`gdshortener.GDTransport.request`.
+        """
+        return self.fetch(url, params, headers, verify_ssl, timeout)[2]
+
+    def fetch(self, url, params, headers, verify_ssl=True, timeout=None):
+        """
+            Answer a request to a .gd page in process, see :meth:`gdshortener.GDTransport.fetch`.
+        """
+        base_url, _, page = url.rpartition('/')
+        with self._lock:
+            self.requests += 1
+            if self._failures:
+                error_code = self._failures.popleft()
+                response = {'errorcode': error_code, 'errormessage': 'Injected error {0}'.format(error_code)}
+            elif page == 'create.php':
+                response = self._create(base_url, params)
+            elif page == 'forward.php':
+                response = self._forward(params)
+            elif page == 'stats.php':
+                return self._stats(base_url, params, headers)
+            else:
+                return 404, {}, b'Not Found'
+        return 200, {}, json.dumps(response).encode('utf-8')
+
+    def _create(self, base_url, params):
+        url = params.get('url')
+        if not url:
+            return {'errorcode': 1, 'errormessage': 'Please specify a URL to shorten.'}
+        code = params.get('shorturl')
+        if code is None:
+            code = self._codes.get(url)
+            if code is None:
+                code = self._next_code()
+        elif self._urls.get(code, url) != url:
+            return {'errorcode': 2, 'errormessage': 'The shortened URL you picked already exists, please choose another.'}
+        self._urls[code] = url
+        self._codes.setdefault(url, code)
+        if str(params.get('logstats')) == '1':
+            self._clicks.setdefault(code, 0)
+        return {'shorturl': '{0}/{1}'.format(base_url, code)}
+
+    def _forward(self, params):
+        code = _short_code(params.get('shorturl', ''))
+        url = self._urls.get(code)
+        if url is None:
+            return {'errorcode': 2, 'errormessage': 'The shortened URL you specified does not exist.'}
+        if code in self._clicks:
+            self._clicks[code] += 1
+        return {'url': url}
+
+    def _stats(self, base_url, params, headers):
+        code = params.get('url', '')
+        if code not in self._clicks:
+            return 404, {}, b'Not Found'
+        # The page only changes with the click count
+        etag = '"{0}-{1}"'.format(code, self._clicks[code])
+        if headers.get('If-None-Match') == etag:
+            return 304, {'etag': etag}, b''
+        page = _FAKE_STATS_PAGE_.format(short_url=_escape('{0}/{1}'.format(base_url, code)), url=_escape(self._urls[code]),
+                                        clicks=self._clicks[code])
+        return 200, {'etag': etag, 'content-type': 'text/html; charset=utf-8'}, page.encode('utf-8')
+
+    def _next_code(self):
+        # From 5 characters on, generated codes could be taken by custom short URLs already: those are skipped
+        while True:
+            value = self._counter = self._counter + 1
+            code = ''
+            while value:
+                value, digit = divmod(value, len(_FAKE_CODE_ALPHABET_))
+                code = _FAKE_CODE_ALPHABET_[digit] + code
+            if code not in self._urls:
+                return code
+
+    def __init__(self):
+        """
+            Init the transport with no shortened URL.
+        """
+        self.requests = 0
+        self._counter = 0
+        self._urls = {}
+        self._codes = {}
+        self._clicks = {}
+        self._failures = collections.deque()
+        self._lock = threading.Lock()
+
+
+class GDRateLimiter(object):
+    """
+        Token bucket that paces requests to `is.gd - v.gd url shortener <http://is.gd/developers.php>`_ within its `usage limits <http://is.gd/usagelimits.php>`_.
+
+        Every lookup costs one token and every shorten costs one token, two if stats are requested (.gd counts them double).
+        Tokens are refilled at *rate* per second up to *capacity*. A caller that finds the bucket empty waits for its turn
+        instead of being throttled by .gd service. The bucket could be shared by several shorteners and threads.
+
+        :param rate: Tokens refilled every second
+        :type rate: float.
+        :param capacity: Maximum number of tokens stored, i.e. the largest burst allowed (defaults to *rate*)
+        :type capacity: float.
+    """
+
+    def acquire(self, tokens=1):
+        """
+            Take *tokens* from the bucket, sleeping until they are available.
+
+            :param tokens: Number of tokens requested
+            :type tokens: int.
+        """
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    def reserve(self, tokens=1):
+        """
+            Take *tokens* from the bucket without waiting.
+
+            The bucket could go in debt: the caller is expected to wait the returned delay before performing its request
+            (asyncio callers use this method to wait without blocking the event loop).
+
+            :param tokens: Number of tokens requested
+            :type tokens: int.
+
+            :returns: float. -- Seconds to wait before the tokens are actually available
+        """
+        return self._update(tokens)
+
+    def refund(self, tokens=1):
+        """
+            Give back *tokens* taken by :meth:`reserve` for a request that is not performed after all, so that they do
+            not delay the other callers of the bucket.
+
+            :param tokens: Number of tokens given back
+            :type tokens: int.
+        """
+        self._update(-tokens)
+
+    def _update(self, tokens):
+        """
+            Take *tokens* from the bucket (give them back if negative) under the bucket lock, see :meth:`_take`.
+        """
+        with self._lock:
+            return self._take(tokens)
+
+    def _take(self, tokens):
+        """
+            Refill the bucket, take *tokens* from it and return the seconds to wait for them. Callers hold the bucket lock.
+        """
+        available, updated = self._load()
+        now = time.time()
+        # Tokens given back do not fill the bucket beyond its capacity
+        available = min(self.capacity, min(self.capacity, available + (now - updated) * self.rate) - tokens)
+        self._store(available, now)
+        return -available / self.rate if available < 0 else 0.0
+
+    def _load(self):
+        """
+            Return the tokens stored in the bucket and the time they were last updated.
+        """
+        return self._tokens, self._updated
+
+    def _store(self, tokens, updated):
+        """
+            Save the tokens stored in the bucket and the time they were updated.
+        """
+        self._tokens = tokens
+        self._updated = updated
+
+    def __init__(self, rate, capacity=None):
+        """
+            Init the bucket full.
+
+            :param rate: Tokens refilled every second
+            :type rate: float.
+            :param capacity: Maximum number of tokens stored, i.e. the largest burst allowed (defaults to *rate*)
+            :type capacity: float.
+        """
+        if rate <= 0:
+            raise ValueError('rate must be a positive number')
+        self.rate = float(rate)
+        self.capacity = float(rate if capacity is None else capacity)
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated = time.time()
+
+
+class GDFileRateLimiter(GDRateLimiter):
+    """
+        :class:`gdshortener.GDRateLimiter` whose bucket is stored in a file, so that it is shared by every process using the same *path*.
+
+        The file is locked while the bucket is updated, which makes it safe for concurrent processes on the same host (POSIX only).
+
+        :param path: File holding the bucket state; it is created if missing
+        :type path: str.
+        :param rate: Tokens refilled every second
+        :type rate: float.
+        :param capacity: Maximum number of tokens stored, i.e. the largest burst allowed (defaults to *rate*)
+        :type capacity: float.
+    """
+
+    _STATE_ = struct.Struct('<dd')
+
+    def _update(self, tokens):
+        """
+            Take *tokens* from the shared bucket (give them back if negative) under the bucket lock and the file lock.
+        """
+        with self._lock:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                # The lock is released when the file is closed
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                self._fd = fd
+                return self._take(tokens)
+            finally:
+                self._fd = None
+                os.close(fd)
+
+    def _load(self):
+        state = os.read(self._fd, self._STATE_.size)
+        if len(state) < self._STATE_.size:
+            # New bucket: start full
+            return self.capacity, time.time()
+        return self._STATE_.unpack(state)
+
+    def _store(self, tokens, updated):
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        os.write(self._fd, self._STATE_.pack(tokens, updated))
+
+    def __getstate__(self):
+        # Only the settings are pickled: the bucket itself stays in the file, so copies sent to other processes share it
+        return {'path': self.path, 'rate': self.rate, 'capacity': self.capacity}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'], state['rate'], state['capacity'])
+
+    def __init__(self, path, rate, capacity=None):
+        """
+            Init the bucket, sharing the state already stored in *path* if any.
+
+            :param path: File holding the bucket state; it is created if missing
+            :type path: str.
+            :param rate: Tokens refilled every second
+            :type rate: float.
+            :param capacity: Maximum number of tokens stored, i.e. the largest burst allowed (defaults to *rate*)
+            :type capacity: float.
+        """
+        if fcntl is None:
+            raise NotImplementedError('GDFileRateLimiter requires fcntl, which is not available on this platform')
+        GDRateLimiter.__init__(self, rate, capacity)
+        self.path = path
+        self._fd = None
+
+
+class GDRetryPolicy(object):
+    """
+        Policy that retries requests failed because of transient .gd errors, waiting an exponential backoff with full jitter between attempts.
+
+        Errors on the provided URL (code *1*) or short URL (code *2*) never succeed on retry, so they are never retried.
+        The policy counts the retries it grants and could be shared among shorteners and threads.
+
+        :param max_attempts: Maximum number of attempts for each call, first one included
+        :type max_attempts: int.
+        :param base_delay: Seconds waited before the first retry; the wait doubles on every further retry
+        :type base_delay: float.
+        :param max_delay: Maximum seconds waited before a retry
+        :type max_delay: float.
+        :param jitter: If True, the wait is picked at random between zero and the backoff (full jitter)
+        :type jitter: bool.
+        :param retry_codes: Error codes that are retried (see :attr:`gdshortener.GDBaseException.error_code`)
+        :type retry_codes: iterable of int.
+    """
+
+    @property
+    def retries(self):
+        """
+            Number of retries granted so far.
+
+            :returns: int.
+        """
+        return self._retries
+
+    @property
+    def retries_by_code(self):
+        """
+            Number of retries granted so far for every error code.
+
+            :returns: dict.
+        """
+        with self._lock:
+            return dict(self._retries_by_code)
+
+    @property
+    def exhausted(self):
+        """
+            Number of calls that failed with a retryable error after using all their attempts.
+
+            :returns: int.
+        """
+        return self._exhausted
+
+    def backoff(self, error, attempt):
+        """
+            State if a failed attempt has to be retried.
+
+            :param error: The error raised by the attempt
+            :type error: :class:`gdshortener.GDBaseException`
+            :param attempt: Number of the failed attempt, starting from zero
+            :type attempt: int.
+
+            :returns: float. -- Seconds to wait before retrying, or ``None`` if the error must be raised
+        """
+        if error.error_code not in self.retry_codes:
+            return None
+        with self._lock:
+            if attempt + 1 >= self.max_attempts:
+                self._exhausted += 1
+                return None
+            self._retries += 1
+            self._retries_by_code[error.error_code] = self._retries_by_code.get(error.error_code, 0) + 1
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return random.uniform(0, delay) if self.jitter else delay
+
+    def __init__(self, max_attempts=5, base_delay=0.5, max_delay=30, jitter=True, retry_codes=(3, 4, 6)):
+        """
+            Init the retry policy.
+
+            :param max_attempts: Maximum number of attempts for each call, first one included
+            :type max_attempts: int.
+            :param base_delay: Seconds waited before the first retry; the wait doubles on every further retry
+            :type base_delay: float.
+            :param max_delay: Maximum seconds waited before a retry
+            :type max_delay: float.
+            :param jitter: If True, the wait is picked at random between zero and the backoff (full jitter)
+            :type jitter: bool.
+            :param retry_codes: Error codes that are retried (see :attr:`gdshortener.GDBaseException.error_code`)
+            :type retry_codes: iterable of int.
+
+            :raises: **ValueError** if *max_attempts* is not positive or *retry_codes* contains code 1 or 2
+        """
+        if max_attempts < 1:
+            raise ValueError('max_attempts must be a positive integer')
+        retry_codes = frozenset(retry_codes)
+        if retry_codes & frozenset((1, 2)):
+            raise ValueError('Errors on provided URLs (codes 1 and 2) can not be retried')
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.retry_codes = retry_codes
+        self._lock = threading.Lock()
+        self._retries = 0
+        self._retries_by_code = {}
+        self._exhausted = 0
+
+
+class GDCircuitBreaker(object):
+    """
+        Circuit breaker that stops sending requests to a failing .gd service for a while.
+
+        The breaker opens after *failure_threshold* consecutive failures and refuses calls for *reset_timeout* seconds;
+        then a single trial call is let through (half open state): its success closes the breaker, its failure opens it again.
+
+        :param failure_threshold: Consecutive failures that open the breaker
+        :type failure_threshold: int.
+        :param reset_timeout: Seconds the breaker stays open before letting a trial call through
+        :type reset_timeout: float.
+        :param failure_codes: Error codes counted as failures of the service; other errors (e.g. a malformed URL) count as successes
+        :type failure_codes: iterable of int.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    @property
+    def state(self):
+        """
+            State of the breaker: :attr:`CLOSED`, :attr:`OPEN` or :attr:`HALF_OPEN` (a trial call is in flight).
+
+            :returns: str.
+        """
+        return self._state
+
+    @property
+    def opened(self):
+        """
+            Number of times the breaker opened.
+
+            :returns: int.
+        """
+        return self._opened
+
+    def allow(self):
+        """
+            State if a call could be sent now. A call allowed on an open breaker is its trial call and must be recorded.
+
+            :returns: bool.
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.time() >= self._opened_at + self.reset_timeout:
+                self._state = self.HALF_OPEN
+                return True
+            return False
+
+    def record(self, error=None):
+        """
+            Record the outcome of an allowed call.
+
+            :param error: The error raised by the call, ``None`` if it succeeded
+            :type error: :class:`gdshortener.GDBaseException`
+        """
+        with self._lock:
+            if error is None or error.error_code not in self.failure_codes:
+                self._failures = 0
+                self._state = self.CLOSED
+                return
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self._opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.time()
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, failure_codes=(3, 4, 6)):
+        """
+            Init a closed circuit breaker.
+
+            :param failure_threshold: Consecutive failures that open the breaker
+            :type failure_threshold: int.
+            :param reset_timeout: Seconds the breaker stays open before letting a trial call through
+            :type reset_timeout: float.
+            :param failure_codes: Error codes counted as failures of the service; other errors (e.g. a malformed URL) count as successes
+            :type failure_codes: iterable of int.
+
+            :raises: **ValueError** if *failure_threshold* is not positive
+        """
+        if failure_threshold < 1:
+            raise ValueError('failure_threshold must be a positive integer')
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failure_codes = frozenset(failure_codes)
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened = 0
+        self._opened_at = 0
+
+
+class GDConcurrencyLimiter(object):
+    """
+        Adaptive limit of the requests in flight to .gd services, shared by threads and asyncio tasks.
+
+        The limit grows by *increase* every time a full limit of requests succeeds while it is in use and their latency
+        stays within *tolerance* times the baseline (a slow moving average of past latencies). It is multiplied by
+        *decrease* when a request fails with one of *backoff_codes* (rate limit and timeout by default) or its latency
+        exceeds the tolerance; failures of requests sent before the previous decrease do not shrink it again, so a burst
+        of errors caused by the same overload counts once. Every change is kept in :attr:`history`.
+
+        :param initial_limit: Requests allowed in flight at first
+        :type initial_limit: int.
+        :param min_limit: Lowest limit reached by decreases
+        :type min_limit: int.
+        :param max_limit: Highest limit reached by increases
+        :type max_limit: int.
+        :param increase: Requests added to the limit every full limit of successful requests
+        :type increase: float.
+        :param decrease: Factor the limit is multiplied by on back off
+        :type decrease: float.
+        :param tolerance: Latency, as a multiple of the baseline, beyond which requests back off
+        :type tolerance: float.
+        :param min_spike: Seconds a latency must exceed the baseline by to make requests back off, so that the jitter
+            of very fast requests is not taken for a spike
+        :type min_spike: float.
+        :param backoff_codes: Error codes that make requests back off
+        :type backoff_codes: iterable of int.
+        :param history_size: Changes of the limit kept in :attr:`history`
+        :type history_size: int.
+    """
+
+    @property
+    def limit(self):
+        """
+            Requests allowed in flight now.
+
+            :returns: int.
+        """
+        return int(self._limit)
+
+    @property
+    def in_flight(self):
+        """
+            Requests in flight now.
+
+            :returns: int.
+        """
+        return self._in_flight
+
+    @property
+    def latency(self):
+        """
+            Baseline latency in seconds, ``None`` until a request succeeds.
+
+            :returns: float.
+        """
+        return self._latency
+
+    @property
+    def history(self):
+        """
+            Latest changes of the limit, oldest first.
+
+            :returns: list -- ``(time, limit, reason)`` tuples, *reason* being ``increase``, ``latency`` or the code
+                of the error that made the limit decrease
+        """
+        with self._lock:
+            return list(self._history)
+
+    def acquire(self, timeout=None):
+        """
+            Wait until a request could be sent without exceeding the limit.
+
+            :param timeout: Seconds allowed to wait (no limit if ``None``)
+            :type timeout: float.
+
+            :returns: float. -- Start time of the request, to be given back to :meth:`release`
+            :raises: :class:`gdshortener.GDTimeoutError` if the limit does not allow the request within *timeout*
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._in_flight < int(self._limit), timeout):
+                raise GDTimeoutError('The concurrency limit does not allow the request in time')
+            self._in_flight += 1
+        return time.time()
+
+    async def acquire_async(self, timeout=None):
+        """
+            Wait, without blocking the event loop, until a request could be sent without exceeding the limit.
+
+            :param timeout: Seconds allowed to wait (no limit if ``None``)
+            :type timeout: float.
+
+            :returns: float. -- Start time of the request, to be given back to :meth:`release`
+            :raises: :class:`gdshortener.GDTimeoutError` if the limit does not allow the request within *timeout*
+        """
+        import asyncio
+        loop = asyncio.get_event_loop()
+        deadline_at = None if timeout is None else time.time() + timeout
+        while True:
+            with self._lock:
+                if self._in_flight < int(self._limit):
+                    self._in_flight += 1
+                    return time.time()
+                waiter = loop.create_future()
+                self._waiters.append((loop, waiter))
+            try:
+                await asyncio.wait_for(waiter, None if deadline_at is None else max(0.0, deadline_at - time.time()))
+            except asyncio.TimeoutError:
+                raise GDTimeoutError('The concurrency limit does not allow the request in time')
+            finally:
+                if not waiter.done() or waiter.cancelled():
+                    with self._lock:
+                        if (loop, waiter) in self._waiters:
+                            self._waiters.remove((loop, waiter))
+                        else:
+                            # Woken up but gone: the slot goes to somebody else
+                            self._wake()
+
+    def release(self, started, error=None):
+        """
+            Record the end of a request and adapt the limit to its outcome.
+
+            :param started: Start time of the request, as returned by :meth:`acquire` or :meth:`acquire_async`
+            :type started: float.
+            :param error: The error raised by the request, ``None`` if it succeeded
+            :type error: :class:`gdshortener.GDBaseException`
+        """
+        now = time.time()
+        latency = now - started
+        with self._lock:
+            saturated = self._in_flight >= int(self._limit)
+            self._in_flight -= 1
+            if error is not None:
+                if error.error_code in self.backoff_codes:
+                    self._back_off(started, now, error.error_code)
+            elif self._latency is not None and latency > max(self._latency * self.tolerance,
+                                                              self._latency + self.min_spike):
+                self._back_off(started, now, 'latency')
+            else:
+                self._latency = latency if self._latency is None else self._latency + 0.1 * (latency - self._latency)
+                if saturated and self._limit < self.max_limit:
+                    previous = int(self._limit)
+                    self._limit = min(self.max_limit, self._limit + self.increase / self._limit)
+                    if int(self._limit) != previous:
+                        self._history.append((now, int(self._limit), 'increase'))
+            self._wake()
+
+    def _back_off(self, started, now, reason):
+        """
+            Decrease the limit, unless the request was sent before the previous decrease. Callers hold the lock.
+        """
+        if started < self._decreased_at:
+            return
+        self._decreased_at = now
+        self._limit = max(self.min_limit, self._limit * self.decrease)
+        self._history.append((now, int(self._limit), reason))
+
+    def _wake(self):
+        """
+            Wake up the threads and as many asyncio tasks as there are free slots. Callers hold the lock.
+        """
+        self._condition.notify_all()
+        free = int(self._limit) - self._in_flight
+        while free > 0 and self._waiters:
+            loop, waiter = self._waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(_wake_waiter, waiter)
+            except RuntimeError:
+                # The loop of the waiter is closed
+                continue
+            free -= 1
+
+    def __init__(self, initial_limit=10, min_limit=1, max_limit=100, increase=1.0, decrease=0.5, tolerance=2.0,
+                 min_spike=0.005, backoff_codes=(3, 6), history_size=1000):
+        """
+            Init the limiter.
+
+            :param initial_limit: Requests allowed in flight at first
+            :type initial_limit: int.
+            :param min_limit: Lowest limit reached by decreases
+            :type min_limit: int.
+            :param max_limit: Highest limit reached by increases
+            :type max_limit: int.
+            :param increase: Requests added to the limit every full limit of successful requests
+            :type increase: float.
+            :param decrease: Factor the limit is multiplied by on back off
+            :type decrease: float.
+            :param tolerance: Latency, as a multiple of the baseline, beyond which requests back off
+            :type tolerance: float.
+            :param min_spike: Seconds a latency must exceed the baseline by to make requests back off
+            :type min_spike: float.
+            :param backoff_codes: Error codes that make requests back off
+            :type backoff_codes: iterable of int.
+            :param history_size: Changes of the limit kept in :attr:`history`
+            :type history_size: int.
+
+            :raises: **ValueError** if the limits are not positive and ordered, or *decrease* is not between 0 and 1
+        """
+        if not 1 <= min_limit <= initial_limit <= max_limit:
+            raise ValueError('Limits must satisfy 1 <= min_limit <= initial_limit <= max_limit')
+        if not 0 < decrease < 1:
+            raise ValueError('decrease must be between 0 and 1')
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.tolerance = tolerance
+        self.min_spike = min_spike
+        self.backoff_codes = frozenset(backoff_codes)
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._waiters = collections.deque()
+        self._limit = float(initial_limit)
+        self._in_flight = 0
+        self._latency = None
+        self._decreased_at = 0.0
+        self._history = collections.deque(maxlen=history_size)
+
+
+def _wake_waiter(waiter):
+    """
+        Wake up an asyncio task waiting in :meth:`gdshortener.GDConcurrencyLimiter.acquire_async`, if it still waits.
+    """
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class GDStats(object):
+    """
+        Statistics of a stats enabled short URL, as read from its ``stats.php`` page.
+
+        Instances only hold slots, so millions of them fit in little memory; :meth:`as_tuple` gives an even more compact
+        form, e.g. to serialize large result sets.
+
+        :param short_url: Short URL the statistics are about
+        :type short_url: str.
+        :param url: Original URL, or ``None`` if the page does not state it
+        :type url: str.
+        :param clicks: Number of times the short URL was followed
+        :type clicks: int.
+        :param fetched: Time (as returned by ``time.time()``) the statistics were last fetched or revalidated
+        :type fetched: float.
+        :param etag: ``ETag`` of the page, used to revalidate it
+        :type etag: str.
+        :param last_modified: ``Last-Modified`` date of the page, used to revalidate it
+        :type last_modified: str.
+    """
+
+    __slots__ = ('short_url', 'url', 'clicks', 'fetched', 'etag', 'last_modified')
+
+    @property
+    def short_code(self):
+        """
+            Short code of the short URL.
+
+            :returns: str.
+        """
+        return _short_code(self.short_url)
+
+    def as_tuple(self):
+        """
+            Return the statistics as a ``(short_url, url, clicks, fetched, etag, last_modified)`` tuple.
+
+            :returns: tuple.
+        """
+        return self.short_url, self.url, self.clicks, self.fetched, self.etag, self.last_modified
+
+    def revalidated(self, fetched):
+        """
+            Return a copy of the statistics confirmed unchanged at *fetched*.
+
+            :returns: :class:`gdshortener.GDStats`
+        """
+        return GDStats(self.short_url, self.url, self.clicks, fetched, self.etag, self.last_modified)
+
+    def __eq__(self, other):
+        return isinstance(other, GDStats) and self.as_tuple() == other.as_tuple()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.as_tuple())
+
+    def __repr__(self):
+        return "<GDStats({0}, {1}, clicks={2})>".format(self.short_url, self.url, self.clicks)
+
+    def __getstate__(self):
+        return self.as_tuple()
+
+    def __setstate__(self, state):
+        self.short_url, self.url, self.clicks, self.fetched, self.etag, self.last_modified = state
+
+    def __init__(self, short_url, url, clicks, fetched, etag=None, last_modified=None):
+        """
+            Init the statistics.
+
+            :param short_url: Short URL the statistics are about
+            :type short_url: str.
+            :param url: Original URL, or ``None`` if the page does not state it
+            :type url: str.
+            :param clicks: Number of times the short URL was followed
+            :type clicks: int.
+            :param fetched: Time the statistics were last fetched or revalidated
+            :type fetched: float.
+            :param etag: ``ETag`` of the page
+            :type etag: str.
+            :param last_modified: ``Last-Modified`` date of the page
+            :type last_modified: str.
+        """
+        self.short_url = short_url
+        self.url = url
+        self.clicks = clicks
+        self.fetched = fetched
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+class GDShortenResult(tuple):
+    """
+        Result of a shorten request: the short URL and, if stats were requested, the URL of its stats page.
+
+        It is the ``(short_url, stats_url)`` tuple returned by earlier versions (it could be unpacked, indexed, compared
+        with tuples and serialized to JSON), with named accessors and no per instance dictionary.
+
+        :param short_url: Shortened URL
+        :type short_url: str.
+        :param stats_url: Stats URL, ``None`` if stats were not requested
+        :type stats_url: str.
+    """
+
+    __slots__ = ()
+
+    @property
+    def short_url(self):
+        """
+            Shortened URL.
+
+            :returns: str.
+        """
+        return self[0]
+
+    @property
+    def stats_url(self):
+        """
+            Stats URL, ``None`` if stats were not requested.
+
+            :returns: str.
+        """
+        return self[1]
+
+    @property
+    def short_code(self):
+        """
+            Short code of the short URL.
+
+            :returns: str.
+        """
+        return _short_code(self[0])
+
+    def as_tuple(self):
+        """
+            Return the result as a plain ``(short_url, stats_url)`` tuple.
+
+            :returns: tuple.
+        """
+        return tuple(self)
+
+    def __repr__(self):
+        return "<GDShortenResult({0}, {1})>".format(self[0], self[1])
+
+    def __getnewargs__(self):
+        return tuple(self)
+
+    def __new__(cls, short_url, stats_url=None):
+        """
+            Build the result.
+
+            :param short_url: Shortened URL
+            :type short_url: str.
+            :param stats_url: Stats URL, ``None`` if stats were not requested
+            :type stats_url: str.
+        """
+        return tuple.__new__(cls, (short_url, stats_url))
+
+
+class GDLookupResult(object):
+    """
+        Result of the lookup of a short URL found by :class:`gdshortener.GDLookupResolver`.
+
+        It behaves like a ``(short_url, url)`` tuple (it could be unpacked, indexed and compared with tuples) but only
+        holds slots.
+
+        :param short_url: Short URL looked up
+        :type short_url: str.
+        :param url: Original URL, or the :class:`gdshortener.GDBaseException` raised by the lookup
+        :type url: str or :class:`gdshortener.GDBaseException`
+    """
+
+    __slots__ = ('short_url', 'url')
+
+    @property
+    def error(self):
+        """
+            Error raised by the lookup, ``None`` if it succeeded.
+
+            :returns: :class:`gdshortener.GDBaseException`
+        """
+        return self.url if isinstance(self.url, GDBaseException) else None
+
+    @property
+    def short_code(self):
+        """
+            Short code of the short URL.
+
+            :returns: str.
+        """
+        return _short_code(self.short_url)
+
+    def as_tuple(self):
+        """
+            Return the result as a ``(short_url, url)`` tuple.
+
+            :returns: tuple.
+        """
+        return self.short_url, self.url
+
+    def __iter__(self):
+        return iter(self.as_tuple())
+
+    def __len__(self):
+        return 2
+
+    def __getitem__(self, index):
+        return self.as_tuple()[index]
+
+    def __eq__(self, other):
+        if isinstance(other, GDLookupResult):
+            other = other.as_tuple()
+        return isinstance(other, tuple) and self.as_tuple() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.as_tuple())
+
+    def __repr__(self):
+        return "<GDLookupResult({0}, {1!r})>".format(self.short_url, self.url)
+
+    def __getstate__(self):
+        return self.as_tuple()
+
+    def __setstate__(self, state):
+        self.short_url, self.url = state
+
+    def __init__(self, short_url, url):
+        """
+            Init the result.
+
+            :param short_url: Short URL looked up
+            :type short_url: str.
+            :param url: Original URL, or the :class:`gdshortener.GDBaseException` raised by the lookup
+            :type url: str or :class:`gdshortener.GDBaseException`
+        """
+        self.short_url = short_url
+        self.url = url
+
+
+class GDResultTable(object):
+    """
+        Columnar table of bulk shorten and lookup results, holding millions of rows in a few flat buffers.
+
+        Every row has an original URL, a short URL, an optional stats URL and an error code (``0`` for success). Original
+        URLs and short codes are stored as UTF-8 bytes one after the other, with the offsets of their ends; the prefixes of
+        short and stats URLs (e.g. ``http://is.gd/``) are interned and referenced by index; error codes are single bytes
+        (error descriptions are not kept). :meth:`to_buffers` exposes the columns in an Arrow-like layout, and
+        :meth:`write_csv` and :meth:`write_jsonl` export them without building any result object.
+    """
+
+    FIELDS = ('url', 'short_url', 'stats_url', 'error_code')
+
+    @property
+    def errors(self):
+        """
+            Number of failed rows.
+
+            :returns: int.
+        """
+        return len(self._errors) - self._errors.count(0)
+
+    @property
+    def nbytes(self):
+        """
+            Bytes held by the buffers of the table.
+
+            :returns: int.
+        """
+        arrays = (self._url_offsets, self._code_offsets, self._prefixes, self._stats, self._errors)
+        return (len(self._urls) + len(self._codes) + sum(len(array) * array.itemsize for array in arrays) +
+                sum(len(prefix) for prefix in self._dictionary))
+
+    def append_shortened(self, url, result):
+        """
+            Append the result of a shorten request.
+
+            :param url: URL that had to be shortened
+            :type url: str.
+            :param result: Shortened URL and Stat URL, or the :class:`gdshortener.GDBaseException` raised
+            :type result: :class:`gdshortener.GDShortenResult`, tuple or :class:`gdshortener.GDBaseException`
+        """
+        if isinstance(result, GDBaseException):
+            self._append(url, None, None, result.error_code)
+        else:
+            self._append(url, result[0], result[1], 0)
+
+    def append_lookup(self, short_url, result):
+        """
+            Append the result of a lookup.
+
+            :param short_url: Short URL looked up
+            :type short_url: str.
+            :param result: Original URL, or the :class:`gdshortener.GDBaseException` raised
+            :type result: str or :class:`gdshortener.GDBaseException`
+        """
+        if isinstance(result, GDBaseException):
+            self._append(None, short_url, None, result.error_code)
+        else:
+            self._append(result, short_url, None, 0)
+
+    def extend_shortened(self, items, results):
+        """
+            Append the results of bulk shorten requests, e.g. of :meth:`gdshortener.GDBaseShortener.ishorten_many`.
+
+            :param items: URLs (or ``(url, custom_url[, log_stat])`` tuples) that had to be shortened
+            :type items: iterable
+            :param results: Results of the items, in the same order
+            :type results: iterable
+        """
+        for item, result in zip(items, results):
+            self.append_shortened(item[0] if isinstance(item, (tuple, list)) else item, result)
+
+    def extend_lookups(self, short_urls, results):
+        """
+            Append the results of bulk lookups, e.g. of :meth:`gdshortener.GDBaseShortener.ilookup_many`.
+
+            :param short_urls: Short URLs looked up
+            :type short_urls: iterable of str.
+            :param results: Results of the short URLs, in the same order
+            :type results: iterable
+        """
+        for short_url, result in zip(short_urls, results):
+            self.append_lookup(short_url, result)
+
+    def row(self, index):
+        """
+            Return a row of the table.
+
+            :param index: Index of the row (negative values count from the end)
+            :type index: int.
+
+            :returns: tuple -- ``(url, short_url, stats_url, error_code)``, ``None`` standing for missing values
+        """
+        index = range(len(self))[index]
+        url = self._string(self._urls, self._url_offsets, index)
+        code = self._string(self._codes, self._code_offsets, index)
+        prefix = self._prefixes[index]
+        stats = self._stats[index]
+        return (url, None if prefix == 0 else self._dictionary[prefix] + code,
+                None if stats == 0 else self._dictionary[stats] + code, self._errors[index])
+
+    def to_buffers(self):
+        """
+            Expose the columns in an Arrow-like layout, without copying them. Rows could not be appended while the
+            returned buffers are referenced.
+
+            :returns: dict -- ``url`` and ``short_code`` as ``(offsets, data)`` (``len(self) + 1`` int64 offsets and UTF-8
+                bytes, a missing value being empty), ``short_prefix`` and ``stats_prefix`` as ``(indices, dictionary)``
+                (uint16 indices into a list of strings, index 0 standing for a missing value), ``error_code`` as uint8
+        """
+        return {
+            'url': (memoryview(self._url_offsets), memoryview(self._urls)),
+            'short_code': (memoryview(self._code_offsets), memoryview(self._codes)),
+            'short_prefix': (memoryview(self._prefixes), list(self._dictionary)),
+            'stats_prefix': (memoryview(self._stats), list(self._dictionary)),
+            'error_code': memoryview(self._errors),
+        }
+
+    def write_csv(self, stream, header=True):
+        """
+            Write the rows to a text stream as CSV, with the columns of :attr:`FIELDS` (missing values are empty, the
+            error code is 0 on success, as in :meth:`row`).
+
+            :param stream: Text stream written to
+            :type stream: file
+            :param header: If True, a header line is written first
+            :type header: bool.
+        """
+        if header:
+            stream.write(','.join(self.FIELDS) + '\r\n')
+        self._write(stream, self._csv_row)
+
+    def write_jsonl(self, stream):
+        """
+            Write the rows to a text stream as JSON lines, with the keys of :attr:`FIELDS` (missing values are ``null``,
+            the error code is 0 on success, as in :meth:`row`).
+
+            :param stream: Text stream written to
+            :type stream: file
+        """
+        self._write(stream, self._jsonl_row)
+
+    def _append(self, url, short_url, stats_url, error_code):
+        # Everything that could raise comes first, so that a rejected row leaves the buffers aligned
+        prefix, code = 0, ''
+        if short_url is not None:
+            base, _, code = short_url.rpartition('/')
+        if stats_url is not None and not stats_url.endswith(code):
+            raise ValueError('The stats URL {0} does not end with the short code {1}'.format(stats_url, code))
+        encoded_url = b'' if url is None else url.encode('utf-8')
+        encoded_code = code.encode('utf-8')
+        if short_url is not None:
+            prefix = self._intern(base + '/')
+        stats = 0 if stats_url is None else self._intern(stats_url[:len(stats_url) - len(code)])
+        self._urls += encoded_url
+        self._codes += encoded_code
+        self._url_offsets.append(len(self._urls))
+        self._code_offsets.append(len(self._codes))
+        self._prefixes.append(prefix)
+        self._stats.append(stats)
+        self._errors.append(min(error_code, 255))
+
+    def _intern(self, prefix):
+        index = self._indices.get(prefix)
+        if index is None:
+            if len(self._dictionary) > 0xffff:
+                raise ValueError('Too many distinct URL prefixes in the table')
+            index = self._indices[prefix] = len(self._dictionary)
+            self._dictionary.append(prefix)
+        return index
+
+    @staticmethod
+    def _string(data, offsets, index):
+        start, end = offsets[index], offsets[index + 1]
+        return None if end == start else str(memoryview(data)[start:end], 'utf-8')
+
+    def _write(self, stream, render, chunk=10000):
+        # Rows are rendered straight from the buffers and written in chunks
+        urls, codes = memoryview(self._urls), memoryview(self._codes)
+        dictionary = self._dictionary
+        url_start = code_start = 0
+        lines = []
+        url_ends = itertools.islice(self._url_offsets, 1, None)
+        code_ends = itertools.islice(self._code_offsets, 1, None)
+        for url_end, code_end, prefix, stats, error_code in zip(url_ends, code_ends, self._prefixes, self._stats,
+                                                                 self._errors):
+            code = str(codes[code_start:code_end], 'utf-8')
+            lines.append(render(str(urls[url_start:url_end], 'utf-8') if url_end > url_start else None,
+                                dictionary[prefix] + code if prefix else None,
+                                dictionary[stats] + code if stats else None, error_code))
+            url_start, code_start = url_end, code_end
+            if len(lines) >= chunk:
+                stream.write(''.join(lines))
+                del lines[:]
+        stream.write(''.join(lines))
+
+    @staticmethod
+    def _csv_row(url, short_url, stats_url, error_code):
+        if url is None:
+            url = ''
+        elif any(character in url for character in ',"\r\n'):
+            url = '"{0}"'.format(url.replace('"', '""'))
+        return '{0},{1},{2},{3}\r\n'.format(url, short_url or '', stats_url or '', error_code)
+
+    @staticmethod
+    def _jsonl_row(url, short_url, stats_url, error_code):
+        # The string encoder of json.dumps, without its per call overhead
+        encode = json.encoder.encode_basestring_ascii
+        return '{{"url": {0}, "short_url": {1}, "stats_url": {2}, "error_code": {3}}}\n'.format(
+            'null' if url is None else encode(url), 'null' if short_url is None else encode(short_url),
+            'null' if stats_url is None else encode(stats_url), error_code)
+
+    def __len__(self):
+        return len(self._errors)
+
+    def __getitem__(self, index):
+        return self.row(index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.row(index)
+
+    def __init__(self):
+        """
+            Init an empty table.
+        """
+        import array
+        self._urls = bytearray()
+        # Offsets of the strings, Arrow-style: string i spans offsets[i]:offsets[i + 1]
+        self._url_offsets = array.array('q', [0])
+        self._codes = bytearray()
+        self._code_offsets = array.array('q', [0])
+        self._prefixes = array.array('H')
+        self._stats = array.array('H')
+        self._errors = array.array('B')
+        # Index 0 of the dictionary stands for a missing prefix
+        self._dictionary = ['']
+        self._indices = {'': 0}
+
+
+class GDMemoryCache(object):
+    """
+        Bounded in-memory cache of results obtained from `is.gd - v.gd url shortener <http://is.gd/developers.php>`_.
+
+        It stores shortened URLs, keyed on ``(shortener_url, url, custom_url, log_stat)``, and original URLs and statistics,
+        keyed on ``(shortener_url, short_code)``. When the cache is full the least recently used entry is evicted; entries older
+        than *ttl* are discarded. The cache could be shared by several shorteners and threads.
+
+        :param maxsize: Maximum number of entries kept
+        :type maxsize: int.
+        :param ttl: Seconds an entry stays valid (``None`` to keep it until evicted)
+        :type ttl: float.
+    """
+
+    @property
+    def hits(self):
+        """
+            Number of lookups answered by the cache.
+
+            :returns: int.
+        """
+        return self._hits
+
+    @property
+    def misses(self):
+        """
+            Number of lookups not found (or expired) in the cache.
+
+            :returns: int.
+        """
+        return self._misses
+
+    def get_shortened(self, key):
+        """
+            Return the cached result of a shorten request.
+
+            :param key: ``(shortener_url, url, custom_url, log_stat)``
+            :type key: tuple.
+
+            :returns: :class:`gdshortener.GDShortenResult` -- Shortened URL and Stat URL, or ``None`` if not cached
+        """
+        return self._get(('shorten',) + key)
+
+    def set_shortened(self, key, value):
+        """
+            Store the result of a shorten request.
+
+            :param key: ``(shortener_url, url, custom_url, log_stat)``
+            :type key: tuple.
+            :param value: Shortened URL and Stat URL
+            :type value: (str,str)
+        """
+        self._set(('shorten',) + key, value)
+
+    def get_lookup(self, key):
+        """
+            Return the cached original URL of a short code.
+
+            :param key: ``(shortener_url, short_code)``
+            :type key: tuple.
+
+            :returns: str. -- The original URL, or ``None`` if not cached
+        """
+        return self._get(('lookup',) + key)
+
+    def set_lookup(self, key, value):
+        """
+            Store the original URL of a short code.
+
+            :param key: ``(shortener_url, short_code)``
+            :type key: tuple.
+            :param value: The original URL
+            :type value: str.
+        """
+        self._set(('lookup',) + key, value)
+
+    def get_stats(self, key):
+        """
+            Return the cached statistics of a short code, to be returned as they are or revalidated.
+
+            :param key: ``(shortener_url, short_code)``
+            :type key: tuple.
+
+            :returns: :class:`gdshortener.GDStats` -- The statistics, or ``None`` if not cached
+        """
+        return self._get(('stats',) + key)
+
+    def set_stats(self, key, value):
+        """
+            Store the statistics of a short code.
+
+            :param key: ``(shortener_url, short_code)``
+            :type key: tuple.
+            :param value: The statistics
+            :type value: :class:`gdshortener.GDStats`
+        """
+        self._set(('stats',) + key, value)
+
+    def clear(self):
+        """
+            Discard every entry and reset the statistics.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._hits = 0
+            self._misses = 0
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is not None and entry[1] <= time.time():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def _set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, None if self.ttl is None else time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __init__(self, maxsize=10000, ttl=None):
+        """
+            Init an empty cache.
+
+            :param maxsize: Maximum number of entries kept
+            :type maxsize: int.
+            :param ttl: Seconds an entry stays valid (``None`` to keep it until evicted)
+            :type ttl: float.
+        """
+        if maxsize < 1:
+            raise ValueError('maxsize must be a positive integer')
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+
+class GDSQLiteCache(object):
+    """
+        Persistent cache of results obtained from `is.gd - v.gd url shortener <http://is.gd/developers.php>`_, stored in a SQLite database.
+
+        It offers the same operations of :class:`gdshortener.GDMemoryCache`, survives restarts and could be read and written
+        at the same time by several threads and processes on the same host (the database runs in WAL mode).
+        Entries are indexed on disk, so a cache with tens of millions of URLs needs only the SQLite page cache in memory.
+
+        :param path: Database file; it is created if missing
+        :type path: str.
+        :param ttl: Seconds an entry stays valid (``None`` to keep it forever)
+        :type ttl: float.
+        :param busy_timeout: Seconds a writer waits for a database locked by another process
+        :type busy_timeout: float.
+    """
+
+    _SCHEMA_ = (
+        'CREATE TABLE IF NOT EXISTS shortened (shortener_url TEXT NOT NULL, url TEXT NOT NULL, custom_url TEXT NOT NULL, '
+        'log_stat INTEGER NOT NULL, short_url TEXT NOT NULL, stats_url TEXT, created REAL NOT NULL, '
+        'PRIMARY KEY (shortener_url, url, custom_url, log_stat)) WITHOUT ROWID',
+        'CREATE TABLE IF NOT EXISTS lookup (shortener_url TEXT NOT NULL, short_code TEXT NOT NULL, url TEXT NOT NULL, '
+        'created REAL NOT NULL, PRIMARY KEY (shortener_url, short_code)) WITHOUT ROWID',
+        'CREATE TABLE IF NOT EXISTS stats (shortener_url TEXT NOT NULL, short_code TEXT NOT NULL, short_url TEXT NOT NULL, '
+        'url TEXT, clicks INTEGER NOT NULL, fetched REAL NOT NULL, etag TEXT, last_modified TEXT, created REAL NOT NULL, '
+        'PRIMARY KEY (shortener_url, short_code)) WITHOUT ROWID',
+    )
+
+    @property
+    def hits(self):
+        """
+            Number of lookups answered by the cache.
+
+            :returns: int.
+        """
+        return self._hits
+
+    @property
+    def misses(self):
+        """
+            Number of lookups not found (or expired) in the cache.
+
+            :returns: int.
+        """
+        return self._misses
+
+    def get_shortened(self, key):
+        """
+            Return the cached result of a shorten request.
+
+            :param key: ``(shortener_url, url, custom_url, log_stat)``
+            :type key: tuple.
+
+            :returns: :class:`gdshortener.GDShortenResult` -- Shortened URL and Stat URL, or ``None`` if not cached
+        """
+        shortener_url, url, custom_url, log_stat = key
+        row = self._connection().execute(
+            'SELECT short_url, stats_url, created FROM shortened '
+            'WHERE shortener_url = ? AND url = ? AND custom_url = ? AND log_stat = ?',
+            (shortener_url, url, custom_url or '', int(bool(log_stat)))).fetchone()
+        return self._count(None if row is None else (GDShortenResult(row[0], row[1]), row[2]))
+
+    def set_shortened(self, key, value):
+        """
+            Store the result of a shorten request.
+
+            :param key: ``(shortener_url, url, custom_url, log_stat)``
+            :type key: tuple.
+            :param value: Shortened URL and Stat URL
+            :type value: (str,str)
+        """
+        self.import_shortened([(key, value)])
+
+    def get_lookup(self, key):
+        """
+            Return the cached original URL of a short code.
+
+            :param key: ``(shortener_url, short_code)``
+            :type key: tuple.
+
+            :returns: str. -- The original URL, or ``None`` if not cached
+        """
+        row = self._connection().execute(
+            'SELECT url, created FROM lookup WHERE shortener_url = ? AND short_code = ?', tuple(key)).fetchone()
+        return self._count(None if row is None else (row[0], row[1]))
+
+    def set_lookup(self, key, value):
+        """
+            Store the original URL of a short code.
+
+            :param key: ``(shortener_url, short_code)``
+            :type key: tuple.
+            :param value: The original URL
+            :type value: str.
+        """
+        self.import_lookups([(key, value)])
+
+    def get_stats(self, key):
+        """
+            Return the cached statistics of a short code, to be returned as they are or revalidated.
+
+            :param key: ``(shortener_url, short_code)``
+            :type key: tuple.
+
+            :returns: :class:`gdshortener.GDStats` -- The statistics, or ``None`` if not cached
+        """
+        row = self._connection().execute(
+            'SELECT short_url, url, clicks, fetched, etag, last_modified, created FROM stats '
+            'WHERE shortener_url = ? AND short_code = ?', tuple(key)).fetchone()
+        return self._count(None if row is None else (GDStats(*row[:6]), row[6]))
+
+    def set_stats(self, key, value):
+        """
+            Store the statistics of a short code.
+
+            :param key: ``(shortener_url, short_code)``
+            :type key: tuple.
+            :param value: The statistics
+            :type value: :class:`gdshortener.GDStats`
+        """
+        connection = self._connection()
+        with connection:
+            connection.execute('INSERT OR REPLACE INTO stats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                               tuple(key) + value.as_tuple() + (time.time(),))
+
+    def import_shortened(self, items, batch_size=10000):
+        """
+            Store many shorten results at once, e.g. to warm up the cache from a previous run.
+
+            The reverse lookup of every short code is stored as well. Items are written in transactions of *batch_size* rows.
+
+            :param items: Pairs ``(key, value)`` as accepted by :meth:`set_shortened`
+            :type items: iterable.
+            :param batch_size: Number of items written in each transaction
+            :type batch_size: int.
+
+            :returns: int. -- Number of items stored
+        """
+        return self._import(items, batch_size, self._write_shortened)
+
+    def import_lookups(self, items, batch_size=10000):
+        """
+            Store many original URLs at once, e.g. to warm up the cache from a previous run.
+
+            :param items: Pairs ``(key, value)`` as accepted by :meth:`set_lookup`
+            :type items: iterable.
+            :param batch_size: Number of items written in each transaction
+            :type batch_size: int.
+
+            :returns: int. -- Number of items stored
+        """
+        return self._import(items, batch_size, self._write_lookups)
+
+    def clear(self):
+        """
+            Discard every entry and reset the statistics.
+        """
+        connection = self._connection()
+        with connection:
+            connection.execute('DELETE FROM shortened')
+            connection.execute('DELETE FROM lookup')
+            connection.execute('DELETE FROM stats')
+        with self._lock:
+            self._hits = 0
+            self._misses = 0
+
+    def close(self):
+        """
+            Close the database connections opened by this cache.
+        """
+        with self._lock:
+            connections = list(self._connections)
+            self._connections.clear()
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
+
+    def _import(self, items, batch_size, write):
+        """
+            Store *items* through *write*, one transaction every *batch_size* items.
+        """
+        connection = self._connection()
+        stored = 0
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                stored += self._commit(connection, batch, write)
+                batch = []
+        if batch:
+            stored += self._commit(connection, batch, write)
+        return stored
+
+    def _commit(self, connection, batch, write):
+        with connection:
+            write(connection, batch, time.time())
+        return len(batch)
+
+    def _write_shortened(self, connection, batch, now):
+        connection.executemany(
+            'INSERT OR REPLACE INTO shortened VALUES (?, ?, ?, ?, ?, ?, ?)',
+            ((shortener_url, url, custom_url or '', int(bool(log_stat)), short_url, stats_url, now)
+             for (shortener_url, url, custom_url, log_stat), (short_url, stats_url) in batch))
+        self._write_lookups(connection, (((key[0], _short_code(value[0])), key[1]) for key, value in batch), now)
+
+    def _write_lookups(self, connection, batch, now):
+        connection.executemany('INSERT OR REPLACE INTO lookup VALUES (?, ?, ?, ?)',
+                               ((shortener_url, short_code, url, now) for (shortener_url, short_code), url in batch))
+
+    def _count(self, entry):
+        """
+            Account a hit or a miss for *entry* (a ``(value, created)`` pair or ``None``) and return its value if still valid.
+        """
+        if entry is not None and self.ttl is not None and entry[1] + self.ttl <= time.time():
+            entry = None
+        with self._lock:
+            if entry is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+        return entry[0]
+
+    def _connection(self):
+        """
+            Obtain the connection of the calling thread, opening it on first use (or after a fork).
+
+            The connection is closed when the thread exits, so that threads started by every bulk call do not pile up
+            connections until :meth:`close`.
+        """
+        holder = getattr(self._local, 'connection', None)
+        if holder is None or holder.pid != os.getpid():
+            import sqlite3
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout, check_same_thread=False)
+            self._enable_wal(connection)
+            connection.execute('PRAGMA synchronous=NORMAL')
+            holder = self._local.connection = _ThreadResource(connection, self._lock, self._connections)
+        return holder.resource
+
+    def _enable_wal(self, connection):
+        """
+            Switch the database to WAL mode, unless it is already. The switch fails at once, without honouring
+            *busy_timeout*, while another process holds the database: it is retried until *busy_timeout* expires.
+        """
+        import sqlite3
+        deadline_at = time.time() + self.busy_timeout
+        while True:
+            try:
+                if connection.execute('PRAGMA journal_mode').fetchone()[0].lower() != 'wal':
+                    connection.execute('PRAGMA journal_mode=WAL')
+                return
+            except sqlite3.OperationalError as ex:
+                if 'locked' not in str(ex) or time.time() >= deadline_at:
+                    raise
+                time.sleep(random.uniform(0.005, 0.05))
+
+    def __len__(self):
+        row = self._connection().execute(
+            'SELECT (SELECT COUNT(*) FROM shortened) + (SELECT COUNT(*) FROM lookup) + (SELECT COUNT(*) FROM stats)').fetchone()
+        return row[0]
+
+    def __getstate__(self):
+        # Only the settings are pickled, so copies sent to other processes open their own connections to the same database
+        return {'path': self.path, 'ttl': self.ttl, 'busy_timeout': self.busy_timeout}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'], state['ttl'], state['busy_timeout'])
+
+    def __init__(self, path, ttl=None, busy_timeout=30):
+        """
+            Open (or create) the cache database.
+
+            :param path: Database file; it is created if missing
+            :type path: str.
+            :param ttl: Seconds an entry stays valid (``None`` to keep it forever)
+            :type ttl: float.
+            :param busy_timeout: Seconds a writer waits for a database locked by another process
+            :type busy_timeout: float.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.busy_timeout = busy_timeout
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._connections = set()
+        self._hits = 0
+        self._misses = 0
+        connection = self._connection()
+        with connection:
+            for statement in self._SCHEMA_:
+                connection.execute(statement)
+
+
+class GDJournal(object):
+    """
+        Durable, append-only journal of shorten results, so that an interrupted bulk job resumes where it stopped
+        instead of shortening (and paying for) the same URLs again.
+
+        Every completed ``(url, custom_url, log_stat) -> (short_url, stats_url)`` result, and every failure with its error
+        code, is appended to *path* as a tab separated line. Lines are written to the operating system as soon as they
+        are recorded, so a crash of the process loses none of them; they are flushed to disk (``fsync``) every *sync_every*
+        lines or *sync_interval* seconds, so a crash of the host loses at most those.
+
+        At startup the journal is indexed in large binary chunks, keeping only the hash of every key and the offset of its
+        last line in memory (about 100 bytes per URL): a million lines are indexed in about a second.
+        A line left incomplete by a crash is discarded. Only one process at a time could write a journal.
+
+        :param path: Journal file; it is created if missing
+        :type path: str.
+        :param sync_every: Lines written between two flushes to disk
+        :type sync_every: int.
+        :param sync_interval: Seconds after which written lines are flushed to disk anyway
+        :type sync_interval: float.
+        :param final_codes: Error codes replayed on resume; failures with other codes (rate limit, timeouts...) are retried
+        :type final_codes: tuple of int.
+    """
+
+    _CHUNK_SIZE_ = 1 << 22
+
+    @property
+    def pending(self):
+        """
+            Number of lines written but not flushed to disk yet.
+
+            :returns: int.
+        """
+        return self._pending
+
+    def get(self, url, custom_url=None, log_stat=False):
+        """
+            Return the last outcome recorded for a shorten request.
+
+            :param url: URL that had to be shortened
+            :type url: str.
+            :param custom_url: Custom short URL requested, if any
+            :type custom_url: str.
+            :param log_stat: Whether stats were requested
+            :type log_stat: bool.
+
+            :returns: (str,str) -- Shortened URL and Stat URL, the :class:`gdshortener.GDBaseException` recorded for a failure,
+                or ``None`` if the request was never recorded
+        """
+        key = _journal_key(url, custom_url, log_stat)
+        with self._lock:
+            offset = self._index.get(hash(key))
+            if offset is None:
+                return None
+            self._reader.seek(offset)
+            line = self._reader.readline()
+        outcome, detail, line_key = line.rstrip(b'\n').split(b'\t', 2)
+        if line_key != key:
+            # Hash collision: the request is done again, which is always safe
+            return None
+        if outcome.startswith(b'!'):
+            return _journal_error(int(outcome[1:]), _journal_unescape(detail) or None)
+        return GDShortenResult(_journal_unescape(outcome), _journal_unescape(detail) or None)
+
+    def replay(self, url, custom_url=None, log_stat=False):
+        """
+            Return the recorded outcome of a shorten request if it should not be done again, see :meth:`get`.
+
+            :returns: (str,str) -- Shortened URL and Stat URL, the :class:`gdshortener.GDBaseException` recorded for a failure
+                whose code is in :attr:`final_codes`, or ``None`` if the request has to be done
+        """
+        outcome = self.get(url, custom_url, log_stat)
+        if isinstance(outcome, GDBaseException) and outcome.error_code not in self.final_codes:
+            return None
+        return outcome
+
+    def record(self, url, custom_url, log_stat, result):
+        """
+            Append the outcome of a shorten request.
+
+            :param url: URL that had to be shortened
+            :type url: str.
+            :param custom_url: Custom short URL requested, if any
+            :type custom_url: str.
+            :param log_stat: Whether stats were requested
+            :type log_stat: bool.
+            :param result: Shortened URL and Stat URL, or the :class:`gdshortener.GDBaseException` raised
+            :type result: tuple or :class:`gdshortener.GDBaseException`
+        """
+        key = _journal_key(url, custom_url, log_stat)
+        if isinstance(result, GDBaseException):
+            outcome = '!{0}'.format(result.error_code).encode('ascii')
+            detail = _journal_escape(result.error_description)
+        else:
+            outcome, detail = _journal_escape(result[0]), _journal_escape(result[1])
+        line = b'\t'.join((outcome, detail, key)) + b'\n'
+        with self._lock:
+            if self._fd is None:
+                raise ValueError('The journal {0} is closed'.format(self.path))
+            os.write(self._fd, line)
+            self._index[hash(key)] = self._size
+            self._size += len(line)
+            self._pending += 1
+            if self._pending >= self.sync_every or time.time() - self._synced >= self.sync_interval:
+                self._sync()
+
+    def sync(self):
+        """
+            Flush every line written to disk.
+        """
+        with self._lock:
+            if self._fd is not None:
+                self._sync()
+
+    def close(self):
+        """
+            Flush every line written to disk and close the journal.
+        """
+        with self._lock:
+            if self._fd is None:
+                return
+            self._sync()
+            os.close(self._fd)
+            self._fd = None
+            self._reader.close()
+
+    def _sync(self):
+        if self._pending:
+            os.fsync(self._fd)
+            self._pending = 0
+        self._synced = time.time()
+
+    def _load(self):
+        """
+            Index every complete line of the journal, returning the offset its complete lines end at.
+        """
+        index = self._index
+        offset = 0
+        with open(self.path, 'rb') as stream:
+            rest = b''
+            while True:
+                chunk = stream.read(self._CHUNK_SIZE_)
+                if not chunk:
+                    break
+                lines = (rest + chunk).split(b'\n')
+                rest = lines.pop()
+                for line in lines:
+                    # The key follows the first two fields
+                    start = line.index(b'\t', line.index(b'\t') + 1) + 1
+                    index[hash(line[start:])] = offset
+                    offset += len(line) + 1
+        return offset
+
+    def __len__(self):
+        return len(self._index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __init__(self, path, sync_every=1000, sync_interval=1.0, final_codes=(1, 2)):
+        """
+            Open (or create) the journal and index the lines it already holds.
+
+            :param path: Journal file; it is created if missing
+            :type path: str.
+            :param sync_every: Lines written between two flushes to disk
+            :type sync_every: int.
+            :param sync_interval: Seconds after which written lines are flushed to disk anyway
+            :type sync_interval: float.
+            :param final_codes: Error codes replayed on resume; failures with other codes are retried
+            :type final_codes: tuple of int.
+        """
+        if sync_every < 1:
+            raise ValueError('sync_every must be a positive integer')
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.final_codes = tuple(final_codes)
+        self._lock = threading.Lock()
+        self._index = {}
+        self._pending = 0
+        self._synced = time.time()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o644)
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except (IOError, OSError):
+                    raise ValueError('The journal {0} is being written by another process'.format(path))
+            self._size = self._load()
+            # Drop the incomplete line a crash could have left, then append after the complete ones
+            os.ftruncate(self._fd, self._size)
+            os.lseek(self._fd, self._size, os.SEEK_SET)
+            self._reader = open(path, 'rb')
+        except BaseException:
+            os.close(self._fd)
+            raise
+
+
+class GDCallRecord(object):
+    """
+        Measures of a single :meth:`gdshortener.GDBaseShortener.shorten` or :meth:`gdshortener.GDBaseShortener.lookup` call,
+        passed to the hooks and sinks of :class:`gdshortener.GDInstrumentation`.
+
+        Timings are in seconds: *connect* is spent opening connections, *wait* waiting for .gd service (request sent and
+        response read, connect excluded), *decode* decoding responses, *total* in the whole call (rate limit and retry waits included).
+        *requests* counts the requests sent (none for a cache hit or a coalesced call), *retries* the ones that were retries.
+        *error* is the :class:`gdshortener.GDBaseException` raised by the call, ``None`` if it succeeded.
+    """
+
+    __slots__ = ('operation', 'shortener_url', 'started', 'total', 'connect', 'wait', 'decode', 'requests', 'retries',
+                 'cache_hit', 'error')
+
+    @property
+    def outcome(self):
+        """
+            ``'ok'``, or the name of the class of the error raised by the call.
+
+            :returns: str.
+        """
+        return 'ok' if self.error is None else self.error.__class__.__name__
+
+    @property
+    def service(self):
+        """
+            Host of the .gd service called.
+
+            :returns: str.
+        """
+        return urlsplit(self.shortener_url).netloc
+
+    def __init__(self, operation, shortener_url):
+        self.operation = operation
+        self.shortener_url = shortener_url
+        self.started = time.time()
+        self.total = 0.0
+        self.connect = 0.0
+        self.wait = 0.0
+        self.decode = 0.0
+        self.requests = 0
+        self.retries = 0
+        self.cache_hit = False
+        self.error = None
+
+
+class GDInstrumentation(object):
+    """
+        Observability of shortener calls: every call is measured in a :class:`gdshortener.GDCallRecord` that is passed to the sinks.
+
+        Shorteners without instrumentation skip every measure, so they pay nothing for it.
+        An instrumentation could be shared among shorteners and threads.
+
+        :param sinks: Objects whose ``record(call_record)`` method is called after every call
+            (e.g. :class:`gdshortener.GDMemorySink`, :class:`gdshortener.GDLoggingSink`, :class:`gdshortener.GDPrometheusSink`)
+        :type sinks: iterable.
+        :param before_request: Called as ``before_request(call_record, url, params)`` before every request sent to .gd service
+        :type before_request: callable.
+        :param after_request: Called as ``after_request(call_record, url, error)`` after every request, *error* being ``None`` on success
+        :type after_request: callable.
+    """
+
+    def observe(self, operation, shortener_url, function, *args):
+        """
+            Call ``function(*args, call_record)``, measure it and pass its record to the sinks.
+        """
+        record = GDCallRecord(operation, shortener_url)
+        started = _clock()
+        try:
+            return function(*(args + (record,)))
+        except GDBaseException as ex:
+            record.error = ex
+            raise
+        finally:
+            record.total = _clock() - started
+            for sink in self.sinks:
+                sink.record(record)
+
+    def request(self, record, transport, url, params, headers, verify_ssl, timeout, extract, raw=False):
+        """
+            Send a request through *transport* and decode its response, adding its timings to *record* and calling the hooks.
+
+            If *raw* is True the response is fetched with :meth:`gdshortener.GDTransport.fetch` and *extract* gets its
+            ``(status, headers, body)`` instead of the decoded JSON.
+        """
+        if self.before_request is not None:
+            self.before_request(record, url, params)
+        error = None
+        _connect_timer.elapsed = 0
+        started = _clock()
+        received = None
+        try:
+            if raw:
+                response = transport.fetch(url, params, headers, verify_ssl, timeout)
+                received = _clock()
+                return extract(response)
+            content = transport.request(url, params, headers, verify_ssl, timeout)
+            received = _clock()
+            return extract(_decode_json(content))
+        except Exception as ex:
+            error = ex
+            raise
+        finally:
+            ended = _clock()
+            connect = getattr(_connect_timer, 'elapsed', 0)
+            record.requests += 1
+            record.connect += connect
+            record.wait += (ended if received is None else received) - started - connect
+            if received is not None:
+                record.decode += ended - received
+            if self.after_request is not None:
+                self.after_request(record, url, error)
+
+    def __init__(self, sinks=(), before_request=None, after_request=None):
+        """
+            Init the instrumentation.
+
+            :param sinks: Objects whose ``record(call_record)`` method is called after every call
+            :type sinks: iterable.
+            :param before_request: Called as ``before_request(call_record, url, params)`` before every request sent to .gd service
+            :type before_request: callable.
+            :param after_request: Called as ``after_request(call_record, url, error)`` after every request
+            :type after_request: callable.
+        """
+        self.sinks = list(sinks)
+        self.before_request = before_request
+        self.after_request = after_request
+
+
+class GDMemorySink(object):
+    """
+        Sink that keeps counters and timings of shortener calls in memory, together with the latest call records.
+
+        :param keep: Number of latest call records kept
+        :type keep: int.
+    """
+
+    def record(self, record):
+        """
+            Account a call record.
+        """
+        with self._lock:
+            self._calls[record.operation] = self._calls.get(record.operation, 0) + 1
+            if record.error is not None:
+                self._errors[record.outcome] = self._errors.get(record.outcome, 0) + 1
+            self._cache_hits += record.cache_hit
+            self._requests += record.requests
+            self._retries += record.retries
+            for phase in self._PHASES:
+                self._seconds[phase] += getattr(record, phase)
+            self._records.append(record)
+
+    def snapshot(self):
+        """
+            Report counters and timings accounted so far.
+
+            :returns: dict -- With ``calls`` by operation, ``errors`` by error class name, ``cache_hits``, ``requests``,
+                ``retries`` and the ``seconds`` spent in every phase (``connect``, ``wait``, ``decode`` and ``total``).
+        """
+        with self._lock:
+            return {'calls': dict(self._calls), 'errors': dict(self._errors), 'cache_hits': self._cache_hits,
+                    'requests': self._requests, 'retries': self._retries, 'seconds': dict(self._seconds)}
+
+    @property
+    def records(self):
+        """
+            Latest call records, oldest first.
+
+            :returns: list of :class:`gdshortener.GDCallRecord`
+        """
+        with self._lock:
+            return list(self._records)
+
+    _PHASES = ('connect', 'wait', 'decode', 'total')
+
+    def __init__(self, keep=1000):
+        """
+            Init an empty sink.
+
+            :param keep: Number of latest call records kept
+            :type keep: int.
+        """
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._errors = {}
+        self._cache_hits = 0
+        self._requests = 0
+        self._retries = 0
+        self._seconds = dict((phase, 0.0) for phase in self._PHASES)
+        self._records = collections.deque(maxlen=keep)
+
+
+class GDLoggingSink(object):
+    """
+        Sink that logs a line for every shortener call.
+
+        :param logger: Logger used (the ``gdshortener`` one if omitted)
+        :type logger: logging.Logger
+        :param level: Level of the lines of successful calls (``logging.DEBUG`` if omitted); failed calls are logged as warnings
+        :type level: int.
+    """
+
+    def record(self, record):
+        """
+            Log a call record.
+        """
+        level = self.level if record.error is None else self._error_level
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, '%s %s %s total=%.2fms connect=%.2fms wait=%.2fms decode=%.2fms requests=%d retries=%d cache_hit=%s',
+                            record.operation, record.shortener_url, record.outcome, record.total * 1000,
+                            record.connect * 1000, record.wait * 1000, record.decode * 1000, record.requests,
+                            record.retries, record.cache_hit)
+
+    def __init__(self, logger=None, level=None):
+        """
+            Init the sink.
+
+            :param logger: Logger used (the ``gdshortener`` one if omitted)
+            :type logger: logging.Logger
+            :param level: Level of the lines of successful calls (``logging.DEBUG`` if omitted); failed calls are logged as warnings
+            :type level: int.
+        """
+        import logging
+        self.logger = logging.getLogger('gdshortener') if logger is None else logger
+        self.level = logging.DEBUG if level is None else level
+        self._error_level = logging.WARNING
+
+
+class GDPrometheusSink(object):
+    """
+        Sink that aggregates shortener calls as Prometheus metrics, rendered in the text exposition format by :meth:`render`.
+
+        Metrics are labelled by ``operation`` and ``service``:
+
+        - ``<namespace>_calls_total`` counts calls by ``outcome`` (``ok`` or the error class name)
+        - ``<namespace>_requests_total``, ``<namespace>_retries_total`` and ``<namespace>_cache_hits_total`` count requests sent, retries and cache hits
+        - ``<namespace>_phase_seconds_total`` sums the seconds spent in every ``phase`` (``connect``, ``wait`` and ``decode``)
+        - ``<namespace>_call_duration_seconds`` is the histogram of the total duration of calls
+
+        :param namespace: Prefix of the metric names
+        :type namespace: str.
+        :param buckets: Upper bounds, in seconds, of the duration histogram buckets
+        :type buckets: iterable of float.
+    """
+
+    def record(self, record):
+        """
+            Account a call record.
+        """
+        service = self._services.get(record.shortener_url)
+        if service is None:
+            service = self._services[record.shortener_url] = record.service
+        labels = (record.operation, service)
+        with self._lock:
+            key = labels + (record.outcome,)
+            self._calls[key] = self._calls.get(key, 0) + 1
+            for counters, value in ((self._requests, record.requests), (self._retries, record.retries),
+                                    (self._cache_hits, int(record.cache_hit))):
+                counters[labels] = counters.get(labels, 0) + value
+            for phase in ('connect', 'wait', 'decode'):
+                key = labels + (phase,)
+                self._phases[key] = self._phases.get(key, 0.0) + getattr(record, phase)
+            histogram = self._durations.get(labels)
+            if histogram is None:
+                histogram = self._durations[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if record.total <= bound:
+                    histogram[0][index] += 1
+            histogram[1] += record.total
+            histogram[2] += 1
+
+    def render(self):
+        """
+            Render every metric in the Prometheus text exposition format.
+
+            :returns: str.
+        """
+        name = self.namespace
+        lines = []
+        with self._lock:
+            self._render_counter(lines, name + '_calls_total', 'Calls by outcome', ('operation', 'service', 'outcome'), self._calls)
+            self._render_counter(lines, name + '_requests_total', 'Requests sent to .gd services', ('operation', 'service'), self._requests)
+            self._render_counter(lines, name + '_retries_total', 'Requests that were retries', ('operation', 'service'), self._retries)
+            self._render_counter(lines, name + '_cache_hits_total', 'Calls answered by the cache', ('operation', 'service'), self._cache_hits)
+            self._render_counter(lines, name + '_phase_seconds_total', 'Seconds spent in every phase of calls',
+                                 ('operation', 'service', 'phase'), self._phases)
+            metric = name + '_call_duration_seconds'
+            lines.append('# HELP {0} Total duration of calls'.format(metric))
+            lines.append('# TYPE {0} histogram'.format(metric))
+            for labels, (counts, total, count) in sorted(self._durations.items()):
+                label_text = _prometheus_labels(('operation', 'service'), labels)
+                for bound, bucket in zip(self.buckets, counts):
+                    lines.append('{0}_bucket{{{1},le="{2}"}} {3}'.format(metric, label_text, repr(float(bound)), bucket))
+                lines.append('{0}_bucket{{{1},le="+Inf"}} {2}'.format(metric, label_text, count))
+                lines.append('{0}_sum{{{1}}} {2}'.format(metric, label_text, repr(total)))
+                lines.append('{0}_count{{{1}}} {2}'.format(metric, label_text, count))
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render_counter(lines, metric, description, names, values):
+        lines.append('# HELP {0} {1}'.format(metric, description))
+        lines.append('# TYPE {0} counter'.format(metric))
+        for labels, value in sorted(values.items()):
+            lines.append('{0}{{{1}}} {2}'.format(metric, _prometheus_labels(names, labels), repr(value)))
+
+    def __init__(self, namespace='gdshortener', buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)):
+        """
+            Init an empty sink.
+
+            :param namespace: Prefix of the metric names
+            :type namespace: str.
+            :param buckets: Upper bounds, in seconds, of the duration histogram buckets
+            :type buckets: iterable of float.
+        """
+        self.namespace = namespace
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._requests = {}
+        self._retries = {}
+        self._cache_hits = {}
+        self._phases = {}
+        self._durations = {}
+        self._services = {}
+
+
+def _prometheus_labels(names, values):
+    """
+        Render Prometheus labels, escaping their values.
+    """
+    return ','.join('{0}="{1}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                    for name, value in zip(names, values))
+
+
+class GDOpenTelemetrySink(object):
+    """
+        Sink that reports every shortener call as an OpenTelemetry span, with its measures as attributes.
+
+        It requires ``opentelemetry-api``, otherwise an **ImportError** is raised.
+
+        :param tracer: Tracer used (the one of the global tracer provider if omitted)
+        :type tracer: opentelemetry.trace.Tracer
+    """
+
+    def record(self, record):
+        """
+            Report a call record as a span.
+        """
+        started = int(record.started * 1e9)
+        span = self.tracer.start_span('gdshortener.{0}'.format(record.operation), start_time=started, attributes={
+            'gdshortener.service': record.service,
+            'gdshortener.outcome': record.outcome,
+            'gdshortener.requests': record.requests,
+            'gdshortener.retries': record.retries,
+            'gdshortener.cache_hit': record.cache_hit,
+            'gdshortener.connect_seconds': record.connect,
+            'gdshortener.wait_seconds': record.wait,
+            'gdshortener.decode_seconds': record.decode,
+        })
+        if record.error is not None:
+            span.set_status(self._trace.Status(self._trace.StatusCode.ERROR, str(record.error)))
+        span.end(end_time=started + int(record.total * 1e9))
+
+    def __init__(self, tracer=None):
+        """
+            Init the sink.
+
+            :param tracer: Tracer used (the one of the global tracer provider if omitted)
+            :type tracer: opentelemetry.trace.Tracer
+
+            :raises: **ImportError** if ``opentelemetry-api`` is not installed
+        """
+        self._trace = _optional_import('opentelemetry.trace')
+        if self._trace is None:
+            raise ImportError('GDOpenTelemetrySink requires opentelemetry-api')
+        self.tracer = self._trace.get_tracer('gdshortener') if tracer is None else tracer
+
+
+class _SingleFlight(object):
+    """
+        Let concurrent identical calls share a single execution: the first call runs, the others wait for its outcome.
+    """
+
+    def do(self, key, timeout, function, *args):
+        """
+            Run ``function(*args)`` unless a call with the same *key* is in flight, in which case its result (or exception) is shared.
+
+            A waiting call gives up with :class:`gdshortener.GDTimeoutError` after *timeout* seconds (``None`` to wait forever).
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = [threading.Event(), None, None]
+            else:
+                self.coalesced += 1
+        if not leader:
+            if not call[0].wait(timeout):
+                raise GDTimeoutError('The deadline expired while waiting for an identical call in flight')
+            if call[2] is not None:
+                raise call[2]
+            return call[1]
+        try:
+            call[1] = function(*args)
+            return call[1]
+        except BaseException as ex:
+            call[2] = ex
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call[0].set()
+
+    def __init__(self):
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+
+class _AsyncSingleFlight(object):
+    """
+        Asyncio counterpart of :class:`gdshortener._SingleFlight`, for calls running on the same event loop.
+    """
+
+    async def do(self, key, timeout, function, *args):
+        import asyncio
+        task = self._calls.get(key)
+        if task is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.wait_for(asyncio.shield(task), timeout)
+            except asyncio.TimeoutError:
+                raise GDTimeoutError('The deadline expired while waiting for an identical call in flight')
+        # The call runs in a task of its own that every caller awaits through a shield: cancelling the caller that
+        # started it must not cancel the callers waiting for the same result
+        task = self._calls[key] = asyncio.ensure_future(function(*args))
+        task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Every caller could have given up: mark the exception as retrieved
+            task.exception()
+
+    def __init__(self):
+        self.coalesced = 0
+        self._calls = {}
+
+
+def _capture(function, args):
+    """
+        Call *function* returning the :class:`gdshortener.GDBaseException` it raises instead of propagating it.
+    """
+    try:
+        return function(*args)
+    except GDBaseException as ex:
+        return ex
+
+
+class _BulkPools(object):
+    """
+        Thread pools running the bulk operations of an object, one for every number of workers asked for.
+
+        Pools are created on first use and kept until :meth:`close`, so that bulk calls reuse their threads, and with
+        them the sessions and connections those threads opened.
+    """
+
+    def get(self, max_workers):
+        """
+            Return the pool of *max_workers* threads, creating it on first use.
+        """
+        with self._lock:
+            executor = self._executors.get(max_workers)
+            if executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                executor = self._executors[max_workers] = ThreadPoolExecutor(max_workers)
+            return executor
+
+    def close(self):
+        """
+            Shut down every pool, waiting for the calls they are running.
+        """
+        with self._lock:
+            executors = list(self._executors.values())
+            self._executors.clear()
+        for executor in executors:
+            executor.shutdown(wait=True)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executors = {}
+
+
+def _run_ordered(function, items, max_workers, pools=None):
+    """
+        Run *function* over every tuple of arguments in *items* on a bounded thread pool.
+
+        Results (or the :class:`gdshortener.GDBaseException` raised) are yielded in input order;
+        at most ``2 * max_workers`` items are pending at any time, so *items* is consumed lazily.
+        The pool is taken from *pools* if given, otherwise a pool is created for this call only.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    if max_workers < 1:
+        raise ValueError('max_workers must be a positive integer')
+    executor = ThreadPoolExecutor(max_workers) if pools is None else pools.get(max_workers)
+    pending = collections.deque()
+    try:
+        for args in items:
+            pending.append(executor.submit(_capture, function, args))
+            if len(pending) >= 2 * max_workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+        if pools is None:
+            executor.shutdown(wait=True)
+
+
+def _journal_escape(value):
+    """
+        Encode a journal field, escaping the characters that separate fields and lines.
+    """
+    if value is None:
+        return b''
+    value = value if isinstance(value, str) else str(value)
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r').encode('utf-8')
+
+
+def _journal_unescape(field):
+    """
+        Decode a journal field encoded by :func:`_journal_escape`.
+    """
+    value = field.decode('utf-8')
+    if '\\' not in value:
+        return value
+    return re.sub(r'\\(.)', lambda match: {'t': '\t', 'n': '\n', 'r': '\r'}.get(match.group(1), match.group(1)), value)
+
+
+def _journal_key(url, custom_url, log_stat):
+    """
+        Encode the ``(url, custom_url, log_stat)`` key of a shorten request as stored in a journal line.
+    """
+    return b'\t'.join((_journal_escape(url), _journal_escape(custom_url), b'1' if log_stat else b'0'))
+
+
+def _journal_error(error_code, error_description):
+    """
+        Rebuild the :class:`gdshortener.GDBaseException` of a failure recorded in a journal.
+    """
+    error_class = _JOURNAL_ERROR_CLASSES_.get(error_code)
+    if error_class is None:
+        return GDBaseException(error_code, error_description)
+    return error_class(error_description)
+
+
+def _journaled(journal, shorten):
+    """
+        Wrap *shorten* so that outcomes recorded in *journal* are replayed and new ones are recorded.
+    """
+    def run(url, custom_url=None, log_stat=False, *args):
+        outcome = journal.replay(url, custom_url, log_stat)
+        if isinstance(outcome, GDBaseException):
+            raise outcome
+        if outcome is not None:
+            return outcome
+        try:
+            result = shorten(url, custom_url, log_stat, *args)
+        except GDBaseException as ex:
+            journal.record(url, custom_url, log_stat, ex)
+            raise
+        journal.record(url, custom_url, log_stat, result)
+        return result
+    return run
+
+
+def _shorten_arguments(item, log_stat, verify_ssl):
+    """
+        Expand an item of a bulk shorten request (an url or a tuple ``(url, custom_url[, log_stat])``) to the arguments of ``shorten``.
+    """
+    if isinstance(item, (tuple, list)):
+        url = item[0]
+        custom_url = item[1] if len(item) > 1 else None
+        item_log_stat = item[2] if len(item) > 2 and item[2] is not None else log_stat
+    else:
+        url, custom_url, item_log_stat = item, None, log_stat
+    return url, custom_url, item_log_stat, verify_ssl
+
+
+def _deadline_at(deadline):
+    """
+        Return the time a call started now with *deadline* seconds available expires at, or ``None`` without deadline.
+    """
+    return None if deadline is None else time.time() + deadline
+
+
+def _remaining_timeout(timeout, deadline_at):
+    """
+        Cap a timeout (single value or ``(connect, read)`` tuple) to the time left before *deadline_at*.
+
+        :raises: :class:`gdshortener.GDTimeoutError` if the deadline already expired
+    """
+    if deadline_at is None:
+        return timeout
+    remaining = deadline_at - time.time()
+    if remaining <= 0:
+        raise GDTimeoutError('The deadline of the call expired')
+    if isinstance(timeout, tuple):
+        return tuple(remaining if value is None else min(value, remaining) for value in timeout)
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+def _short_code(short_url):
+    """
+        Extract the short code from a shortened URL (a bare short code is returned unchanged).
+    """
+    return short_url.strip().rstrip('/').rsplit('/', 1)[-1]
+
+
+def _shorten_key(shortener_url, data):
+    """
+        Build the cache key of a shorten request from its query.
+    """
+    return shortener_url, data['url'], data.get('shorturl'), bool(data['logstats'])
+
+
+def _remember_shortened(cache, key, result):
+    """
+        Store a shorten result in *cache*, together with the reverse lookup of its short code.
+    """
+    cache.set_shortened(key, result)
+    cache.set_lookup((key[0], _short_code(result[0])), key[1])
+
+
+def _lookup_data(short_url):
+    """
+        Validate a shortened URL and build the query of a ``forward.php`` request.
+    """
+    if short_url is None or not isinstance(short_url, str) or len(short_url.strip()) == 0:
+        raise GDMalformedURLError('The shortened URL must be a non empty string')
+    return {
+        'format': 'json',
+        'shorturl': short_url
+    }
+
+
+def _shorten_data(url, custom_url, log_stat, validator):
+    """
+        Validate and canonicalize an URL, validate the custom short URL and build the query of a ``create.php`` request.
+    """
+    data = {
+        'format': 'json',
+        'url': validator.normalize(url),
+        'logstats': 1 if log_stat else 0
+    }
+    custom_url = validator.check_custom_url(custom_url)
+    if custom_url is not None:
+        data['shorturl'] = custom_url
+    return data
+
+
+def _decode_json(content):
+    """
+        Decode a .gd JSON response straight from its body bytes, with orjson when installed.
+    """
+    orjson = _load_dependency('orjson')
+    if orjson is not None:
+        return orjson.loads(content)
+    # .gd answers in UTF-8: an explicit decode is cheaper than the encoding detection of json.loads on bytes
+    return json.loads(content.decode('utf-8'))
+
+
+def _decode_url(url):
+    """
+        Unquote and unescape an URL from a ``forward.php`` response, skipping the work when there is nothing to decode.
+    """
+    if '%' in url or '&' in url:
+        return _unescape(unquote(url))
+    return url
+
+
+def _raise_error(response):
+    """
+        Raise the :class:`gdshortener.GDBaseException` matching the error code of a decoded .gd response.
+    """
+    error_code = int(response['errorcode'])
+    error_class = _ERROR_CLASSES_.get(error_code)
+    if error_class is None:
+        raise GDBaseException(error_code, str(response['errormessage']))
+    raise error_class(str(response['errormessage']))
+
+
+def _lookup_result(response):
+    """
+        Extract the original URL from a decoded ``forward.php`` response, raising its error if any.
+    """
+    url = response.get('url')
+    if url is not None:
+        # Success!
+        return _decode_url(url)
+    _raise_error(response)
+
+
+def _shorten_result(response, shortener_url, log_stat):
+    """
+        Extract shortened and stats URL from a decoded ``create.php`` response, raising its error if any.
+    """
+    short_url = response.get('shorturl')
+    if short_url is not None:
+        # Success!
+        short_url = str(short_url)
+        return GDShortenResult(short_url, '{0}/stats.php?url={1}'.format(shortener_url, _short_code(short_url))
+                               if log_stat else None)
+    _raise_error(response)
+
+
+def _stats_code(short_url):
+    """
+        Validate a short URL (or short code) whose statistics are requested and return its short code.
+    """
+    if short_url is None or not isinstance(short_url, str) or len(short_url.strip()) == 0:
+        raise GDMalformedURLError('The shortened URL must be a non empty string')
+    return _short_code(short_url)
+
+
+def _stats_headers(cached):
+    """
+        Build the headers making a ``stats.php`` request conditional on the validators of cached statistics (``None`` if there are none).
+    """
+    if cached is None:
+        return None
+    headers = {}
+    if cached.etag is not None:
+        headers['If-None-Match'] = cached.etag
+    if cached.last_modified is not None:
+        headers['If-Modified-Since'] = cached.last_modified
+    return headers or None
+
+
+def _parse_stats(body, short_url, fetched, etag, last_modified):
+    """
+        Parse a ``stats.php`` page, raising **ValueError** if it holds no click count.
+    """
+    page = body.decode('utf-8', 'replace')
+    clicks = _STATS_CLICKS_PATTERN_.search(page)
+    if clicks is None:
+        raise ValueError('The stats page of {0} holds no click count'.format(short_url))
+    url = _STATS_URL_PATTERN_.search(page)
+    return GDStats(short_url, None if url is None else _unescape(url.group(1)), int(clicks.group(1).replace(',', '')),
+                   fetched, etag, last_modified)
+
+
+def _stats_result(response, shortener_url, short_code, cached):
+    """
+        Extract the statistics from a ``stats.php`` response, the cached ones if they were not modified.
+    """
+    status, headers, body = response
+    fetched = time.time()
+    if status == 304 and cached is not None:
+        return cached.revalidated(fetched)
+    if status == 404:
+        raise GDShortURLError('No stats are available for the short code {0}'.format(short_code))
+    if status != 200:
+        raise GDGenericError('The stats page of {0} answered with status {1}'.format(short_code, status))
+    return _parse_stats(body, '{0}/{1}'.format(shortener_url, short_code), fetched, headers.get('etag'),
+                        headers.get('last-modified'))
+
+
+class GDBaseShortener(object):
+    """
+        Base shortener for `is.gd - v.gd url shortener <http://is.gd/developers.php>`_.
+        
+        :type shortener_url: str.  
+        :param shortener_url: base is.gd - v.gd API URL to create shorten link.
+
+            Possible values are:
+            
+            1. **_IS_GD_SHORTENER_URL_** to obtain *is.gd* shortened url
+            2. **_V_GD_SHORTENER_URL_** to obtain *v.gd* shortened url
+            
+
+        :param timeout: Timeout in seconds used to connect and obtain shortened URL from .gd service, either a single value or a ``(connect, read)`` tuple
+        :type timeout: float or tuple.
+        :param user_agent: User Agent used when querying .gd services
+        :type user_agent: str.
+        :param session: Pooled session, or any other transport, used to reach .gd services. It could be shared among shorteners; if omitted a private :class:`gdshortener.GDSession` is created
+        :type session: :class:`gdshortener.GDTransport`
+        :param pool_maxsize: Maximum number of connections kept open for each host by the private session
+        :type pool_maxsize: int.
+        :param keep_alive: If False, the private session closes every connection after its request
+        :type keep_alive: bool.
+        :param rate_limiter: Bucket that paces requests within .gd usage limits. It could be shared among shorteners
+        :type rate_limiter: :class:`gdshortener.GDRateLimiter`
+        :param retry_policy: Policy stating which errors are retried and how long to wait before each retry
+        :type retry_policy: :class:`gdshortener.GDRetryPolicy`
+        :param deadline: Seconds allowed for a whole call, retries and rate limit waits included (no limit if ``None``)
+        :type deadline: float.
+        :param cache: Cache of shortened and looked up URLs. It could be shared among shorteners
+        :type cache: :class:`gdshortener.GDMemoryCache` or :class:`gdshortener.GDSQLiteCache`
+        :param coalesce: If True, concurrent identical calls share a single request to .gd service
+        :type coalesce: bool.
+        :param instrumentation: Timings, counters and hooks of calls (none are measured if omitted). It could be shared among shorteners
+        :type instrumentation: :class:`gdshortener.GDInstrumentation`
+        :param validator: Validator and normalizer of URLs and custom short URLs, checked before any request (a default one if omitted)
+        :type validator: :class:`gdshortener.GDURLValidator`
+        :param concurrency_limiter: Adaptive limit of the requests in flight. It could be shared among shorteners
+        :type concurrency_limiter: :class:`gdshortener.GDConcurrencyLimiter`
+    """
+    
+    @property
+    def coalesced(self):
+        """
+            Number of calls that shared the request of an identical call already in flight.
+
+            :returns: int.
+        """
+        return 0 if self._flight is None else self._flight.coalesced
+
+    def lookup(self, short_url, verify_ssl=True, timeout=None, deadline=None):
+        """
+            Lookup an URL shortened with `is.gd - v.gd url service <http://is.gd/developers.php>`_ and return the real url
+            
+            :param short_url: the url shortened with .gd service
+            :type short_url: str.
+            :param verify_ssl: allow remote url ssl certificate verification (if True) or disable it (if False)
+            :type verify_ssl: bool.
+            :param timeout: Timeout used for this call instead of the one of the shortener
+            :type timeout: float or tuple.
+            :param deadline: Deadline used for this call instead of the one of the shortener
+            :type deadline: float.
+            
+            :returns: str. -- The original url that was shortened with .gd service
+            
+            :raises: :class:`gdshortener.GDTimeoutError` if .gd service does not answer in time or the deadline expires
+                **ValueError** if .gd response is malformed
+                :class:`gdshortener.GDMalformedURLError` if the previously shortened URL provided is malformed
+                :class:`gdshortener.GDShortURLError` if the custom URL requested is not available or disabled by .gd service
+                :class:`gdshortener.GDRateLimitError` if the request rate is exceeded for .gd service
+                :class:`gdshortener.GDGenericError` in case of generic error from .gd service (mainteinance)
+        """
+        if self._instrumentation is None:
+            return self._lookup(short_url, verify_ssl, timeout, deadline, None)
+        return self._instrumentation.observe('lookup', self.shortener_url, self._lookup, short_url, verify_ssl, timeout,
+                                             deadline)
+
+    def shorten(self, url, custom_url=None, log_stat=False, verify_ssl=True, timeout=None, deadline=None):
+        """
+            Shorten an URL using `is.gd - v.gd url shortener service <http://is.gd/developers.php>`_.
+            
+            :param url: URL that had to be shortened
+            :type url: str.
+            
+            :param custom_url: if specified, the url generated will be http://is.gd/<custom_url> (or http://v.gd/<custom_url>).
+            
+                Please note that if this custom url is unavailable (because it is already used, for example), a :class:`gdshortener.GDShortURLError` will be raised
+            
+            :type custom_url: str.
+            :param log_stat: States if the generated url has statistical analisys attached.
+                If the stats are enabled, a special url will show the stats on this shortened url. This special url is returned as second parameters of this function.
+                
+                Please notice that a stat enabled shorten url counts double in .gd rate exceeding monitor system.
+                
+                More information on `.gd FAQ <http://is.gd/faq.php#stats>`_ and `.gd rate limit <http://is.gd/usagelimits.php>`_.
+            :type log_stat: bool.
+            :param verify_ssl: allow remote url ssl certificate verification (if True) or disable it (if False)
+            :type verify_ssl: bool.
+            :param timeout: Timeout used for this call instead of the one of the shortener
+            :type timeout: float or tuple.
+            :param deadline: Deadline used for this call instead of the one of the shortener
+            :type deadline: float.
+
+            :returns:  :class:`gdshortener.GDShortenResult` -- Unpacked as ``(short_url, stats_url)``: Shortened URL obtained by .gd service and Stat URL if requested (otherwhise is ``None``).
+            :raises: :class:`gdshortener.GDTimeoutError` if .gd service does not answer in time or the deadline expires
+                **ValueError** if .gd response is malformed
+                :class:`gdshortener.GDMalformedURLError` if the URL provided for shortening is malformed
+                :class:`gdshortener.GDShortURLError` if the custom URL requested is not available
+                :class:`gdshortener.GDRateLimitError` if the request rate is exceeded for .gd service
+                :class:`gdshortener.GDGenericError` in case of generic error from .gd service (mainteinance)
+        """
+        if self._instrumentation is None:
+            return self._shorten(url, custom_url, log_stat, verify_ssl, timeout, deadline, None)
+        return self._instrumentation.observe('shorten', self.shortener_url, self._shorten, url, custom_url, log_stat,
+                                             verify_ssl, timeout, deadline)
+
+    def stats(self, short_url, max_age=0, verify_ssl=True, timeout=None, deadline=None):
+        """
+            Fetch and parse the statistics of an URL shortened with stats enabled (see *log_stat* of :meth:`shorten`).
+
+            Statistics are kept in the cache of the shortener (a private :class:`gdshortener.GDMemoryCache` if it has none):
+            those fetched less than *max_age* seconds ago are returned without any request, older ones are revalidated
+            with a conditional request, so that a page that did not change is not downloaded again.
+
+            :param short_url: the url shortened with .gd service, or its short code
+            :type short_url: str.
+            :param max_age: Seconds cached statistics are returned without revalidating them
+            :type max_age: float.
+            :param verify_ssl: allow remote url ssl certificate verification (if True) or disable it (if False)
+            :type verify_ssl: bool.
+            :param timeout: Timeout used for this call instead of the one of the shortener
+            :type timeout: float or tuple.
+            :param deadline: Deadline used for this call instead of the one of the shortener
+            :type deadline: float.
+
+            :returns: :class:`gdshortener.GDStats` -- Statistics of the short URL
+            :raises: :class:`gdshortener.GDTimeoutError` if .gd service does not answer in time or the deadline expires
+                :class:`gdshortener.GDMalformedURLError` if the short URL provided is malformed
+                :class:`gdshortener.GDShortURLError` if the short URL does not exist or has no stats enabled
+                :class:`gdshortener.GDRateLimitError` if the request rate is exceeded for .gd service
+                :class:`gdshortener.GDGenericError` if the stats page could not be parsed, or in case of generic error from .gd service
+        """
+        if self._instrumentation is None:
+            return self._stats(short_url, max_age, verify_ssl, timeout, deadline, None)
+        return self._instrumentation.observe('stats', self.shortener_url, self._stats, short_url, max_age, verify_ssl,
+                                             timeout, deadline)
+
+    def lookup_many(self, short_urls, verify_ssl=True, max_workers=10):
+        """
+            Lookup several URLs shortened with `is.gd - v.gd url service <http://is.gd/developers.php>`_ concurrently.
+
+            :param short_urls: the urls shortened with .gd service
+            :type short_urls: iterable of str.
+            :param verify_ssl: allow remote url ssl certificate verification (if True) or disable it (if False)
+            :type verify_ssl: bool.
+            :param max_workers: Number of lookups performed at the same time.
+                It should not exceed the ``pool_maxsize`` of the session, otherwise extra connections are not reused.
+            :type max_workers: int.
+
+            :returns: list -- For each short url, in input order, the original url (as returned by :meth:`lookup`)
+                or the :class:`gdshortener.GDBaseException` raised for it.
+        """
+        return list(self.ilookup_many(short_urls, verify_ssl, max_workers))
+
+    def ilookup_many(self, short_urls, verify_ssl=True, max_workers=10):
+        """
+            Lazy version of :meth:`lookup_many`: results are yielded in input order as soon as they are available.
+
+            *short_urls* is consumed while results are yielded, with at most ``2 * max_workers`` lookups pending,
+            so arbitrarily long inputs are processed in constant memory.
+
+            :returns: generator -- For each short url, the original url or the :class:`gdshortener.GDBaseException` raised for it.
+        """
+        return _run_ordered(self.lookup, ((short_url, verify_ssl) for short_url in short_urls), max_workers, self._pools)
+
+    def lookup_table(self, short_urls, verify_ssl=True, max_workers=10):
+        """
+            Lookup several short URLs concurrently as :meth:`lookup_many` does, collecting the results in a compact table.
+
+            :returns: :class:`gdshortener.GDResultTable` -- A row for each short url, in input order
+        """
+        short_urls, pending = itertools.tee(short_urls)
+        table = GDResultTable()
+        table.extend_lookups(pending, self.ilookup_many(short_urls, verify_ssl, max_workers))
+        return table
+
+    def shorten_many(self, urls, log_stat=False, verify_ssl=True, max_workers=10, journal=None):
+        """
+            Shorten several URLs concurrently using `is.gd - v.gd url shortener service <http://is.gd/developers.php>`_.
+
+            A failure on a single URL does not stop the batch: the exception is returned in place of its result.
+            With a *journal*, outcomes already recorded are returned without any request and new ones are recorded,
+            so a batch interrupted halfway could simply be run again.
+
+            :param urls: URLs that had to be shortened. Every item is either an url or a tuple ``(url, custom_url)``
+                or ``(url, custom_url, log_stat)``; see :meth:`shorten` for the meaning of each value.
+            :type urls: iterable.
+            :param log_stat: Default for items that do not state their own *log_stat* flag
+            :type log_stat: bool.
+            :param verify_ssl: allow remote url ssl certificate verification (if True) or disable it (if False)
+            :type verify_ssl: bool.
+            :param max_workers: Number of URLs shortened at the same time.
+                It should not exceed the ``pool_maxsize`` of the session, otherwise extra connections are not reused.
+            :type max_workers: int.
+            :param journal: Journal replaying and recording the outcome of every URL
+            :type journal: :class:`gdshortener.GDJournal`
+
+            :returns: list -- For each url, in input order, the :class:`gdshortener.GDShortenResult` returned by :meth:`shorten`
+                or the :class:`gdshortener.GDBaseException` raised for it.
+        """
+        return list(self.ishorten_many(urls, log_stat, verify_ssl, max_workers, journal))
+
+    def ishorten_many(self, urls, log_stat=False, verify_ssl=True, max_workers=10, journal=None):
+        """
+            Lazy version of :meth:`shorten_many`: results are yielded in input order as soon as they are available.
+
+            *urls* is consumed while results are yielded, with at most ``2 * max_workers`` URLs pending,
+            so arbitrarily long inputs are processed in constant memory.
+
+            :returns: generator -- For each url, the :class:`gdshortener.GDShortenResult` returned by :meth:`shorten`
+                or the :class:`gdshortener.GDBaseException` raised for it.
+        """
+        shorten = self.shorten if journal is None else _journaled(journal, self.shorten)
+        return _run_ordered(shorten, (_shorten_arguments(item, log_stat, verify_ssl) for item in urls), max_workers,
+                            self._pools)
+
+    def shorten_table(self, urls, log_stat=False, verify_ssl=True, max_workers=10, journal=None):
+        """
+            Shorten several URLs concurrently as :meth:`shorten_many` does, collecting the results in a compact table.
+
+            :returns: :class:`gdshortener.GDResultTable` -- A row for each url, in input order
+        """
+        urls, pending = itertools.tee(urls)
+        table = GDResultTable()
+        table.extend_shortened(pending, self.ishorten_many(urls, log_stat, verify_ssl, max_workers, journal))
+        return table
+
+    def stats_many(self, short_urls, max_age=0, verify_ssl=True, max_workers=10):
+        """
+            Fetch the statistics of several short URLs concurrently, as :meth:`stats` does.
+
+            :param short_urls: the urls shortened with .gd service, or their short codes
+            :type short_urls: iterable of str.
+            :param max_age: Seconds cached statistics are returned without revalidating them
+            :type max_age: float.
+            :param verify_ssl: allow remote url ssl certificate verification (if True) or disable it (if False)
+            :type verify_ssl: bool.
+            :param max_workers: Number of pages fetched at the same time.
+                It should not exceed the ``pool_maxsize`` of the session, otherwise extra connections are not reused.
+            :type max_workers: int.
+
+            :returns: list -- For each short url, in input order, its :class:`gdshortener.GDStats`
+                or the :class:`gdshortener.GDBaseException` raised for it.
+        """
+        return list(self.istats_many(short_urls, max_age, verify_ssl, max_workers))
+
+    def istats_many(self, short_urls, max_age=0, verify_ssl=True, max_workers=10):
+        """
+            Lazy version of :meth:`stats_many`: results are yielded in input order as soon as they are available.
+
+            :returns: generator -- For each short url, its :class:`gdshortener.GDStats` or the :class:`gdshortener.GDBaseException` raised for it.
+        """
+        return _run_ordered(self.stats, ((short_url, max_age, verify_ssl) for short_url in short_urls), max_workers,
+                            self._pools)
+
+    def close(self):
+        """
+            Release the pooled connections and the bulk threads held by this shortener.
+
+            A session provided by the caller is left open, since it could be shared with other shorteners.
+        """
+        self._pools.close()
+        if self._owns_session:
+            self._session.close()
+
+    def _lookup(self, short_url, verify_ssl, timeout, deadline, record):
+        """
+            Body of :meth:`lookup`, measured in *record* if the shortener is instrumented.
+        """
+        # Build data for post
+        data = _lookup_data(short_url)
+        key = (self.shortener_url, _short_code(short_url))
+        if self._cache is not None:
+            url = self._cache.get_lookup(key)
+            if url is not None:
+                if record is not None:
+                    record.cache_hit = True
+                return url
+        url = self._coalesce(('lookup',) + key, deadline, self._query, 'forward.php', data, verify_ssl, 1,
+                             _lookup_result, timeout, deadline, record)
+        if self._cache is not None:
+            self._cache.set_lookup(key, url)
+        return url
+
+    def _shorten(self, url, custom_url, log_stat, verify_ssl, timeout, deadline, record):
+        """
+            Body of :meth:`shorten`, measured in *record* if the shortener is instrumented.
+        """
+        # Build data to post
+        data = _shorten_data(url, custom_url, log_stat, self._validator)
+        key = _shorten_key(self.shortener_url, data)
+        if self._cache is not None:
+            result = self._cache.get_shortened(key)
+            if result is not None:
+                if record is not None:
+                    record.cache_hit = True
+                return result
+        # Stats enabled urls count double on .gd usage limits
+        result = self._coalesce(('shorten',) + key, deadline, self._query, 'create.php', data, verify_ssl,
+                                2 if log_stat else 1,
+                                lambda response: _shorten_result(response, self.shortener_url, log_stat), timeout, deadline,
+                                record)
+        if self._cache is not None:
+            _remember_shortened(self._cache, key, result)
+        return result
+
+    def _stats(self, short_url, max_age, verify_ssl, timeout, deadline, record):
+        """
+            Body of :meth:`stats`, measured in *record* if the shortener is instrumented.
+        """
+        short_code = _stats_code(short_url)
+        key = (self.shortener_url, short_code)
+        cached = self._stats_cache.get_stats(key)
+        if cached is not None and max_age and time.time() - cached.fetched < max_age:
+            if record is not None:
+                record.cache_hit = True
+            return cached
+        stats = self._coalesce(('stats',) + key, deadline, self._query, 'stats.php', {'url': short_code}, verify_ssl, 1,
+                               lambda response: _stats_result(response, self.shortener_url, short_code, cached), timeout,
+                               deadline, record, _stats_headers(cached), True)
+        self._stats_cache.set_stats(key, stats)
+        return stats
+
+    def _coalesce(self, key, deadline, function, *args):
+        """
+            Run ``function(*args)``, sharing the outcome of an identical call already in flight if coalescing is enabled.
+        """
+        if self._flight is None:
+            return function(*args)
+        return self._flight.do(key, self._deadline if deadline is None else deadline, function, *args)
+
+    def _query(self, path, data, verify_ssl, tokens, extract, timeout=None, deadline=None, record=None, headers=None,
+               raw=False):
+        """
+            Perform a request to a .gd API page, retrying it as stated by the retry policy until the deadline expires.
+        """
+        timeout = self._timeout if timeout is None else timeout
+        deadline_at = _deadline_at(self._deadline if deadline is None else deadline)
+        attempt = 0
+        while True:
+            try:
+                self._throttle(tokens, deadline_at)
+                if self._concurrency_limiter is not None:
+                    return self._limited(deadline_at, path, data, verify_ssl, extract, timeout, record, headers, raw)
+                return self._request(path, data, verify_ssl, extract, _remaining_timeout(timeout, deadline_at), record,
+                                     headers, raw)
+            except GDBaseException as ex:
+                delay = None if self._retry_policy is None else self._retry_policy.backoff(ex, attempt)
+                if delay is None or (deadline_at is not None and time.time() + delay >= deadline_at):
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                if record is not None:
+                    record.retries += 1
+
+    def _request(self, path, data, verify_ssl, extract, timeout, record=None, headers=None, raw=False):
+        """
+            Perform a single request to a .gd page, with further *headers* if any, and extract the result from its
+            decoded response (or from its ``(status, headers, body)`` if *raw* is True).
+        """
+        url = "{0}/{1}".format(self.shortener_url, path)
+        headers = {'User-Agent': self._user_agent} if headers is None else dict(headers, **{'User-Agent': self._user_agent})
+        try:
+            if record is not None:
+                return self._instrumentation.request(record, self._session, url, data, headers, verify_ssl, timeout,
+                                                     extract, raw)
+            if raw:
+                return extract(self._session.fetch(url, data, headers, verify_ssl, timeout))
+            return extract(_decode_json(self._session.request(url, data, headers, verify_ssl, timeout)))
+        except GDBaseException:
+            raise
+        except Exception as ex:
+            raise GDGenericError(str(ex))
+
+    def _limited(self, deadline_at, path, data, verify_ssl, extract, timeout, record, headers, raw):
+        """
+            Perform a single request once the concurrency limiter allows it, reporting its outcome to the limiter.
+        """
+        limiter = self._concurrency_limiter
+        started = limiter.acquire(None if deadline_at is None else max(0.0, deadline_at - time.time()))
+        error = None
+        try:
+            return self._request(path, data, verify_ssl, extract, _remaining_timeout(timeout, deadline_at), record,
+                                 headers, raw)
+        except GDBaseException as ex:
+            error = ex
+            raise
+        finally:
+            limiter.release(started, error)
+
+    def _throttle(self, tokens, deadline_at):
+        """
+            Wait until the rate limiter grants *tokens*, failing at once if the wait outlasts the deadline.
+        """
+        if self._rate_limiter is not None:
+            delay = self._rate_limiter.reserve(tokens)
+            if delay > 0:
+                if deadline_at is not None and time.time() + delay >= deadline_at:
+                    # The request is not sent: its tokens must not delay the other callers of the bucket
+                    self._rate_limiter.refund(tokens)
+                    raise GDTimeoutError('The rate limit does not allow the request before the deadline')
+                time.sleep(delay)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __init__(self, shortener_url=_IS_GD_SHORTENER_URL_, timeout=60,
+                 user_agent='Mozilla/5.0 (compatible; GD Shortener Python Module - https://github.com/torre76/gd_shortener/)',
+                 session=None, pool_maxsize=10, keep_alive=True, rate_limiter=None, retry_policy=None, deadline=None,
+                 cache=None, coalesce=True, instrumentation=None, validator=None, concurrency_limiter=None):
+        """
+            Init URL Shortener class
+            
+            :type shortener_url: str.
+            :param shortener_url: base is.gd - v.gd API URL to create shorten link.
+
+                Possible values are:
+                
+                1. **_IS_GD_SHORTENER_URL_** to obtain *is.gd* shortened url
+                2. **_V_GD_SHORTENER_URL_** to obtain *v.gd* shortened url
+                
+
+            :param timeout: Timeout in seconds used to connect and obtain shortened URL from .gd service, either a single value or a ``(connect, read)`` tuple
+            :type timeout: float or tuple.
+            :param user_agent: User Agent used when querying .gd services
+            :type user_agent: str.
+            :param session: Pooled session, or any other transport, used to reach .gd services. It could be shared among shorteners; if omitted a private :class:`gdshortener.GDSession` is created
+            :type session: :class:`gdshortener.GDTransport`
+            :param pool_maxsize: Maximum number of connections kept open for each host by the private session
+            :type pool_maxsize: int.
+            :param keep_alive: If False, the private session closes every connection after its request
+            :type keep_alive: bool.
+            :param rate_limiter: Bucket that paces requests within .gd usage limits. It could be shared among shorteners
+            :type rate_limiter: :class:`gdshortener.GDRateLimiter`
+            :param retry_policy: Policy stating which errors are retried and how long to wait before each retry
+            :type retry_policy: :class:`gdshortener.GDRetryPolicy`
+            :param deadline: Seconds allowed for a whole call, retries and rate limit waits included (no limit if ``None``)
+            :type deadline: float.
+            :param cache: Cache of shortened and looked up URLs. It could be shared among shorteners
+            :type cache: :class:`gdshortener.GDMemoryCache` or :class:`gdshortener.GDSQLiteCache`
+            :param coalesce: If True, concurrent identical calls share a single request to .gd service
+            :type coalesce: bool.
+            :param instrumentation: Timings, counters and hooks of calls (none are measured if omitted). It could be shared among shorteners
+            :type instrumentation: :class:`gdshortener.GDInstrumentation`
+            :param validator: Validator and normalizer of URLs and custom short URLs, checked before any request (a default one if omitted)
+            :type validator: :class:`gdshortener.GDURLValidator`
+            :param concurrency_limiter: Adaptive limit of the requests in flight. It could be shared among shorteners
+            :type concurrency_limiter: :class:`gdshortener.GDConcurrencyLimiter`
+        """
+        self.shortener_url = shortener_url
+        self._timeout = timeout
+        self._user_agent = user_agent
+        self._owns_session = session is None
+        self._session = GDSession(pool_maxsize=pool_maxsize, keep_alive=keep_alive) if session is None else session
+        self._rate_limiter = rate_limiter
+        self._retry_policy = retry_policy
+        self._deadline = deadline
+        self._cache = cache
+        # Statistics are revalidated, not trusted, so they are worth keeping even without a cache
+        self._stats_cache = GDMemoryCache() if cache is None else cache
+        self._flight = _SingleFlight() if coalesce else None
+        self._instrumentation = instrumentation
+        self._validator = _DEFAULT_URL_VALIDATOR_ if validator is None else validator
+        self._concurrency_limiter = concurrency_limiter
+        self._pools = _BulkPools()
+
+
+class ISGDShortener(GDBaseShortener):
+    """
+        Shortener for `is.gd url shortener <http://is.gd/developers.php>`_.
+
+        :param timeout: Timeout in seconds used to connect and obtain shortened URL from .gd service, either a single value or a ``(connect, read)`` tuple
+        :type timeout: float or tuple.
+        :param user_agent: User Agent used when querying .gd services
+        :type user_agent: str.
+    """
+
+    def __init__(self, timeout=60, user_agent='Mozilla/5.0 (compatible; GD Shortener Python Module - https://github.com/torre76/gd_shortener/)',
+                 **kwargs):
+        """
+            Init URL Shortener class
+            
+            :param timeout: Timeout in seconds used to connect and obtain shortened URL from .gd service, either a single value or a ``(connect, read)`` tuple
+            :type timeout: float or tuple.
+            :param user_agent: User Agent used when querying .gd services
+            :type user_agent: str.
+            :param kwargs: Further options accepted by :class:`gdshortener.GDBaseShortener`
+        """
+        GDBaseShortener.__init__(self, _IS_GD_SHORTENER_URL_, timeout, user_agent, **kwargs)
+
+
+class VGDShortener(GDBaseShortener):
+    """
+        Shortener for `v.gd url shortener <http://is.gd/developers.php>`_.
+
+        :param timeout: Timeout in seconds used to connect and obtain shortened URL from .gd service, either a single value or a ``(connect, read)`` tuple
+        :type timeout: float or tuple.
+        :param user_agent: User Agent used when querying .gd services
+        :type user_agent: str.    
+    """
+
+    def __init__(self, timeout=60, user_agent='Mozilla/5.0 (compatible; GD Shortener Python Module - https://github.com/torre76/gd_shortener/)',
+                 **kwargs):
+        """
+            Init URL Shortener class
+            
+            :param timeout: Timeout in seconds used to connect and obtain shortened URL from .gd service, either a single value or a ``(connect, read)`` tuple
+            :type timeout: float or tuple.
+            :param user_agent: User Agent used when querying .gd services
+            :type user_agent: str.
+            :param kwargs: Further options accepted by :class:`gdshortener.GDBaseShortener`
+        """
+        GDBaseShortener.__init__(self, _V_GD_SHORTENER_URL_, timeout, user_agent, **kwargs)
+
+
+class _Backend(object):
+    """
+        Shortener of a :class:`gdshortener.GDCompositeShortener`, together with its routing and health state.
+    """
+
+    __slots__ = ('shortener', 'host', 'weight', 'breaker', 'outstanding', 'current_weight', 'calls', 'failures')
+
+    def __init__(self, shortener, weight, breaker):
+        self.shortener = shortener
+        self.host = urlsplit(shortener.shortener_url).netloc.lower()
+        self.weight = weight
+        self.breaker = breaker
+        self.outstanding = 0
+        self.current_weight = 0
+        self.calls = 0
+        self.failures = 0
+
+
+class GDCompositeShortener(object):
+    """
+        Shortener that spreads calls across several .gd shorteners (e.g. an :class:`gdshortener.ISGDShortener` and
+        a :class:`gdshortener.VGDShortener`), failing over from one to another.
+
+        Every backend has its own :class:`gdshortener.GDCircuitBreaker`, opened by repeated rate limit, generic or timeout errors.
+        :meth:`shorten` is routed to an available backend and, if it fails with one of those errors, sent again to the next one.
+        :meth:`lookup` is routed to the backend serving the host of the short URL, since only that service knows its short code.
+
+        :param shorteners: Backends the calls are spread across
+        :type shorteners: list of :class:`gdshortener.GDBaseShortener`
+        :param weights: Relative weight of every backend (all equal if omitted)
+        :type weights: list of float.
+        :param routing: ``'least_outstanding'`` to pick the backend with the fewest requests in flight for its weight,
+            ``'weighted'`` to spread calls in proportion to the weights (smooth weighted round robin)
+        :type routing: str.
+        :param failure_threshold: Consecutive failures that open the breaker of a backend
+        :type failure_threshold: int.
+        :param reset_timeout: Seconds the breaker of a backend stays open before a trial call
+        :type reset_timeout: float.
+    """
+
+    ROUTINGS = ('least_outstanding', 'weighted')
+
+    @property
+    def failovers(self):
+        """
+            Number of shorten calls sent again to another backend after a failure.
+
+            :returns: int.
+        """
+        return self._failovers
+
+    def health(self):
+        """
+            Report the state of every backend.
+
+            :returns: list -- For each backend, a dict with its ``shortener_url``, ``weight``, breaker ``state``,
+                ``outstanding`` requests and number of ``calls`` and ``failures``.
+        """
+        with self._lock:
+            return [{'shortener_url': backend.shortener.shortener_url, 'weight': backend.weight,
+                     'state': backend.breaker.state, 'outstanding': backend.outstanding, 'calls': backend.calls,
+                     'failures': backend.failures} for backend in self._backends]
+
+    def shorten(self, url, custom_url=None, log_stat=False, verify_ssl=True, timeout=None, deadline=None):
+        """
+            Shorten an URL on one of the backends, see :meth:`gdshortener.GDBaseShortener.shorten`.
+
+            :returns:  :class:`gdshortener.GDShortenResult` -- Unpacked as ``(short_url, stats_url)``: Shortened URL obtained by the backend and Stat URL if requested (otherwhise is ``None``).
+            :raises: the error of the last backend tried, or :class:`gdshortener.GDGenericError` if the breaker of every backend is open
+        """
+        deadline_at = _deadline_at(deadline)
+        error = None
+        for backend in self._route():
+            # Checked before the breaker: an allowed trial call must be sent, or the breaker stays half open
+            remaining = None if deadline_at is None else deadline_at - time.time()
+            if remaining is not None and remaining <= 0:
+                if error is None:
+                    raise GDTimeoutError('The deadline of the call expired')
+                break
+            if not backend.breaker.allow():
+                continue
+            if error is not None:
+                with self._lock:
+                    self._failovers += 1
+            try:
+                return self._call(backend, backend.shortener.shorten, url, custom_url, log_stat, verify_ssl, timeout,
+                                  remaining)
+            except GDBaseException as ex:
+                if ex.error_code not in backend.breaker.failure_codes:
+                    raise
+                error = ex
+        if error is not None:
+            raise error
+        raise GDGenericError('No .gd backend is available')
+
+    def lookup(self, short_url, verify_ssl=True, timeout=None, deadline=None):
+        """
+            Lookup a short URL on the backend serving its host, see :meth:`gdshortener.GDBaseShortener.lookup`.
+
+            :returns: str. -- The original url that was shortened with .gd service
+            :raises: :class:`gdshortener.GDMalformedURLError` if no backend serves the host of the short URL
+                :class:`gdshortener.GDGenericError` if the breaker of every backend serving it is open
+        """
+        if short_url is None or not isinstance(short_url, str):
+            raise GDMalformedURLError('The shortened URL must be a non empty string')
+        backends = self._hosts.get(urlsplit(short_url.strip()).netloc.lower())
+        if backends is None:
+            raise GDMalformedURLError('The shortened URL does not belong to any backend')
+        for backend in backends:
+            if backend.breaker.allow():
+                return self._call(backend, backend.shortener.lookup, short_url, verify_ssl, timeout, deadline)
+        raise GDGenericError('The circuit breaker of {0} is open'.format(backends[0].shortener.shortener_url))
+
+    def lookup_many(self, short_urls, verify_ssl=True, max_workers=10):
+        """
+            Lookup several short URLs concurrently, see :meth:`gdshortener.GDBaseShortener.lookup_many`.
+        """
+        return list(self.ilookup_many(short_urls, verify_ssl, max_workers))
+
+    def ilookup_many(self, short_urls, verify_ssl=True, max_workers=10):
+        """
+            Lazy version of :meth:`lookup_many`, see :meth:`gdshortener.GDBaseShortener.ilookup_many`.
+        """
+        return _run_ordered(self.lookup, ((short_url, verify_ssl) for short_url in short_urls), max_workers, self._pools)
+
+    def lookup_table(self, short_urls, verify_ssl=True, max_workers=10):
+        """
+            Lookup several short URLs concurrently, see :meth:`gdshortener.GDBaseShortener.lookup_table`.
+        """
+        short_urls, pending = itertools.tee(short_urls)
+        table = GDResultTable()
+        table.extend_lookups(pending, self.ilookup_many(short_urls, verify_ssl, max_workers))
+        return table
+
+    def shorten_many(self, urls, log_stat=False, verify_ssl=True, max_workers=10, journal=None):
+        """
+            Shorten several URLs concurrently across the backends, see :meth:`gdshortener.GDBaseShortener.shorten_many`.
+        """
+        return list(self.ishorten_many(urls, log_stat, verify_ssl, max_workers, journal))
+
+    def ishorten_many(self, urls, log_stat=False, verify_ssl=True, max_workers=10, journal=None):
+        """
+            Lazy version of :meth:`shorten_many`, see :meth:`gdshortener.GDBaseShortener.ishorten_many`.
+        """
+        shorten = self.shorten if journal is None else _journaled(journal, self.shorten)
+        return _run_ordered(shorten, (_shorten_arguments(item, log_stat, verify_ssl) for item in urls), max_workers,
+                            self._pools)
+
+    def shorten_table(self, urls, log_stat=False, verify_ssl=True, max_workers=10, journal=None):
+        """
+            Shorten several URLs concurrently across the backends, see :meth:`gdshortener.GDBaseShortener.shorten_table`.
+        """
+        urls, pending = itertools.tee(urls)
+        table = GDResultTable()
+        table.extend_shortened(pending, self.ishorten_many(urls, log_stat, verify_ssl, max_workers, journal))
+        return table
+
+    def close(self):
+        """
+            Close every backend.
+        """
+        self._pools.close()
+        for backend in self._backends:
+            backend.shortener.close()
+
+    def _route(self):
+        """
+            Order the backends by preference for the next shorten call.
+        """
+        with self._lock:
+            backends = self._backends
+            if self.routing == 'weighted':
+                # Smooth weighted round robin: the chosen backend gives back the total weight
+                for backend in backends:
+                    backend.current_weight += backend.weight
+                ordered = sorted(backends, key=lambda backend: -backend.current_weight)
+                ordered[0].current_weight -= self._total_weight
+                return ordered
+            # Ties are broken in turn, so that idle backends share serial calls
+            turn = self._turn
+            self._turn = (turn + 1) % len(backends)
+            order = sorted(range(len(backends)), key=lambda index: (
+                backends[index].outstanding / float(backends[index].weight), (index - turn) % len(backends)))
+            return [backends[index] for index in order]
+
+    def _call(self, backend, method, *args):
+        """
+            Call *method* of a backend, tracking its outstanding requests and recording the outcome on its breaker.
+        """
+        with self._lock:
+            backend.outstanding += 1
+            backend.calls += 1
+        try:
+            result = method(*args)
+        except GDBaseException as ex:
+            backend.breaker.record(ex)
+            if ex.error_code in backend.breaker.failure_codes:
+                with self._lock:
+                    backend.failures += 1
+            raise
+        except Exception:
+            backend.breaker.record()
+            raise
+        finally:
+            with self._lock:
+                backend.outstanding -= 1
+        backend.breaker.record()
+        return result
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __init__(self, shorteners, weights=None, routing='least_outstanding', failure_threshold=5, reset_timeout=30):
+        """
+            Init the composite shortener.
+
+            :param shorteners: Backends the calls are spread across
+            :type shorteners: list of :class:`gdshortener.GDBaseShortener`
+            :param weights: Relative weight of every backend (all equal if omitted)
+            :type weights: list of float.
+            :param routing: ``'least_outstanding'`` or ``'weighted'``
+            :type routing: str.
+            :param failure_threshold: Consecutive failures that open the breaker of a backend
+            :type failure_threshold: int.
+            :param reset_timeout: Seconds the breaker of a backend stays open before a trial call
+            :type reset_timeout: float.
+
+            :raises: **ValueError** if no shortener is provided, weights do not match them or are not positive, or *routing* is unknown
+        """
+        shorteners = list(shorteners)
+        weights = [1] * len(shorteners) if weights is None else list(weights)
+        if not shorteners:
+            raise ValueError('At least a shortener is required')
+        if len(weights) != len(shorteners) or min(weights) <= 0:
+            raise ValueError('A positive weight is required for every shortener')
+        if routing not in self.ROUTINGS:
+            raise ValueError('routing must be one of {0}'.format(', '.join(self.ROUTINGS)))
+        self.routing = routing
+        self._backends = [_Backend(shortener, weight, GDCircuitBreaker(failure_threshold, reset_timeout))
+                          for shortener, weight in zip(shorteners, weights)]
+        self._hosts = {}
+        for backend in self._backends:
+            self._hosts.setdefault(backend.host, []).append(backend)
+        self._total_weight = sum(weights)
+        self._lock = threading.Lock()
+        self._pools = _BulkPools()
+        self._turn = 0
+        self._failovers = 0
+
+
+# Shortener of the current worker process of a GDProcessPool
+_process_shortener = None
+
+# Thread pools of the current worker process of a GDProcessPool, reused by every chunk
+_process_pools = None
+
+
+def _init_process_worker(shortener_factory, shortener_kwargs):
+    """
+        Build the shortener, and the thread pools, used by a worker process of :class:`gdshortener.GDProcessPool`.
+    """
+    global _process_shortener, _process_pools
+    _process_shortener = shortener_factory(**shortener_kwargs)
+    _process_pools = _BulkPools()
+
+
+def _run_process_chunk(operation, items, log_stat, verify_ssl, max_workers):
+    """
+        Shorten, or lookup, a chunk of items in a worker process of :class:`gdshortener.GDProcessPool`.
+
+        Results (or the :class:`gdshortener.GDBaseException` raised) are returned in input order.
+    """
+    shortener = _process_shortener
+    if operation == 'shorten':
+        function = shortener.shorten
+        arguments = [_shorten_arguments(item, log_stat, verify_ssl) for item in items]
+    else:
+        function = shortener.lookup
+        arguments = [(short_url, verify_ssl) for short_url in items]
+    if max_workers == 1:
+        # CPU bound work: threads would only add switches
+        return [_capture(function, args) for args in arguments]
+    # Threads live as long as the process, so that the sessions and connections they open serve every chunk
+    return list(_run_ordered(function, arguments, max_workers, _process_pools))
+
+
+class GDProcessPool(object):
+    """
+        Bulk driver that shards URLs across worker processes, so that decoding, validation and serialization of results
+        use several cores instead of the single one available to threads.
+
+        Every worker process builds its own shortener (and so its own pooled connections) calling
+        ``shortener_factory(**shortener_kwargs)``, then processes chunks of *chunk_size* items with *max_workers* threads.
+        Processes share the request budget and the results already known through a :class:`gdshortener.GDFileRateLimiter`
+        and a :class:`gdshortener.GDSQLiteCache` given in *shortener_kwargs*, whose copies in every process use the same files.
+
+        Results stream back in input order: at most *max_pending_chunks* chunks are in flight, so inputs of any size
+        are processed in constant memory.
+
+        :param shortener_factory: Picklable callable building the shortener of a worker process, e.g. a shortener class
+        :type shortener_factory: callable.
+        :param shortener_kwargs: Picklable keyword arguments of *shortener_factory*
+        :type shortener_kwargs: dict.
+        :param processes: Number of worker processes (the number of cores if omitted)
+        :type processes: int.
+        :param chunk_size: Items sent to a worker process at once
+        :type chunk_size: int.
+        :param max_workers: Threads of every worker process, to overlap requests
+        :type max_workers: int.
+        :param max_pending_chunks: Chunks in flight at any time (twice the number of processes if omitted)
+        :type max_pending_chunks: int.
+        :param start_method: Start method of the worker processes (``'fork'``, ``'spawn'`` or ``'forkserver'``; the platform default if omitted)
+        :type start_method: str.
+    """
+
+    def lookup_many(self, short_urls, verify_ssl=True):
+        """
+            Lookup several URLs shortened with `is.gd - v.gd url service <http://is.gd/developers.php>`_ in the worker processes.
+
+            :param short_urls: the urls shortened with .gd service
+            :type short_urls: iterable of str.
+            :param verify_ssl: allow remote url ssl certificate verification (if True) or disable it (if False)
+            :type verify_ssl: bool.
+
+            :returns: list -- For each short url, in input order, the original url or the :class:`gdshortener.GDBaseException` raised for it.
+        """
+        return list(self.ilookup_many(short_urls, verify_ssl))
+
+    def ilookup_many(self, short_urls, verify_ssl=True):
+        """
+            Lazy version of :meth:`lookup_many`: results are yielded in input order as soon as their chunk is processed.
+
+            :returns: generator -- For each short url, the original url or the :class:`gdshortener.GDBaseException` raised for it.
+        """
+        return self._run('lookup', short_urls, False, verify_ssl)
+
+    def shorten_many(self, urls, log_stat=False, verify_ssl=True):
+        """
+            Shorten several URLs in the worker processes using `is.gd - v.gd url shortener service <http://is.gd/developers.php>`_.
+
+            :param urls: URLs that had to be shortened. Every item is either an url or a tuple ``(url, custom_url)``
+                or ``(url, custom_url, log_stat)``, as for :meth:`gdshortener.GDBaseShortener.shorten_many`
+            :type urls: iterable.
+            :param log_stat: Default for items that do not state their own *log_stat* flag
+            :type log_stat: bool.
+            :param verify_ssl: allow remote url ssl certificate verification (if True) or disable it (if False)
+            :type verify_ssl: bool.
+
+            :returns: list -- For each url, in input order, the ``(str,str)`` tuple returned by
+                :meth:`gdshortener.GDBaseShortener.shorten` or the :class:`gdshortener.GDBaseException` raised for it.
+        """
+        return list(self.ishorten_many(urls, log_stat, verify_ssl))
+
+    def ishorten_many(self, urls, log_stat=False, verify_ssl=True):
+        """
+            Lazy version of :meth:`shorten_many`: results are yielded in input order as soon as their chunk is processed.
+
+            :returns: generator -- For each url, the ``(str,str)`` tuple or the :class:`gdshortener.GDBaseException` raised for it.
+        """
+        return self._run('shorten', urls, log_stat, verify_ssl)
+
+    def close(self):
+        """
+            Stop the worker processes, once the chunks already submitted are processed.
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def _run(self, operation, items, log_stat, verify_ssl):
+        if self._pool is None:
+            raise ValueError('The process pool is closed')
+        items = iter(items)
+        pending = collections.deque()
+        while True:
+            chunk = list(itertools.islice(items, self.chunk_size))
+            if not chunk:
+                break
+            pending.append(self._pool.apply_async(_run_process_chunk, (operation, chunk, log_stat, verify_ssl, self.max_workers)))
+            if len(pending) >= self.max_pending_chunks:
+                for result in pending.popleft().get():
+                    yield result
+        while pending:
+            for result in pending.popleft().get():
+                yield result
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __init__(self, shortener_factory=ISGDShortener, shortener_kwargs=None, processes=None, chunk_size=100, max_workers=10,
+                 max_pending_chunks=None, start_method=None):
+        """
+            Start the worker processes.
+
+            :param shortener_factory: Picklable callable building the shortener of a worker process, e.g. a shortener class
+            :type shortener_factory: callable.
+            :param shortener_kwargs: Picklable keyword arguments of *shortener_factory*
+            :type shortener_kwargs: dict.
+            :param processes: Number of worker processes (the number of cores if omitted)
+            :type processes: int.
+            :param chunk_size: Items sent to a worker process at once
+            :type chunk_size: int.
+            :param max_workers: Threads of every worker process, to overlap requests
+            :type max_workers: int.
+            :param max_pending_chunks: Chunks in flight at any time (twice the number of processes if omitted)
+            :type max_pending_chunks: int.
+            :param start_method: Start method of the worker processes (the platform default if omitted)
+            :type start_method: str.
+
+            :raises: **ValueError** if a size is not positive, or *shortener_kwargs* hold a rate limiter or a cache that could not be shared among processes
+        """
+        shortener_kwargs = dict(shortener_kwargs or {})
+        rate_limiter = shortener_kwargs.get('rate_limiter')
+        if rate_limiter is not None and not isinstance(rate_limiter, GDFileRateLimiter):
+            raise ValueError('Worker processes could only share a GDFileRateLimiter')
+        cache = shortener_kwargs.get('cache')
+        if cache is not None and not isinstance(cache, GDSQLiteCache):
+            raise ValueError('Worker processes could only share a GDSQLiteCache')
+        import multiprocessing
+        processes = processes or multiprocessing.cpu_count()
+        if min(processes, chunk_size, max_workers) < 1 or (max_pending_chunks is not None and max_pending_chunks < 1):
+            raise ValueError('processes, chunk_size, max_workers and max_pending_chunks must be positive integers')
+        self.processes = processes
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.max_pending_chunks = max_pending_chunks or 2 * processes
+        context = multiprocessing.get_context(start_method) if start_method is not None else multiprocessing
+        self._pool = context.Pool(processes, _init_process_worker, (shortener_factory, shortener_kwargs))
+
+
+class GDAliasIndex(object):
+    """
+        Local index of custom short URLs (aliases) already known to be taken or owned, so that they are not requested again.
+
+        Taken aliases are kept in a Bloom filter, which holds millions of them in a few megabytes: a false positive only
+        makes an allocator skip a free alias, never reuse a taken one. Aliases owned by us are kept in an exact mapping
+        to the URL they point to (and the stem they were generated from). The index could be saved to a file and loaded
+        again, and shared by several threads.
+
+        :param capacity: Taken aliases the Bloom filter is sized for
+        :type capacity: int.
+        :param error_rate: False positive rate of the Bloom filter once it holds *capacity* aliases
+        :type error_rate: float.
+    """
+
+    _HEADER_ = struct.Struct('<4sBQIQ')
+    _MAGIC_ = b'GDAI'
+
+    @property
+    def taken(self):
+        """
+            Number of aliases marked as taken (duplicates included).
+
+            :returns: int.
+        """
+        return self._taken
+
+    def mark_taken(self, alias):
+        """
+            Record that *alias* is taken by somebody else.
+
+            :param alias: Custom short URL
+            :type alias: str.
+        """
+        with self._lock:
+            for position in self._positions(alias):
+                self._bits[position >> 3] |= 1 << (position & 7)
+            self._taken += 1
+
+    def mark_owned(self, alias, url, stem=None):
+        """
+            Record that *alias* is ours and points to *url*.
+
+            :param alias: Custom short URL
+            :type alias: str.
+            :param url: URL the alias points to
+            :type url: str.
+            :param stem: Stem the alias was generated from, if any
+            :type stem: str.
+        """
+        with self._lock:
+            self._owned[alias] = url
+            if stem is not None:
+                self._stems[(url, stem)] = alias
+
+    def owned_alias(self, url, stem):
+        """
+            Return the alias generated from *stem* that *url* already owns.
+
+            :param url: URL the alias points to
+            :type url: str.
+            :param stem: Stem the alias was generated from
+            :type stem: str.
+
+            :returns: str -- The alias, or ``None`` if there is none
+        """
+        return self._stems.get((url, stem))
+
+    def owner(self, alias):
+        """
+            Return the URL an alias owned by us points to.
+
+            :param alias: Custom short URL
+            :type alias: str.
+
+            :returns: str -- The URL, or ``None`` if the alias is not ours
+        """
+        return self._owned.get(alias)
+
+    def is_taken(self, alias):
+        """
+            Tell whether *alias* is (probably) taken by somebody else.
+
+            :param alias: Custom short URL
+            :type alias: str.
+
+            :returns: bool -- False if the alias was never marked as taken, True if it was (or, rarely, for a false positive)
+        """
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(alias))
+
+    def save(self, path):
+        """
+            Atomically write the index to *path*.
+
+            :param path: File the index is written to
+            :type path: str.
+        """
+        with self._lock:
+            header = self._HEADER_.pack(self._MAGIC_, 1, self.num_bits, self.num_hashes, self._taken)
+            bits = bytes(self._bits)
+            stems = dict((alias, stem) for (_, stem), alias in self._stems.items())
+            owned = ''.join('{0}\t{1}\t{2}\n'.format(alias, url, stems.get(alias, '')) for alias, url in self._owned.items())
+        with open(path + '.tmp', 'wb') as stream:
+            stream.write(header)
+            stream.write(bits)
+            stream.write(owned.encode('utf-8'))
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path):
+        """
+            Read an index written by :meth:`save`.
+
+            :param path: File the index was written to
+            :type path: str.
+
+            :returns: :class:`gdshortener.GDAliasIndex`
+            :raises: **ValueError** if the file does not hold an index
+        """
+        with open(path, 'rb') as stream:
+            header = stream.read(cls._HEADER_.size)
+            if len(header) < cls._HEADER_.size:
+                raise ValueError('{0} does not hold an alias index'.format(path))
+            magic, version, num_bits, num_hashes, taken = cls._HEADER_.unpack(header)
+            if magic != cls._MAGIC_ or version != 1:
+                raise ValueError('{0} does not hold an alias index'.format(path))
+            index = cls.__new__(cls)
+            index._setup(bytearray(stream.read((num_bits + 7) // 8)), num_hashes, taken)
+            # Lines end with \n only: splitlines() would also split URLs holding \x85, \u2028 and the like
+            for line in stream.read().decode('utf-8').split('\n')[:-1]:
+                alias, url, stem = line.split('\t')
+                index.mark_owned(alias, url, stem or None)
+        return index
+
+    def _positions(self, alias):
+        """
+            Bit positions of *alias* in the Bloom filter, by double hashing of a 128 bits digest.
+        """
+        digest = self._blake2b(alias.encode('utf-8'), digest_size=16).digest()
+        first, second = struct.unpack('<QQ', digest)
+        second |= 1
+        num_bits = self.num_bits
+        return [(first + index * second) % num_bits for index in range(self.num_hashes)]
+
+    def _setup(self, bits, num_hashes, taken):
+        from hashlib import blake2b
+        self._blake2b = blake2b
+        self._bits = bits
+        self.num_bits = len(bits) * 8
+        self.num_hashes = num_hashes
+        self._taken = taken
+        self._owned = {}
+        self._stems = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._owned)
+
+    def __init__(self, capacity=1000000, error_rate=0.001):
+        """
+            Init an empty index.
+
+            :param capacity: Taken aliases the Bloom filter is sized for
+            :type capacity: int.
+            :param error_rate: False positive rate of the Bloom filter once it holds *capacity* aliases
+            :type error_rate: float.
+        """
+        if capacity < 1 or not 0 < error_rate < 1:
+            raise ValueError('capacity must be positive and error_rate between 0 and 1')
+        num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        num_hashes = max(1, int(round(num_bits / float(capacity) * math.log(2))))
+        self._setup(bytearray((num_bits + 7) // 8), num_hashes, 0)
+
+
+class GDAliasAllocator(object):
+    """
+        Allocator of custom short URLs (aliases) on top of a :class:`gdshortener.GDBaseShortener`.
+
+        Candidate aliases are generated from a *template* and tried in turn until the service accepts one. Candidates that
+        are not valid custom short URLs, that the :class:`gdshortener.GDAliasIndex` knows to be taken, or that another
+        thread is trying at the same time, are skipped without any request; candidates refused by the service are marked
+        as taken, accepted ones as owned. An URL that already owns an alias of the stem gets it back without any request.
+
+        Counters report how many allocations were made, with how many requests and collisions, and at what throughput.
+
+        :param shortener: Shortener requesting the aliases
+        :type shortener: :class:`gdshortener.GDBaseShortener`
+        :param index: Index of known aliases (a new empty one if omitted)
+        :type index: :class:`gdshortener.GDAliasIndex`
+        :param template: Format of the candidates after the first one (the stem itself), with ``{stem}``, ``{n}``
+            (counter starting at 1) and ``{random}`` (4 random letters or digits) fields
+        :type template: str.
+        :param max_attempts: Requests allowed for a single allocation before giving up
+        :type max_attempts: int.
+        :param max_candidates: Candidates (skipped ones included) generated for a single allocation before giving up
+        :type max_candidates: int.
+    """
+
+    _RANDOM_ALPHABET_ = 'abcdefghijklmnopqrstuvwxyz0123456789'
+
+    @property
+    def allocations(self):
+        """
+            Number of aliases allocated, reused ones included.
+
+            :returns: int.
+        """
+        return self._allocations
+
+    @property
+    def requests(self):
+        """
+            Number of candidates sent to .gd service.
+
+            :returns: int.
+        """
+        return self._requests
+
+    @property
+    def collisions(self):
+        """
+            Number of candidates refused by .gd service because they were already taken.
+
+            :returns: int.
+        """
+        return self._collisions
+
+    @property
+    def skipped(self):
+        """
+            Number of candidates skipped without any request (invalid, known to be taken or being tried by another thread).
+
+            :returns: int.
+        """
+        return self._skipped
+
+    @property
+    def collision_rate(self):
+        """
+            Share of the requests refused because their candidate was taken.
+
+            :returns: float.
+        """
+        return self._collisions / float(self._requests) if self._requests else 0.0
+
+    @property
+    def throughput(self):
+        """
+            Allocations per second, over the time from the start of the first allocation to the end of the last one.
+
+            :returns: float.
+        """
+        if self._started is None or self._finished <= self._started:
+            return 0.0
+        return self._allocations / (self._finished - self._started)
+
+    def allocate(self, url, stem, log_stat=False, verify_ssl=True):
+        """
+            Shorten *url* with the first free alias generated from *stem*.
+
+            :param url: URL that had to be shortened
+            :type url: str.
+            :param stem: Base of the aliases; characters that could not appear in a custom short URL are replaced by ``_``
+            :type stem: str.
+            :param log_stat: States if the generated url has statistical analisys attached
+            :type log_stat: bool.
+            :param verify_ssl: allow remote url ssl certificate verification (if True) or disable it (if False)
+            :type verify_ssl: bool.
+
+            :returns: (str,str) -- Shortened URL and Stat URL, as returned by :meth:`gdshortener.GDBaseShortener.shorten`
+            :raises: :class:`gdshortener.GDShortURLError` if no free alias is found within *max_attempts* requests
+                (or *max_candidates* candidates), and the errors of :meth:`gdshortener.GDBaseShortener.shorten`
+        """
+        with self._lock:
+            if self._started is None:
+                self._started = time.time()
+        normalized = self._validator.normalize(url)
+        stem = _ALIAS_UNSAFE_PATTERN_.sub('_', stem or '')
+        owned = self.index.owned_alias(normalized, stem)
+        if owned is not None and self.index.owner(owned) == normalized:
+            shortener_url = self.shortener.shortener_url
+            return self._allocated(_shorten_result({'shorturl': '{0}/{1}'.format(shortener_url, owned)}, shortener_url,
+                                                   log_stat))
+        attempts = 0
+        for counter, candidate in itertools.islice(self._candidates(stem), self.max_candidates):
+            if not self._reserve(candidate, normalized):
+                continue
+            try:
+                attempts += 1
+                result = self.shortener.shorten(url, candidate, log_stat, verify_ssl)
+            except GDShortURLError:
+                self.index.mark_taken(candidate)
+                with self._lock:
+                    self._collisions += 1
+                    self._advance(stem, counter)
+                if attempts >= self.max_attempts:
+                    break
+                continue
+            finally:
+                with self._lock:
+                    self._requests += 1
+                    self._trying.discard(candidate)
+            self.index.mark_owned(candidate, normalized, stem)
+            with self._lock:
+                self._advance(stem, counter)
+            return self._allocated(result)
+        raise GDShortURLError('No free custom short URL found for the stem {0}'.format(stem))
+
+    def allocate_many(self, items, log_stat=False, verify_ssl=True, max_workers=10):
+        """
+            Allocate aliases for several URLs concurrently, as :meth:`allocate` does.
+
+            :param items: ``(url, stem)`` tuples
+            :type items: iterable.
+            :param log_stat: States if the generated urls have statistical analisys attached
+            :type log_stat: bool.
+            :param verify_ssl: allow remote url ssl certificate verification (if True) or disable it (if False)
+            :type verify_ssl: bool.
+            :param max_workers: Number of allocations performed at the same time
+            :type max_workers: int.
+
+            :returns: list -- For each item, in input order, the ``(str,str)`` tuple returned by :meth:`allocate`
+                or the :class:`gdshortener.GDBaseException` raised for it.
+        """
+        return list(self.iallocate_many(items, log_stat, verify_ssl, max_workers))
+
+    def iallocate_many(self, items, log_stat=False, verify_ssl=True, max_workers=10):
+        """
+            Lazy version of :meth:`allocate_many`: results are yielded in input order as soon as they are available.
+
+            :returns: generator -- For each item, the ``(str,str)`` tuple returned by :meth:`allocate`
+                or the :class:`gdshortener.GDBaseException` raised for it.
+        """
+        return _run_ordered(self.allocate, ((url, stem, log_stat, verify_ssl) for url, stem in items), max_workers)
+
+    def _allocated(self, result):
+        """
+            Account an allocation and return its *result*.
+        """
+        with self._lock:
+            self._allocations += 1
+            self._finished = time.time()
+        return result
+
+    def _advance(self, stem, counter):
+        """
+            Start the next allocations of *stem* after *counter*, which is now used (to be called holding the lock).
+        """
+        if counter > 0 and counter >= self._next_counters.get(stem, 1):
+            self._next_counters[stem] = counter + 1
+
+    def _candidates(self, stem):
+        """
+            Generate the ``(counter, candidate)`` aliases of *stem*: the stem itself (counter ``0``), then the ones of the
+            template, starting after the counters already used for the stem.
+        """
+        yield 0, stem[:30]
+        with self._lock:
+            start = self._next_counters.get(stem, 1)
+        for counter in itertools.count(start):
+            token = ''.join(self._random.choice(self._RANDOM_ALPHABET_) for _ in range(4)) if self._uses_random else ''
+            candidate = self.template.format(stem=stem, n=counter, random=token)
+            if len(candidate) > 30:
+                # Shorten the stem, keeping the part added by the template
+                candidate = self.template.format(stem=stem[:max(0, len(stem) - len(candidate) + 30)], n=counter, random=token)
+            yield counter, candidate
+
+    def _reserve(self, candidate, url):
+        """
+            Reserve *candidate* for the calling thread, unless it should be skipped without any request.
+        """
+        with self._lock:
+            owner = self.index.owner(candidate)
+            skip = (candidate in self._trying or not self._validator.is_valid_custom_url(candidate) or
+                    (owner is not None and owner != url) or (owner is None and self.index.is_taken(candidate)))
+            if skip:
+                self._skipped += 1
+                return False
+            self._trying.add(candidate)
+            return True
+
+    def __init__(self, shortener, index=None, template='{stem}_{n}', max_attempts=10, max_candidates=1000):
+        """
+            Init the allocator.
+
+            :param shortener: Shortener requesting the aliases
+            :type shortener: :class:`gdshortener.GDBaseShortener`
+            :param index: Index of known aliases (a new empty one if omitted)
+            :type index: :class:`gdshortener.GDAliasIndex`
+            :param template: Format of the candidates after the first one, with ``{stem}``, ``{n}`` and ``{random}`` fields
+            :type template: str.
+            :param max_attempts: Requests allowed for a single allocation before giving up
+            :type max_attempts: int.
+            :param max_candidates: Candidates generated for a single allocation before giving up
+            :type max_candidates: int.
+        """
+        if max_attempts < 1 or max_candidates < 1:
+            raise ValueError('max_attempts and max_candidates must be positive integers')
+        self.shortener = shortener
+        self.index = GDAliasIndex() if index is None else index
+        self.template = template
+        self.max_attempts = max_attempts
+        self.max_candidates = max_candidates
+        self._validator = getattr(shortener, '_validator', _DEFAULT_URL_VALIDATOR_)
+        self._random = random.Random()
+        self._uses_random = '{random' in template
+        self._lock = threading.Lock()
+        self._trying = set()
+        # Stem -> first counter of the template not used yet, so that allocations do not walk the used ones again
+        self._next_counters = {}
+        self._allocations = 0
+        self._requests = 0
+        self._collisions = 0
+        self._skipped = 0
+        self._started = None
+        self._finished = None
+
+
+class GDLookupResolver(object):
+    """
+        Streaming resolver of the .gd short URLs found in raw text (log lines, documents, or plain short URLs).
+
+        Short codes are extracted with a scanner compiled once from the hosts of the shorteners, routed to the shortener
+        serving their host and looked up concurrently (through the cache of the shortener, if any). A short URL seen
+        again within the last *window* distinct ones is not resolved nor yielded again. Text is consumed while results
+        are yielded, so memory only depends on *window* and *max_workers*, whatever the size of the input.
+
+        :param shorteners: Shorteners serving the short URLs (an :class:`gdshortener.ISGDShortener` and a
+            :class:`gdshortener.VGDShortener` sharing a :class:`gdshortener.GDMemoryCache` if omitted)
+        :type shorteners: list of :class:`gdshortener.GDBaseShortener`
+        :param window: Number of distinct short URLs remembered to drop duplicates (0 disables it)
+        :type window: int.
+        :param max_workers: Number of lookups performed at the same time
+        :type max_workers: int.
+        :param verify_ssl: allow remote url ssl certificate verification (if True) or disable it (if False)
+        :type verify_ssl: bool.
+    """
+
+    @property
+    def scanned(self):
+        """
+            Number of texts scanned.
+
+            :returns: int.
+        """
+        return self._scanned
+
+    @property
+    def found(self):
+        """
+            Number of short URLs found in the texts, duplicates included.
+
+            :returns: int.
+        """
+        return self._found
+
+    @property
+    def duplicates(self):
+        """
+            Number of short URLs dropped because they were seen within the window.
+
+            :returns: int.
+        """
+        return self._duplicates
+
+    @property
+    def failed(self):
+        """
+            Number of short URLs whose lookup failed.
+
+            :returns: int.
+        """
+        return self._failed
+
+    def extract(self, texts):
+        """
+            Extract the short URLs of the shorteners from *texts*, dropping the ones seen within the window.
+
+            :param texts: Texts or URLs (bytes are decoded as UTF-8)
+            :type texts: iterable of str.
+
+            :returns: generator -- For each short URL, a ``(short_url, shortener)`` tuple; short URLs are rebuilt from
+                the URL of their shortener, so ``IS.GD/abc`` and ``https://www.is.gd/abc`` are both ``http://is.gd/abc``.
+        """
+        finditer = self._scanner.finditer
+        routes = self._routes
+        window = self.window
+        seen = self._seen
+        for text in texts:
+            self._scanned += 1
+            if isinstance(text, bytes):
+                text = text.decode('utf-8', 'replace')
+            for match in finditer(text):
+                self._found += 1
+                shortener_url, shortener = routes[match.group(1).lower()]
+                short_url = '{0}/{1}'.format(shortener_url, match.group(2))
+                if window:
+                    if short_url in seen:
+                        seen.move_to_end(short_url)
+                        self._duplicates += 1
+                        continue
+                    seen[short_url] = None
+                    if len(seen) > window:
+                        seen.popitem(last=False)
+                yield short_url, shortener
+
+    def resolve(self, texts):
+        """
+            Resolve every short URL found in *texts*, see :meth:`iresolve`.
+
+            :returns: list -- :class:`gdshortener.GDLookupResult` items, unpacked as ``(short_url, original_url)``, the
+                original url being replaced by the :class:`gdshortener.GDBaseException` raised for it if the lookup failed
+        """
+        return list(self.iresolve(texts))
+
+    def iresolve(self, texts):
+        """
+            Lazy version of :meth:`resolve`: short URLs are yielded in the order they are found, as soon as they are resolved.
+
+            *texts* is consumed while results are yielded, with at most ``2 * max_workers`` lookups pending.
+
+            :param texts: Texts or URLs (bytes are decoded as UTF-8)
+            :type texts: iterable of str.
+
+            :returns: generator -- :class:`gdshortener.GDLookupResult` items, unpacked as ``(short_url, original_url)``, the
+                original url being replaced by the :class:`gdshortener.GDBaseException` raised for it if the lookup failed
+        """
+        for result in _run_ordered(self._resolve, self.extract(texts), self.max_workers, self._pools):
+            if isinstance(result.url, GDBaseException):
+                self._failed += 1
+            yield result
+
+    def close(self):
+        """
+            Close the shorteners created by the resolver.
+        """
+        self._pools.close()
+        for shortener in self._owned:
+            shortener.close()
+
+    def _resolve(self, short_url, shortener):
+        return GDLookupResult(short_url, _capture(shortener.lookup, (short_url, self.verify_ssl)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __init__(self, shorteners=None, window=100000, max_workers=10, verify_ssl=True):
+        """
+            Init the resolver.
+
+            :param shorteners: Shorteners serving the short URLs (.gd ones with a shared memory cache if omitted)
+            :type shorteners: list of :class:`gdshortener.GDBaseShortener`
+            :param window: Number of distinct short URLs remembered to drop duplicates (0 disables it)
+            :type window: int.
+            :param max_workers: Number of lookups performed at the same time
+            :type max_workers: int.
+            :param verify_ssl: allow remote url ssl certificate verification (if True) or disable it (if False)
+            :type verify_ssl: bool.
+        """
+        if window < 0:
+            raise ValueError('window must not be negative')
+        if max_workers < 1:
+            raise ValueError('max_workers must be a positive integer')
+        self._owned = ()
+        if shorteners is None:
+            cache = GDMemoryCache()
+            shorteners = self._owned = (ISGDShortener(cache=cache), VGDShortener(cache=cache))
+        self.window = window
+        self.max_workers = max_workers
+        self.verify_ssl = verify_ssl
+        self._pools = _BulkPools()
+        # Host -> (shortener url, shortener); short URLs are accepted with or without the www. prefix
+        self._routes = {}
+        for shortener in shorteners:
+            shortener_url = shortener.shortener_url.rstrip('/')
+            host = urlsplit(shortener_url).netloc.lower()
+            host = host[4:] if host.startswith('www.') else host
+            if host in self._routes:
+                raise ValueError('More than one shortener serves {0}'.format(host))
+            self._routes[host] = (shortener_url, shortener)
+        if not self._routes:
+            raise ValueError('At least one shortener is required')
+        hosts = '|'.join(re.escape(host) for host in sorted(self._routes, key=len, reverse=True))
+        # A host must not be the tail of a longer one (this.gd), a code must not go on (is.gd/stats.php)
+        self._scanner = re.compile(r'(?<![A-Za-z0-9.\-])(?:https?://)?(?:www\.)?(' + hosts +
+                                   r')/([A-Za-z0-9_]{1,30})(?![A-Za-z0-9_]|\.[A-Za-z0-9])', re.IGNORECASE)
+        self._seen = collections.OrderedDict()
+        self._scanned = 0
+        self._found = 0
+        self._duplicates = 0
+        self._failed = 0
+
+
+class GDPriorityClass(object):
+    """
+        Priority class of the requests of a :class:`gdshortener.GDPriorityScheduler`.
+
+        :param name: Name the requests of the class are submitted with
+        :type name: str.
+        :param priority: Priority of the class, lower values first
+        :type priority: int.
+        :param max_concurrency: Requests of the class in flight at most (no limit but the scheduler one if ``None``)
+        :type max_concurrency: int.
+        :param rate_share: Share of the rate of the scheduler granted to the class (no limit but the scheduler one if ``None``)
+        :type rate_share: float.
+    """
+
+    def __init__(self, name, priority=0, max_concurrency=None, rate_share=None):
+        """
+            Init the priority class.
+
+            :param name: Name the requests of the class are submitted with
+            :type name: str.
+            :param priority: Priority of the class, lower values first
+            :type priority: int.
+            :param max_concurrency: Requests of the class in flight at most
+            :type max_concurrency: int.
+            :param rate_share: Share of the rate of the scheduler granted to the class
+            :type rate_share: float.
+
+            :raises: **ValueError** if *max_concurrency* is not positive or *rate_share* is not between 0 and 1
+        """
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError('max_concurrency must be a positive integer')
+        if rate_share is not None and not 0 < rate_share <= 1:
+            raise ValueError('rate_share must be between 0 and 1')
+        self.name = name
+        self.priority = priority
+        self.max_concurrency = max_concurrency
+        self.rate_share = rate_share
+
+
+class _ScheduledBucket(object):
+    """
+        Token bucket of a :class:`gdshortener.GDPriorityScheduler`, or of one of its classes, read under the scheduler lock.
+    """
+
+    __slots__ = ('rate', 'tokens', 'updated')
+
+    def delay(self, now):
+        """
+            Seconds before a token is available for the next request (0 if it could be sent now).
+        """
+        self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = max(1.0, rate)
+        self.updated = time.time()
+
+
+class _ScheduledClass(object):
+    """
+        Queues, token bucket and metrics of a :class:`gdshortener.GDPriorityClass` in a scheduler.
+    """
+
+    __slots__ = ('name', 'priority', 'max_concurrency', 'bucket', 'tenants', 'turns', 'queued', 'in_flight',
+                 'submitted', 'completed', 'failed', 'rejected', 'service_time', 'waits')
+
+    def push(self, tenant, request):
+        queue = self.tenants.get(tenant)
+        if queue is None:
+            queue = self.tenants[tenant] = collections.deque()
+            self.turns.append(tenant)
+        queue.append(request)
+        self.queued += 1
+
+    def pop(self):
+        """
+            Pop the next request, taking tenants in turn.
+        """
+        tenant = self.turns.popleft()
+        queue = self.tenants[tenant]
+        request = queue.popleft()
+        if queue:
+            self.turns.append(tenant)
+        else:
+            del self.tenants[tenant]
+        self.queued -= 1
+        return request
+
+    def __init__(self, priority_class, max_concurrency, rate, keep):
+        self.name = priority_class.name
+        self.priority = priority_class.priority
+        self.max_concurrency = min(max_concurrency, priority_class.max_concurrency or max_concurrency)
+        # Classes without a share are only limited by the bucket of the scheduler
+        self.bucket = None if rate is None or priority_class.rate_share is None else \
+            _ScheduledBucket(rate * priority_class.rate_share)
+        self.tenants = {}
+        self.turns = collections.deque()
+        self.queued = 0
+        self.in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.service_time = 0.0
+        self.waits = collections.deque(maxlen=keep)
+
+
+class GDPriorityScheduler(object):
+    """
+        Scheduler of shorten requests of several priority classes and tenants in front of a shortener.
+
+        Requests are queued by priority class and sent by *max_concurrency* worker threads: a free worker takes the
+        request of the class with the highest priority that is below its own concurrency limit and has a token of its
+        rate share (if any) and of the scheduler rate, so a flood of low priority requests does not delay high priority ones, while the concurrency limit
+        of the high priority classes keeps workers for the others. Within a class, tenants are served in turn.
+
+        A request with a deadline is rejected with :class:`gdshortener.GDTimeoutError`, without any request to .gd
+        service, as soon as it could not meet it: when it is submitted, if the requests queued ahead of it and the
+        average service time of its class already outlast it, and when it is dequeued. Queue waits are reported by
+        :meth:`metrics`.
+
+        The returned futures could be awaited by asyncio callers with ``asyncio.wrap_future``.
+
+        :param shortener: Shortener performing the requests
+        :type shortener: :class:`gdshortener.GDBaseShortener`
+        :param classes: Priority classes (``interactive`` before ``batch``, the latter limited to half of the workers,
+            if omitted)
+        :type classes: list of :class:`gdshortener.GDPriorityClass`
+        :param max_concurrency: Number of worker threads, i.e. requests in flight at most
+        :type max_concurrency: int.
+        :param rate: Requests per second of all the classes together, each one limited to its ``rate_share`` of it
+            (no limit if ``None``)
+        :type rate: float.
+        :param keep: Number of latest queue waits kept by every class for :meth:`metrics`
+        :type keep: int.
+    """
+
+    def submit(self, url, custom_url=None, log_stat=False, verify_ssl=True, priority=None, tenant=None, deadline=None):
+        """
+            Queue a shorten request, see :meth:`gdshortener.GDBaseShortener.shorten`.
+
+            :param priority: Name of the priority class (the one with the lowest priority if omitted)
+            :type priority: str.
+            :param tenant: Tenant the request belongs to
+            :type tenant: hashable
+            :param deadline: Seconds allowed from now for the request to complete, queue wait included (no limit if ``None``)
+            :type deadline: float.
+
+            :returns: concurrent.futures.Future -- Future of the result of :meth:`gdshortener.GDBaseShortener.shorten`
+            :raises: **ValueError** if the priority class is unknown or the scheduler is closed
+        """
+        from concurrent.futures import Future
+        state = self._states[-1] if priority is None else self._classes.get(priority)
+        if state is None:
+            raise ValueError('Unknown priority class {0}'.format(priority))
+        future = Future()
+        now = time.time()
+        deadline_at = _deadline_at(deadline)
+        with self._condition:
+            if self._closed:
+                raise ValueError('The scheduler is closed')
+            state.submitted += 1
+            if deadline_at is not None and now + self._expected_wait(state) >= deadline_at:
+                state.rejected += 1
+                future.set_exception(GDTimeoutError('The request could not meet its deadline'))
+                return future
+            state.push(tenant, (future, (url, custom_url, log_stat, verify_ssl), deadline_at, now))
+            self._condition.notify()
+        return future
+
+    def shorten(self, url, custom_url=None, log_stat=False, verify_ssl=True, priority=None, tenant=None, deadline=None):
+        """
+            Queue a shorten request and wait for its result, see :meth:`submit`.
+
+            :returns: :class:`gdshortener.GDShortenResult` -- As returned by :meth:`gdshortener.GDBaseShortener.shorten`
+        """
+        return self.submit(url, custom_url, log_stat, verify_ssl, priority, tenant, deadline).result()
+
+    def metrics(self):
+        """
+            Report the requests and queue waits of every priority class.
+
+            :returns: dict -- By class name: ``queued`` and ``in_flight`` requests; ``submitted``, ``completed``,
+                ``failed`` and ``rejected`` (for their deadline) counts; ``service_time``, the average seconds taken
+                by a request, and ``wait_p50``, ``wait_p95``, ``wait_p99`` and ``wait_max``, the seconds waited in the
+                queue by the latest requests (``None`` until a request leaves the queue)
+        """
+        report = {}
+        with self._lock:
+            for state in self._states:
+                waits = sorted(state.waits)
+                report[state.name] = {
+                    'queued': state.queued,
+                    'in_flight': state.in_flight,
+                    'submitted': state.submitted,
+                    'completed': state.completed,
+                    'failed': state.failed,
+                    'rejected': state.rejected,
+                    'service_time': state.service_time,
+                }
+                for name, fraction in (('wait_p50', 0.5), ('wait_p95', 0.95), ('wait_p99', 0.99), ('wait_max', 1.0)):
+                    report[state.name][name] = waits[max(0, int(math.ceil(fraction * len(waits))) - 1)] if waits else None
+        return report
+
+    def close(self, wait=True):
+        """
+            Stop accepting requests and stop the workers.
+
+            :param wait: If True, queued requests are sent first; otherwise they fail with :class:`gdshortener.GDGenericError`
+            :type wait: bool.
+        """
+        with self._condition:
+            self._closed = True
+            if not wait:
+                for state in self._states:
+                    while state.queued:
+                        state.pop()[0].set_exception(GDGenericError('The scheduler was closed'))
+            self._condition.notify_all()
+        for worker in self._workers:
+            worker.join()
+
+    def _expected_wait(self, state):
+        """
+            Estimate the seconds a request submitted now to *state* takes to complete. Callers hold the lock.
+        """
+        ahead = sum(other.queued for other in self._states if other.priority <= state.priority)
+        return state.service_time * (1 + ahead / float(state.max_concurrency))
+
+    def _next(self, now):
+        """
+            Dequeue the next request that could be sent, rejecting the ones that could no longer meet their deadline.
+            Callers hold the lock.
+
+            :returns: tuple -- ``(state, request)``, or ``(None, delay)`` where *delay* is the seconds to wait before
+                a rate share allows a request (``None`` if nothing could be sent)
+        """
+        delay = None
+        shared = 0.0 if self._bucket is None else self._bucket.delay(now)
+        for state in self._states:
+            if not state.queued or state.in_flight >= state.max_concurrency:
+                continue
+            wait = max(shared, 0.0 if state.bucket is None else state.bucket.delay(now))
+            if wait > 0:
+                delay = wait if delay is None else min(delay, wait)
+                continue
+            while state.queued:
+                request = state.pop()
+                future, _, deadline_at, submitted = request
+                if future.cancelled():
+                    continue
+                state.waits.append(now - submitted)
+                if deadline_at is not None and now + state.service_time >= deadline_at:
+                    state.rejected += 1
+                    future.set_exception(GDTimeoutError('The request could not meet its deadline'))
+                    continue
+                for bucket in (self._bucket, state.bucket):
+                    if bucket is not None:
+                        bucket.tokens -= 1
+                state.in_flight += 1
+                return state, request
+        return None, delay
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while True:
+                    state, request = self._next(time.time())
+                    if state is not None:
+                        break
+                    if self._closed and not any(other.queued for other in self._states):
+                        return
+                    self._condition.wait(request)
+            future, args, deadline_at, _ = request
+            started = time.time()
+            running = future.set_running_or_notify_cancel()
+            failed = False
+            if running:
+                try:
+                    future.set_result(self.shortener.shorten(
+                        *args, deadline=None if deadline_at is None else max(0.001, deadline_at - started)))
+                except BaseException as ex:
+                    failed = True
+                    future.set_exception(ex)
+            elapsed = time.time() - started
+            with self._condition:
+                state.in_flight -= 1
+                if running:
+                    state.failed += failed
+                    state.completed += not failed
+                    # Moving average of the service time, starting from the first request
+                    done = state.completed + state.failed
+                    state.service_time += (elapsed - state.service_time) / min(done, 10)
+                self._condition.notify()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __init__(self, shortener, classes=None, max_concurrency=10, rate=None, keep=10000):
+        """
+            Init the scheduler and start its workers.
+
+            :param shortener: Shortener performing the requests
+            :type shortener: :class:`gdshortener.GDBaseShortener`
+            :param classes: Priority classes (``interactive`` and ``batch`` if omitted)
+            :type classes: list of :class:`gdshortener.GDPriorityClass`
+            :param max_concurrency: Number of worker threads, i.e. requests in flight at most
+            :type max_concurrency: int.
+            :param rate: Requests per second of all the classes together, each one limited to its ``rate_share`` of it
+                (no limit if ``None``)
+            :type rate: float.
+            :param keep: Number of latest queue waits kept by every class for :meth:`metrics`
+            :type keep: int.
+
+            :raises: **ValueError** if *max_concurrency* is not positive, no class is given or two share a name
+        """
+        if max_concurrency < 1:
+            raise ValueError('max_concurrency must be a positive integer')
+        if classes is None:
+            classes = [GDPriorityClass('interactive', 0),
+                       GDPriorityClass('batch', 1, max_concurrency=max(1, max_concurrency // 2))]
+        if not classes:
+            raise ValueError('At least one priority class is required')
+        self.shortener = shortener
+        self.max_concurrency = max_concurrency
+        self._states = sorted((_ScheduledClass(priority_class, max_concurrency, rate, keep) for priority_class in classes),
+                              key=lambda state: state.priority)
+        self._classes = dict((state.name, state) for state in self._states)
+        if len(self._classes) != len(self._states):
+            raise ValueError('Priority classes must have distinct names')
+        # Every request takes a token of the scheduler too, so that the classes together never exceed *rate*
+        self._bucket = None if rate is None else _ScheduledBucket(rate)
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._closed = False
+        self._workers = [threading.Thread(target=self._work, name='gdshortener-scheduler-{0}'.format(index))
+                         for index in range(max_concurrency)]
+        for worker in self._workers:
+            worker.daemon = True
+            worker.start()
+
+
+class AsyncGDBaseShortener(object):
+    """
+        Asyncio shortener for `is.gd - v.gd url shortener <http://is.gd/developers.php>`_.
+
+        It behaves like :class:`gdshortener.GDBaseShortener` (same validation, errors and stats URL) but its methods are coroutines
+        running on `aiohttp <https://docs.aiohttp.org/>`_, which has to be installed (``pip install gdshortener[async]``).
+
+        :type shortener_url: str.
+        :param shortener_url: base is.gd - v.gd API URL to create shorten link.
+
+            Possible values are:
+
+            1. **_IS_GD_SHORTENER_URL_** to obtain *is.gd* shortened url
+            2. **_V_GD_SHORTENER_URL_** to obtain *v.gd* shortened url
+
+        :param timeout: Timeout in seconds used to connect and obtain shortened URL from .gd service, either a single value or a ``(connect, read)`` tuple
+        :type timeout: float or tuple.
+        :param user_agent: User Agent used when querying .gd services
+        :type user_agent: str.
+        :param session: aiohttp session used to reach .gd services. It could be shared among shorteners; if omitted a private one is created on first use
+        :type session: aiohttp.ClientSession
+        :param limit_per_host: Maximum number of connections opened to each host by the private session
+        :type limit_per_host: int.
+        :param keep_alive: If False, the private session closes every connection after its request
+        :type keep_alive: bool.
+        :param rate_limiter: Bucket that paces requests within .gd usage limits; waiting for tokens does not block the event loop
+        :type rate_limiter: :class:`gdshortener.GDRateLimiter`
+        :param retry_policy: Policy stating which errors are retried and how long to wait before each retry
+        :type retry_policy: :class:`gdshortener.GDRetryPolicy`
+        :param deadline: Seconds allowed for a whole call, retries and rate limit waits included (no limit if ``None``)
+        :type deadline: float.
+        :param cache: Cache of shortened and looked up URLs. It could be shared among shorteners
+        :type cache: :class:`gdshortener.GDMemoryCache` or :class:`gdshortener.GDSQLiteCache`
+        :param coalesce: If True, concurrent identical calls share a single request to .gd service
+        :type coalesce: bool.
+        :param validator: Validator and normalizer of URLs and custom short URLs, checked before any request (a default one if omitted)
+        :type validator: :class:`gdshortener.GDURLValidator`
+        :param concurrency_limiter: Adaptive limit of the requests in flight; waiting for it does not block the event loop
+        :type concurrency_limiter: :class:`gdshortener.GDConcurrencyLimiter`
+    """
+
+    @property
+    def coalesced(self):
+        """
+            Number of calls that shared the request of an identical call already in flight.
+
+            :returns: int.
+        """
+        return 0 if self._flight is None else self._flight.coalesced
+
+    async def lookup(self, short_url, verify_ssl=True, timeout=None, deadline=None):
+        """
+            Lookup an URL shortened with `is.gd - v.gd url service <http://is.gd/developers.php>`_ and return the real url.
+
+            See :meth:`gdshortener.GDBaseShortener.lookup`.
+
+            :param short_url: the url shortened with .gd service
+            :type short_url: str.
+            :param verify_ssl: allow remote url ssl certificate verification (if True) or disable it (if False)
+            :type verify_ssl: bool.
+            :param timeout: Timeout used for this call instead of the one of the shortener
+            :type timeout: float or tuple.
+            :param deadline: Deadline used for this call instead of the one of the shortener
+            :type deadline: float.
+
+            :returns: str. -- The original url that was shortened with .gd service
+        """
+        data = _lookup_data(short_url)
+        key = (self.shortener_url, _short_code(short_url))
+        if self._cache is not None:
+            url = self._cache.get_lookup(key)
+            if url is not None:
+                return url
+        url = await self._coalesce(('lookup',) + key, deadline, self._query, 'forward.php', data, verify_ssl, 1,
+                                   _lookup_result, timeout, deadline)
+        if self._cache is not None:
+            self._cache.set_lookup(key, url)
+        return url
+
+    async def shorten(self, url, custom_url=None, log_stat=False, verify_ssl=True, timeout=None, deadline=None):
+        """
+            Shorten an URL using `is.gd - v.gd url shortener service <http://is.gd/developers.php>`_.
+
+            See :meth:`gdshortener.GDBaseShortener.shorten`.
+
+            :param url: URL that had to be shortened
+            :type url: str.
+            :param custom_url: if specified, the url generated will be http://is.gd/<custom_url> (or http://v.gd/<custom_url>).
+            :type custom_url: str.
+            :param log_stat: States if the generated url has statistical analisys attached.
+            :type log_stat: bool.
+            :param verify_ssl: allow remote url ssl certificate verification (if True) or disable it (if False)
+            :type verify_ssl: bool.
+            :param timeout: Timeout used for this call instead of the one of the shortener
+            :type timeout: float or tuple.
+            :param deadline: Deadline used for this call instead of the one of the shortener
+            :type deadline: float.
+
+            :returns:  :class:`gdshortener.GDShortenResult` -- Unpacked as ``(short_url, stats_url)``: Shortened URL obtained by .gd service and Stat URL if requested (otherwhise is ``None``).
+        """
+        data = _shorten_data(url, custom_url, log_stat, self._validator)
+        key = _shorten_key(self.shortener_url, data)
+        if self._cache is not None:
+            result = self._cache.get_shortened(key)
+            if result is not None:
+                return result
+        result = await self._coalesce(('shorten',) + key, deadline, self._query, 'create.php', data, verify_ssl,
+                                      2 if log_stat else 1,
+                                      lambda response: _shorten_result(response, self.shortener_url, log_stat), timeout, deadline)
+        if self._cache is not None:
+            _remember_shortened(self._cache, key, result)
+        return result
+
+    async def lookup_many(self, short_urls, verify_ssl=True, max_concurrency=10):
+        """
+            Lookup several shortened URLs concurrently, with at most *max_concurrency* requests in flight.
+
+            :param short_urls: the urls shortened with .gd service
+            :type short_urls: iterable of str.
+            :param verify_ssl: allow remote url ssl certificate verification (if True) or disable it (if False)
+            :type verify_ssl: bool.
+            :param max_concurrency: Number of lookups performed at the same time
+            :type max_concurrency: int.
+
+            :returns: list -- For each short url, in input order, the original url or the :class:`gdshortener.GDBaseException` raised for it.
+        """
+        import asyncio
+        semaphore = asyncio.Semaphore(max_concurrency)
+        return list(await asyncio.gather(*[self._bounded(semaphore, self.lookup, (short_url, verify_ssl))
+                                           for short_url in short_urls]))
+
+    async def shorten_many(self, urls, log_stat=False, verify_ssl=True, max_concurrency=10):
+        """
+            Shorten several URLs concurrently, with at most *max_concurrency* requests in flight.
+
+            :param urls: URLs that had to be shortened, as accepted by :meth:`gdshortener.GDBaseShortener.shorten_many`
+            :type urls: iterable.
+            :param log_stat: Default for items that do not state their own *log_stat* flag
+            :type log_stat: bool.
+            :param verify_ssl: allow remote url ssl certificate verification (if True) or disable it (if False)
+            :type verify_ssl: bool.
+            :param max_concurrency: Number of URLs shortened at the same time
+            :type max_concurrency: int.
+
+            :returns: list -- For each url, in input order, the :class:`gdshortener.GDShortenResult` returned by :meth:`shorten`
+                or the :class:`gdshortener.GDBaseException` raised for it.
+        """
+        import asyncio
+        semaphore = asyncio.Semaphore(max_concurrency)
+        return list(await asyncio.gather(*[self._bounded(semaphore, self.shorten, _shorten_arguments(item, log_stat, verify_ssl))
+                                           for item in urls]))
+
+    async def close(self):
+        """
+            Release the connections held by this shortener.
+
+            A session provided by the caller is left open, since it could be shared with other shorteners.
+        """
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _bounded(self, semaphore, function, args):
+        """
+            Await *function* once *semaphore* is acquired, returning the :class:`gdshortener.GDBaseException` it raises.
+        """
+        async with semaphore:
+            try:
+                return await function(*args)
+            except GDBaseException as ex:
+                return ex
+
+    async def _coalesce(self, key, deadline, function, *args):
+        """
+            Await ``function(*args)``, sharing the outcome of an identical call already in flight if coalescing is enabled.
+        """
+        if self._flight is None:
+            return await function(*args)
+        return await self._flight.do(key, self._deadline if deadline is None else deadline, function, *args)
+
+    async def _query(self, path, data, verify_ssl, tokens, extract, timeout=None, deadline=None):
+        """
+            Perform a request to a .gd API page, retrying it as stated by the retry policy until the deadline expires.
+        """
+        import asyncio
+        timeout = self._timeout if timeout is None else timeout
+        deadline_at = _deadline_at(self._deadline if deadline is None else deadline)
+        attempt = 0
+        while True:
+            try:
+                await self._throttle(tokens, deadline_at)
+                if self._concurrency_limiter is not None:
+                    return await self._limited(deadline_at, path, data, verify_ssl, extract, timeout)
+                return await self._request(path, data, verify_ssl, extract, _remaining_timeout(timeout, deadline_at))
+            except GDBaseException as ex:
+                delay = None if self._retry_policy is None else self._retry_policy.backoff(ex, attempt)
+                if delay is None or (deadline_at is not None and time.time() + delay >= deadline_at):
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def _request(self, path, data, verify_ssl, extract, timeout):
+        """
+            Perform a single request to a .gd API page and extract the result from its decoded response.
+        """
+        import asyncio
+        import aiohttp
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=self._limit_per_host, force_close=not self._keep_alive))
+        connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        kwargs = {} if verify_ssl else {'ssl': False}
+        try:
+            async with self._session.get("{0}/{1}".format(self.shortener_url, path), params=data,
+                                         headers={'User-Agent': self._user_agent},
+                                         timeout=aiohttp.ClientTimeout(total=None, sock_connect=connect_timeout,
+                                                                       sock_read=read_timeout),
+                                         **kwargs) as f_desc:
+                return extract(_decode_json(await f_desc.read()))
+        except (GDBaseException, asyncio.CancelledError):
+            raise
+        except aiohttp.ClientSSLError as ex:
+            raise GDSSLError(str(ex))
+        except asyncio.TimeoutError as ex:
+            raise GDTimeoutError(str(ex) or 'Timeout while waiting for .gd service')
+        except Exception as ex:
+            raise GDGenericError(str(ex))
+
+    async def _limited(self, deadline_at, path, data, verify_ssl, extract, timeout):
+        """
+            Perform a single request once the concurrency limiter allows it, reporting its outcome to the limiter.
+        """
+        limiter = self._concurrency_limiter
+        started = await limiter.acquire_async(None if deadline_at is None else max(0.0, deadline_at - time.time()))
+        error = None
+        try:
+            return await self._request(path, data, verify_ssl, extract, _remaining_timeout(timeout, deadline_at))
+        except GDBaseException as ex:
+            error = ex
+            raise
+        finally:
+            limiter.release(started, error)
+
+    async def _throttle(self, tokens, deadline_at):
+        """
+            Wait, without blocking the event loop, until the rate limiter grants *tokens*, failing at once if the wait outlasts the deadline.
+        """
+        if self._rate_limiter is not None:
+            delay = self._rate_limiter.reserve(tokens)
+            if delay > 0:
+                if deadline_at is not None and time.time() + delay >= deadline_at:
+                    # The request is not sent: its tokens must not delay the other callers of the bucket
+                    self._rate_limiter.refund(tokens)
+                    raise GDTimeoutError('The rate limit does not allow the request before the deadline')
+                import asyncio
+                try:
+                    await asyncio.sleep(delay)
+                except asyncio.CancelledError:
+                    self._rate_limiter.refund(tokens)
+                    raise
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def __init__(self, shortener_url=_IS_GD_SHORTENER_URL_, timeout=60,
+                 user_agent='Mozilla/5.0 (compatible; GD Shortener Python Module - https://github.com/torre76/gd_shortener/)',
+                 session=None, limit_per_host=10, keep_alive=True, rate_limiter=None, retry_policy=None, deadline=None,
+                 cache=None, coalesce=True, validator=None, concurrency_limiter=None):
+        """
+            Init URL Shortener class
+
+            :type shortener_url: str.
+            :param shortener_url: base is.gd - v.gd API URL to create shorten link.
+            :param timeout: Timeout in seconds used to connect and obtain shortened URL from .gd service, either a single value or a ``(connect, read)`` tuple
+            :type timeout: float or tuple.
+            :param user_agent: User Agent used when querying .gd services
+            :type user_agent: str.
+            :param session: aiohttp session used to reach .gd services. It could be shared among shorteners; if omitted a private one is created on first use
+            :type session: aiohttp.ClientSession
+            :param limit_per_host: Maximum number of connections opened to each host by the private session
+            :type limit_per_host: int.
+            :param keep_alive: If False, the private session closes every connection after its request
+            :type keep_alive: bool.
+            :param rate_limiter: Bucket that paces requests within .gd usage limits; waiting for tokens does not block the event loop
+            :type rate_limiter: :class:`gdshortener.GDRateLimiter`
+            :param retry_policy: Policy stating which errors are retried and how long to wait before each retry
+            :type retry_policy: :class:`gdshortener.GDRetryPolicy`
+            :param deadline: Seconds allowed for a whole call, retries and rate limit waits included (no limit if ``None``)
+            :type deadline: float.
+            :param cache: Cache of shortened and looked up URLs. It could be shared among shorteners
+            :type cache: :class:`gdshortener.GDMemoryCache` or :class:`gdshortener.GDSQLiteCache`
+            :param coalesce: If True, concurrent identical calls share a single request to .gd service
+            :type coalesce: bool.
+            :param validator: Validator and normalizer of URLs and custom short URLs, checked before any request (a default one if omitted)
+            :type validator: :class:`gdshortener.GDURLValidator`
+            :param concurrency_limiter: Adaptive limit of the requests in flight; waiting for it does not block the event loop
+            :type concurrency_limiter: :class:`gdshortener.GDConcurrencyLimiter`
+
+            :raises: **ImportError** if aiohttp is not installed
+        """
+        if _optional_import('aiohttp') is None:
+            raise ImportError('Async shorteners require aiohttp: install it with "pip install gdshortener[async]"')
+        self.shortener_url = shortener_url
+        self._timeout = timeout
+        self._user_agent = user_agent
+        self._owns_session = session is None
+        self._session = session
+        self._limit_per_host = limit_per_host
+        self._keep_alive = keep_alive
+        self._rate_limiter = rate_limiter
+        self._retry_policy = retry_policy
+        self._deadline = deadline
+        self._cache = cache
+        self._flight = _AsyncSingleFlight() if coalesce else None
+        self._validator = _DEFAULT_URL_VALIDATOR_ if validator is None else validator
+        self._concurrency_limiter = concurrency_limiter
+
+
+class AsyncISGDShortener(AsyncGDBaseShortener):
+    """
+        Asyncio shortener for `is.gd url shortener <http://is.gd/developers.php>`_.
+
+        :param timeout: Timeout in seconds used to connect and obtain shortened URL from .gd service, either a single value or a ``(connect, read)`` tuple
+        :type timeout: float or tuple.
+        :param user_agent: User Agent used when querying .gd services
+        :type user_agent: str.
+    """
+
+    def __init__(self, timeout=60, user_agent='Mozilla/5.0 (compatible; GD Shortener Python Module - https://github.com/torre76/gd_shortener/)',
+                 **kwargs):
+        """
+            Init URL Shortener class
+
+            :param timeout: Timeout in seconds used to connect and obtain shortened URL from .gd service, either a single value or a ``(connect, read)`` tuple
+            :type timeout: float or tuple.
+            :param user_agent: User Agent used when querying .gd services
+            :type user_agent: str.
+            :param kwargs: Further options accepted by :class:`gdshortener.AsyncGDBaseShortener`
+        """
+        AsyncGDBaseShortener.__init__(self, _IS_GD_SHORTENER_URL_, timeout, user_agent, **kwargs)
+
+
+class AsyncVGDShortener(AsyncGDBaseShortener):
+    """
+        Asyncio shortener for `v.gd url shortener <http://is.gd/developers.php>`_.
+
+        :param timeout: Timeout in seconds used to connect and obtain shortened URL from .gd service, either a single value or a ``(connect, read)`` tuple
+        :type timeout: float or tuple.
+        :param user_agent: User Agent used when querying .gd services
+        :type user_agent: str.
+    """
+
+    def __init__(self, timeout=60, user_agent='Mozilla/5.0 (compatible; GD Shortener Python Module - https://github.com/torre76/gd_shortener/)',
+                 **kwargs):
+        """
+            Init URL Shortener class
+
+            :param timeout: Timeout in seconds used to connect and obtain shortened URL from .gd service, either a single value or a ``(connect, read)`` tuple
+            :type timeout: float or tuple.
+            :param user_agent: User Agent used when querying .gd services
+            :type user_agent: str.
+            :param kwargs: Further options accepted by :class:`gdshortener.AsyncGDBaseShortener`
+        """
+        AsyncGDBaseShortener.__init__(self, _V_GD_SHORTENER_URL_, timeout, user_agent, **kwargs)
+
+
+def _read_records(stream, input_format, lookup):
+    """
+        Yield the items of an input stream for the command line tool: short urls in lookup mode,
+        ``(url, custom_url, log_stat)`` tuples otherwise.
+
+        Text inputs hold an url per line (blank lines and lines starting with ``#`` are skipped);
+        CSV inputs need a header and JSONL inputs an object per line, both with an ``url`` field
+        (``short_url`` in lookup mode) and optional ``custom_url`` and ``log_stat`` fields.
+    """
+    import csv
+    field = 'short_url' if lookup else 'url'
+    if input_format == 'csv':
+        rows = csv.DictReader(stream)
+    elif input_format == 'jsonl':
+        rows = (json.loads(line) for line in stream if line.strip())
+    else:
+        rows = ({field: line.strip()} for line in stream if line.strip() and not line.startswith('#'))
+    for row in rows:
+        if lookup:
+            yield row.get(field) or row.get('url')
+        else:
+            log_stat = row.get('log_stat')
+            if isinstance(log_stat, str):
+                log_stat = log_stat.strip().lower() in ('1', 'true', 'yes', 'y')
+            yield row.get(field), row.get('custom_url') or None, log_stat
+
+
+def _input_format(path, input_format):
+    """
+        Guess the format of an input file from its extension, unless stated.
+    """
+    if input_format is not None:
+        return input_format
+    extension = os.path.splitext(path)[1].lower()
+    return {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}.get(extension, 'text')
+
+
+def _iter_inputs(paths, input_format, lookup):
+    """
+        Chain the records of every input file (``-`` is standard input), opening each file only when it is reached.
+    """
+    for path in paths:
+        if path == '-':
+            for record in _read_records(sys.stdin, input_format or 'text', lookup):
+                yield record
+        else:
+            with open(path, newline='') as stream:
+                for record in _read_records(stream, _input_format(path, input_format), lookup):
+                    yield record
+
+
+def _output_row(record, result, lookup):
+    """
+        Build the output row of a processed record as a dict with a fixed set of keys.
+    """
+    row = collections.OrderedDict()
+    if lookup:
+        row['short_url'] = record
+        row['url'] = None if isinstance(result, GDBaseException) else result
+    else:
+        row['url'], row['custom_url'] = record[0], record[1]
+        row['short_url'], row['stats_url'] = (None, None) if isinstance(result, GDBaseException) else result
+    row['error_code'] = result.error_code if isinstance(result, GDBaseException) else None
+    row['error'] = result.error_description if isinstance(result, GDBaseException) else None
+    return row
+
+
+def _save_checkpoint(path, processed, offset=None):
+    """
+        Atomically record that the first *processed* input records are done, and that their results end at byte *offset*
+        of the output (None when the output is not a file).
+    """
+    with open(path + '.tmp', 'w') as stream:
+        stream.write(str(processed) if offset is None else '{0} {1}'.format(processed, offset))
+    os.replace(path + '.tmp', path)
+
+
+def _load_checkpoint(path):
+    """
+        Read a checkpoint written by :func:`_save_checkpoint`.
+
+        :returns: tuple -- ``(processed, offset)``, *offset* being None if the checkpoint does not record it
+    """
+    with open(path) as stream:
+        fields = stream.read().split()
+    return int(fields[0]) if fields else 0, int(fields[1]) if len(fields) > 1 else None
+
+
+def _output_offset(output):
+    """
+        Flush the results written so far and return the size of the output file (None for standard output).
+    """
+    output.flush()
+    return None if output is sys.stdout else os.fstat(output.fileno()).st_size
+
+
+def _argument_parser():
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='gdshortener',
+        description='Shorten (or lookup) URLs in bulk with is.gd - v.gd url shortener. '
+                    'Inputs are streamed and results are written as soon as they are available.')
+    parser.add_argument('inputs', nargs='*', default=['-'], metavar='INPUT',
+                        help='Text, CSV or JSONL files to read ("-" for standard input, the default)')
+    parser.add_argument('--input-format', choices=('text', 'csv', 'jsonl'),
+                        help='Format of the inputs (guessed from the file extension if omitted)')
+    parser.add_argument('-o', '--output', default='-', help='File results are written to ("-" for standard output, the default)')
+    parser.add_argument('--output-format', choices=('jsonl', 'csv'), default='jsonl', help='Format of the results')
+    parser.add_argument('--service', choices=('is.gd', 'v.gd'), default='is.gd', help='Shortener service to use')
+    parser.add_argument('--shortener-url', help='Base URL of a .gd compatible service (overrides --service)')
+    parser.add_argument('--lookup', action='store_true', help='Lookup the original URL of shortened URLs')
+    parser.add_argument('--log-stat', action='store_true', help='Request stats for records not stating their own log_stat')
+    parser.add_argument('-w', '--workers', type=int, default=10, help='Number of concurrent requests')
+    parser.add_argument('--adaptive', action='store_true',
+                        help='Adapt the concurrent requests (up to --workers) to the latency and rate limit errors of the service')
+    parser.add_argument('--rate', type=float, help='Maximum requests per second (stats enabled URLs count double)')
+    parser.add_argument('--burst', type=float, help='Requests allowed in a burst when --rate is set')
+    parser.add_argument('--retries', type=int, default=0, help='Retries on rate limit, generic and timeout errors')
+    parser.add_argument('--timeout', type=float, default=60, help='Timeout in seconds of every request')
+    parser.add_argument('--no-verify-ssl', dest='verify_ssl', action='store_false', help='Do not verify SSL certificates')
+    parser.add_argument('--checkpoint', help='File recording progress; if it exists, the run resumes from it and appends to the output '
+                                             '(dropping the results written after the checkpoint)')
+    parser.add_argument('--checkpoint-every', type=int, default=1000, help='Records processed between checkpoint updates')
+    parser.add_argument('--journal', help='Journal of shorten outcomes; if it exists, URLs it records are not shortened again')
+    return parser
+
+
+def main(argv=None):
+    """
+        Entry point of the ``gdshortener`` command line tool (also run by ``python -m gdshortener``).
+
+        :param argv: Command line arguments (defaults to ``sys.argv[1:]``)
+        :type argv: list of str.
+
+        :returns: int. -- Exit status: ``0`` if every record succeeded, ``1`` if some failed
+    """
+    import csv
+    parser = _argument_parser()
+    arguments = parser.parse_args(argv)
+    if arguments.journal is not None and arguments.lookup:
+        parser.error('--journal records shorten outcomes only, it could not be used with --lookup')
+    done, offset = 0, None
+    if arguments.checkpoint is not None and os.path.exists(arguments.checkpoint):
+        done, offset = _load_checkpoint(arguments.checkpoint)
+    shortener_url = arguments.shortener_url or (_V_GD_SHORTENER_URL_ if arguments.service == 'v.gd' else _IS_GD_SHORTENER_URL_)
+    shortener = GDBaseShortener(
+        shortener_url=shortener_url, timeout=arguments.timeout, pool_maxsize=arguments.workers,
+        rate_limiter=None if arguments.rate is None else GDRateLimiter(arguments.rate, arguments.burst),
+        retry_policy=GDRetryPolicy(max_attempts=arguments.retries + 1) if arguments.retries > 0 else None,
+        concurrency_limiter=GDConcurrencyLimiter(max(1, arguments.workers // 2), max_limit=arguments.workers)
+        if arguments.adaptive else None)
+    records = itertools.islice(_iter_inputs(arguments.inputs, arguments.input_format, arguments.lookup), done, None)
+    # Keep a copy of every pending record to pair it with its result: tee buffers at most the pending window
+    records, pending = itertools.tee(records)
+    journal = None if arguments.journal is None else GDJournal(arguments.journal)
+    if arguments.lookup:
+        results = shortener.ilookup_many(records, arguments.verify_ssl, arguments.workers)
+    else:
+        results = shortener.ishorten_many(records, arguments.log_stat, arguments.verify_ssl, arguments.workers, journal)
+    if done and offset is not None and arguments.output != '-' and os.path.exists(arguments.output):
+        # Drop the results written after the checkpoint, their records are processed again
+        os.truncate(arguments.output, offset)
+    output = sys.stdout if arguments.output == '-' else open(arguments.output, 'a' if done else 'w', newline='')
+    failed = False
+    try:
+        writer = None
+        for record, result in zip(pending, results):
+            row = _output_row(record, result, arguments.lookup)
+            failed = failed or row['error_code'] is not None
+            if arguments.output_format == 'csv':
+                if writer is None:
+                    writer = csv.DictWriter(output, fieldnames=list(row))
+                    if not done:
+                        writer.writeheader()
+                writer.writerow(row)
+            else:
+                output.write(json.dumps(row) + '\n')
+            done += 1
+            if arguments.checkpoint is not None and done % arguments.checkpoint_every == 0:
+                _save_checkpoint(arguments.checkpoint, done, _output_offset(output))
+        output.flush()
+        if arguments.checkpoint is not None:
+            _save_checkpoint(arguments.checkpoint, done, _output_offset(output))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        if journal is not None:
+            journal.close()
+        shortener.close()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -14,6 +14,9 @@ setup(
     url="https://github.com/torre76/gd_shortener",
     download_url="https://github.com/torre76/gd_shortener/tarball/1.0.1",
     py_modules = ['gdshortener'],
+    entry_points={
+        'console_scripts': ['gdshortener = gdshortener:main'],
+    },
     long_description=long_description,
     package_data={
         '': ['README.rst'],
@@ -22,11 +25,19 @@ setup(
         "Development Status :: 5 - Production/Stable",
         "Topic :: Software Development :: Libraries :: Python Modules",
         "License :: OSI Approved :: GNU Library or Lesser General Public License (LGPL)",
-        "Programming Language :: Python :: 2.6",
-        "Programming Language :: Python :: 2.7",
-        "Programming Language :: Python :: 3"
+        "Programming Language :: Python :: 3",
+        "Programming Language :: Python :: 3 :: Only",
+        "Programming Language :: Python :: 3.6",
+        "Programming Language :: Python :: 3.7",
+        "Programming Language :: Python :: 3.8"
     ],
+    python_requires=">=3.6",
     install_requires=[
         "requests >= 2.21.0"
-    ]
+    ],
+    extras_require={
+        "async": ["aiohttp >= 3.0"],
+        "speedups": ["orjson >= 3.0"],
+        "opentelemetry": ["opentelemetry-api >= 1.0"]
+    }
 )
@@ -1,8 +1,23 @@
 import unittest
 import logging
+import asyncio
+import csv
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 from logging.config import dictConfig
 
 import gdshortener
+from tests.stub_server import StubGDServer
 
 
 class GDShortenerTest(unittest.TestCase):
@@ -59,7 +74,7 @@ class GDShortenerTest(unittest.TestCase):
         self._logger.info("Url obtained: [{0}]".format(shortened_url))
 
     def testShortenWithCustomUrl(self):
-        self.assertRaises(gdshortener.GDGenericError, self._tested.shorten,
+        self.assertRaises(gdshortener.GDShortURLError, self._tested.shorten,
                           "http://maps.google.co.uk/maps?f=q&source=s_q&hl=en&geocode=&q=louth&sll=53.800651,-4.064941&sspn=33.219383,38.803711&ie=UTF8&hq=&hnear=Louth,+United+Kingdom&ll=53.370272,-0.004034&spn=0.064883,0.075788&z=14", 'GooglE')
 
     def testShortenWithLog(self):
@@ -89,7 +104,7 @@ class GDShortenerTest(unittest.TestCase):
         self._logger.info("Url obtained: [{0}]".format(shortened_url))
 
     def testVShortenWithCustomUrl(self):
-        self.assertRaises(gdshortener.GDGenericError, self._tested.shorten,
+        self.assertRaises(gdshortener.GDShortURLError, self._tested.shorten,
                           "http://maps.google.co.uk/maps?f=q&source=s_q&hl=en&geocode=&q=louth&sll=53.800651,-4.064941&sspn=33.219383,38.803711&ie=UTF8&hq=&hnear=Louth,+United+Kingdom&ll=53.370272,-0.004034&spn=0.064883,0.075788&z=14", 'GooglE')
 
     def testVShortenWithLog(self):
@@ -119,6 +134,1651 @@ class GDShortenerTest(unittest.TestCase):
         self._logger.info("Url obtained: [{0}]".format(shortened_url))
 
 
+class GDSessionTest(unittest.TestCase):
+
+    def setUp(self):
+        self._server = StubGDServer().start()
+
+    def tearDown(self):
+        self._server.stop()
+
+    def testConnectionReuse(self):
+        with gdshortener.GDBaseShortener(shortener_url=self._server.url) as shortener:
+            for index in range(5):
+                shortened_url, stat_url = shortener.shorten(url="http://www.example.com/{0}".format(index))
+                self.assertEqual(shortener.lookup(shortened_url), "http://www.example.com/{0}".format(index))
+        self.assertEqual(self._server.counters['requests'], 10)
+        self.assertEqual(self._server.counters['connections'], 1)
+
+    def testNoKeepAlive(self):
+        with gdshortener.GDBaseShortener(shortener_url=self._server.url, keep_alive=False) as shortener:
+            for index in range(3):
+                shortener.shorten(url="http://www.example.com/{0}".format(index))
+        self.assertEqual(self._server.counters['connections'], 3)
+
+    def testSharedSessionAcrossThreads(self):
+        session = gdshortener.GDSession(pool_maxsize=4)
+        first = gdshortener.GDBaseShortener(shortener_url=self._server.url, session=session)
+        second = gdshortener.GDBaseShortener(shortener_url=self._server.url, session=session)
+        errors = []
+
+        def worker(shortener, offset):
+            try:
+                for index in range(20):
+                    shortener.shorten(url="http://www.example.com/{0}".format(offset + index))
+            except Exception as ex:
+                errors.append(ex)
+
+        threads = [threading.Thread(target=worker, args=(shortener, offset))
+                   for offset, shortener in enumerate((first, second, first, second))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # The sessions of exited threads are forgotten
+        self.assertEqual(len(session._sessions), 0)
+        first.close()
+        # Closing a shortener must not close a shared session
+        second.shorten(url="http://www.example.com/after-close")
+        session.close()
+        self.assertEqual(errors, [])
+        self.assertLessEqual(self._server.counters['connections'], 4)
+
+
+class GDTransportTest(unittest.TestCase):
+
+    _transports = (gdshortener.GDSession, gdshortener.GDUrllib3Transport, gdshortener.GDHTTPClientTransport)
+
+    def setUp(self):
+        self._server = StubGDServer().start()
+
+    def tearDown(self):
+        self._server.stop()
+
+    def testSameResultsOverEveryTransport(self):
+        for transport_class in self._transports:
+            with transport_class() as transport:
+                shortener = gdshortener.GDBaseShortener(shortener_url=self._server.url, session=transport)
+                shortened_url, stat_url = shortener.shorten(url="http://www.example.com/?a=1&b=2", log_stat=True)
+                self.assertTrue(stat_url.endswith(gdshortener._short_code(shortened_url)))
+                self.assertEqual(shortener.lookup(shortened_url), "http://www.example.com/?a=1&b=2")
+                with self.assertRaises(gdshortener.GDShortURLError):
+                    shortener.lookup("{0}/missing".format(self._server.url))
+
+    def testConnectionReuse(self):
+        for transport_class in self._transports:
+            self._server.counters.clear()
+            with transport_class() as transport:
+                shortener = gdshortener.GDBaseShortener(shortener_url=self._server.url, session=transport)
+                for index in range(5):
+                    shortener.shorten(url="http://www.example.com/{0}".format(index))
+            self.assertEqual(self._server.counters["connections"], 1, transport_class.__name__)
+
+    def testHTTPClientConnectionsOfExitedThreadsAreClosed(self):
+        with gdshortener.GDHTTPClientTransport() as transport:
+            shortener = gdshortener.GDBaseShortener(shortener_url=self._server.url, session=transport)
+            connections = []
+
+            def worker(index):
+                shortener.shorten(url="http://www.example.com/{0}".format(index))
+                connections.extend(transport._thread_connections().values())
+
+            for batch in range(5):
+                threads = [threading.Thread(target=worker, args=(batch * 10 + index,)) for index in range(10)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                self.assertLessEqual(len(transport._pools), 1)
+            self.assertEqual(len(connections), 50)
+            self.assertEqual([connection for connection in connections if connection.sock is not None], [])
+
+    def testErrorMapping(self):
+        # A TLS handshake with a plain HTTP server fails on every transport
+        https_url = self._server.url.replace("http://", "https://")
+        with StubGDServer(latency=1) as slow_server:
+            for transport_class in self._transports:
+                with transport_class() as transport:
+                    shortener = gdshortener.GDBaseShortener(shortener_url=https_url, session=transport)
+                    with self.assertRaises(gdshortener.GDSSLError):
+                        shortener.shorten(url="http://www.example.com/")
+                    shortener = gdshortener.GDBaseShortener(shortener_url=slow_server.url, session=transport, timeout=0.2)
+                    with self.assertRaises(gdshortener.GDTimeoutError):
+                        shortener.shorten(url="http://www.example.com/")
+                    shortener = gdshortener.GDBaseShortener(shortener_url="http://127.0.0.1:1", session=transport)
+                    with self.assertRaises(gdshortener.GDGenericError):
+                        shortener.shorten(url="http://www.example.com/")
+
+    def testFakeTransport(self):
+        transport = gdshortener.GDFakeTransport()
+        shortener = gdshortener.GDBaseShortener(shortener_url="https://is.gd", session=transport)
+        self.assertEqual(shortener.shorten("http://www.example.com/0"), ("https://is.gd/1", None))
+        self.assertEqual(shortener.shorten("http://www.example.com/1", log_stat=True),
+                         ("https://is.gd/2", "https://is.gd/stats.php?url=2"))
+        self.assertEqual(shortener.shorten("http://www.example.com/0")[0], "https://is.gd/1")
+        self.assertEqual(shortener.shorten("http://www.example.com/2", custom_url="custom")[0], "https://is.gd/custom")
+        self.assertEqual(shortener.lookup("https://is.gd/2"), "http://www.example.com/1")
+        with self.assertRaises(gdshortener.GDShortURLError):
+            shortener.shorten("http://www.example.com/3", custom_url="custom")
+        transport.inject(3)
+        with self.assertRaises(gdshortener.GDRateLimitError):
+            shortener.lookup("https://is.gd/1")
+        self.assertEqual(transport.requests, 7)
+
+    def testFakeCodesSkipCustomURLs(self):
+        transport = gdshortener.GDFakeTransport()
+        shortener = gdshortener.GDBaseShortener(shortener_url="https://is.gd", session=transport)
+        shortener.shorten("http://www.example.com/custom", custom_url="10000")
+        # The next generated code would be 10000
+        transport._counter = 62 ** 4 - 1
+        self.assertEqual(shortener.shorten("http://www.example.com/0")[0], "https://is.gd/10001")
+        self.assertEqual(shortener.lookup("https://is.gd/10000"), "http://www.example.com/custom")
+
+
+class GDCompositeShortenerTest(unittest.TestCase):
+
+    def setUp(self):
+        self._is_gd = gdshortener.GDFakeTransport()
+        self._v_gd = gdshortener.GDFakeTransport()
+        self._backends = [gdshortener.GDBaseShortener(shortener_url="https://is.gd", session=self._is_gd),
+                          gdshortener.GDBaseShortener(shortener_url="https://v.gd", session=self._v_gd)]
+
+    def testFailover(self):
+        self._is_gd.inject(3, 100)
+        composite = gdshortener.GDCompositeShortener(self._backends, failure_threshold=2, reset_timeout=60)
+        results = [composite.shorten("http://www.example.com/{0}".format(index)) for index in range(10)]
+        self.assertTrue(all(short_url.startswith("https://v.gd/") for short_url, stat_url in results))
+        health = composite.health()
+        self.assertEqual(health[0]["state"], gdshortener.GDCircuitBreaker.OPEN)
+        self.assertEqual(health[0]["failures"], 2)
+        self.assertEqual(health[1]["calls"], 10)
+        self.assertEqual(composite.failovers, 2)
+        self.assertEqual(self._is_gd.requests, 2)
+
+        self._v_gd.inject(4, 100)
+        with self.assertRaises(gdshortener.GDGenericError):
+            composite.shorten("http://www.example.com/failed")
+
+    def testErrorsOnURLsAreNotFailedOver(self):
+        composite = gdshortener.GDCompositeShortener(self._backends, failure_threshold=1)
+        self._backends[0].shorten("http://www.example.com/0", custom_url="custom")
+        with self.assertRaises(gdshortener.GDShortURLError):
+            composite.shorten("http://www.example.com/1", custom_url="custom")
+        self.assertEqual(composite.failovers, 0)
+        self.assertEqual(self._v_gd.requests, 0)
+        self.assertEqual(composite.health()[0]["state"], gdshortener.GDCircuitBreaker.CLOSED)
+
+    def testLookupRoutedByHost(self):
+        composite = gdshortener.GDCompositeShortener(self._backends)
+        short_urls = [short_url for short_url, stat_url in composite.shorten_many(
+            ["http://www.example.com/{0}".format(index) for index in range(4)], max_workers=2)]
+        self.assertEqual(sorted(short_url.split("/")[2] for short_url in short_urls), ["is.gd", "is.gd", "v.gd", "v.gd"])
+        self.assertEqual(composite.lookup_many(short_urls), ["http://www.example.com/{0}".format(index) for index in range(4)])
+        with self.assertRaises(gdshortener.GDMalformedURLError):
+            composite.lookup("https://bit.ly/abc")
+
+    def testWeightedRouting(self):
+        composite = gdshortener.GDCompositeShortener(self._backends, weights=[3, 1], routing="weighted")
+        for index in range(8):
+            composite.shorten("http://www.example.com/{0}".format(index))
+        self.assertEqual([backend["calls"] for backend in composite.health()], [6, 2])
+
+    def testDeadlineDoesNotStrandHalfOpenBreaker(self):
+
+        class SlowTransport(gdshortener.GDFakeTransport):
+            def fetch(self, url, params, headers, verify_ssl=True, timeout=None):
+                time.sleep(0.1)
+                return gdshortener.GDFakeTransport.fetch(self, url, params, headers, verify_ssl, timeout)
+
+        slow = SlowTransport()
+        backends = [gdshortener.GDBaseShortener(shortener_url="https://is.gd", session=slow), self._backends[1]]
+        composite = gdshortener.GDCompositeShortener(backends, failure_threshold=1, reset_timeout=0.01)
+        v_gd = composite._backends[1].breaker
+        v_gd.record(gdshortener.GDTimeoutError())
+        time.sleep(0.02)
+        slow.inject(3)
+        with self.assertRaises(gdshortener.GDBaseException):
+            composite.shorten("http://www.example.com/", deadline=0.05)
+        # The deadline expired before v.gd was tried: its breaker is still open and due for a trial call
+        self.assertEqual(v_gd.state, v_gd.OPEN)
+        self.assertTrue(v_gd.allow())
+
+    def testCircuitBreaker(self):
+        breaker = gdshortener.GDCircuitBreaker(failure_threshold=2, reset_timeout=0.1)
+        breaker.record(gdshortener.GDRateLimitError())
+        breaker.record(gdshortener.GDMalformedURLError())
+        breaker.record(gdshortener.GDGenericError())
+        self.assertEqual(breaker.state, breaker.CLOSED)
+        breaker.record(gdshortener.GDTimeoutError())
+        self.assertEqual(breaker.state, breaker.OPEN)
+        self.assertFalse(breaker.allow())
+        time.sleep(0.15)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record(gdshortener.GDGenericError())
+        self.assertEqual((breaker.state, breaker.opened), (breaker.OPEN, 2))
+        time.sleep(0.15)
+        self.assertTrue(breaker.allow())
+        breaker.record()
+        self.assertEqual(breaker.state, breaker.CLOSED)
+
+
+class GDInstrumentationTest(unittest.TestCase):
+
+    def setUp(self):
+        self._server = StubGDServer().start()
+
+    def tearDown(self):
+        self._server.stop()
+
+    def testTimingsAndHooks(self):
+        for transport_class in (gdshortener.GDSession, gdshortener.GDUrllib3Transport, gdshortener.GDHTTPClientTransport):
+            sink = gdshortener.GDMemorySink()
+            requests = []
+            instrumentation = gdshortener.GDInstrumentation(
+                [sink], before_request=lambda record, url, params: requests.append((record.operation, url)),
+                after_request=lambda record, url, error: requests.append(error))
+            with transport_class() as transport:
+                shortener = gdshortener.GDBaseShortener(shortener_url=self._server.url, session=transport,
+                                                        instrumentation=instrumentation)
+                short_url, stat_url = shortener.shorten("http://www.example.com/")
+                shortener.lookup(short_url)
+            first, second = sink.records
+            self.assertEqual((first.operation, second.operation), ("shorten", "lookup"))
+            self.assertGreater(first.connect, 0, transport_class.__name__)
+            self.assertEqual(second.connect, 0, transport_class.__name__)
+            for record in (first, second):
+                self.assertEqual((record.requests, record.outcome), (1, "ok"))
+                self.assertGreater(record.wait, 0)
+                self.assertGreater(record.decode, 0)
+                self.assertGreaterEqual(record.total, record.connect + record.wait + record.decode)
+            self.assertEqual(requests, [("shorten", self._server.url + "/create.php"), None,
+                                        ("lookup", self._server.url + "/forward.php"), None])
+
+    def testCounters(self):
+        sink = gdshortener.GDMemorySink()
+        transport = gdshortener.GDFakeTransport()
+        shortener = gdshortener.GDBaseShortener(
+            shortener_url="https://is.gd", session=transport, cache=gdshortener.GDMemoryCache(),
+            retry_policy=gdshortener.GDRetryPolicy(base_delay=0.001), instrumentation=gdshortener.GDInstrumentation([sink]))
+        transport.inject(3, 2)
+        shortener.shorten("http://www.example.com/")
+        shortener.shorten("http://www.example.com/")
+        with self.assertRaises(gdshortener.GDMalformedURLError):
+            shortener.shorten("")
+        transport.inject(2)
+        with self.assertRaises(gdshortener.GDShortURLError):
+            shortener.lookup("https://is.gd/missing")
+        snapshot = sink.snapshot()
+        self.assertEqual(snapshot["calls"], {"shorten": 3, "lookup": 1})
+        self.assertEqual(snapshot["errors"], {"GDMalformedURLError": 1, "GDShortURLError": 1})
+        self.assertEqual((snapshot["cache_hits"], snapshot["requests"], snapshot["retries"]), (1, 4, 2))
+
+    def testPrometheusAndLogging(self):
+        prometheus = gdshortener.GDPrometheusSink(buckets=(0.5, 60))
+        shortener = gdshortener.GDBaseShortener(
+            shortener_url="https://is.gd", session=gdshortener.GDFakeTransport(),
+            instrumentation=gdshortener.GDInstrumentation([prometheus, gdshortener.GDLoggingSink()]))
+        with self.assertLogs("gdshortener", level="DEBUG") as logs:
+            shortener.shorten("http://www.example.com/")
+            with self.assertRaises(gdshortener.GDShortURLError):
+                shortener.lookup("https://is.gd/missing")
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(logs.records[1].levelname, "WARNING")
+        text = prometheus.render()
+        self.assertIn('gdshortener_calls_total{operation="shorten",service="is.gd",outcome="ok"} 1', text)
+        self.assertIn('gdshortener_calls_total{operation="lookup",service="is.gd",outcome="GDShortURLError"} 1', text)
+        self.assertIn('gdshortener_requests_total{operation="shorten",service="is.gd"} 1', text)
+        self.assertIn('gdshortener_call_duration_seconds_bucket{operation="shorten",service="is.gd",le="60.0"} 1', text)
+        self.assertIn('gdshortener_call_duration_seconds_count{operation="lookup",service="is.gd"} 1', text)
+        self.assertIn("# TYPE gdshortener_call_duration_seconds histogram", text)
+
+    @unittest.skipIf(gdshortener._load_dependency("otel_trace") is not None, "opentelemetry is installed")
+    def testOpenTelemetryIsOptional(self):
+        with self.assertRaises(ImportError):
+            gdshortener.GDOpenTelemetrySink()
+
+
+class GDURLValidatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self._transport = gdshortener.GDFakeTransport()
+        self._shortener = gdshortener.GDBaseShortener(shortener_url="https://is.gd", session=self._transport,
+                                                      cache=gdshortener.GDMemoryCache())
+
+    def testNormalize(self):
+        validator = gdshortener.GDURLValidator()
+        for url, expected in (("  www.example.com ", "http://www.example.com/"),
+                              ("HTTPS://WWW.Example.COM:443", "https://www.example.com/"),
+                              ("http://Example.com:8080/A%2dB%2fc?q=a b#", "http://example.com:8080/A-B%2Fc?q=a%20b"),
+                              ("ftp://user@[::1]:21/file#top", "ftp://user@[::1]/file#top"),
+                              ("http://example.com/?", "http://example.com/"),
+                              ("example.com/?u=http://x.com", "http://example.com/?u=http://x.com")):
+            self.assertEqual(validator.normalize(url), expected)
+        self.assertEqual(gdshortener.GDURLValidator(normalize=False).normalize(" HTTP://Example.com:80"), "HTTP://Example.com:80")
+
+    def testInvalidURL(self):
+        validator = gdshortener.GDURLValidator(max_length=40)
+        for url in (None, 42, "  ", "javascript://alert(1)", "http:///path", "http://example.com:http/",
+                    "http://exa\nmple.com/", "http://example.com/" + "a" * 30):
+            with self.assertRaises(gdshortener.GDMalformedURLError) as context:
+                validator.normalize(url)
+            self.assertEqual(context.exception.error_code, 1)
+        with self.assertRaises(gdshortener.GDMalformedURLError):
+            self._shortener.shorten("mailto://someone")
+        self.assertEqual(self._transport.requests, 0)
+
+    def testCustomURL(self):
+        validator = gdshortener.GDURLValidator()
+        self.assertEqual(validator.check_custom_url("my_alias_01"), "my_alias_01")
+        self.assertIsNone(validator.check_custom_url(" "))
+        self.assertIsNone(validator.check_custom_url(None))
+        for custom_url in ("abcd", "a" * 31, "with-dash", "caf\u00e9s", "alias\n"):
+            self.assertFalse(validator.is_valid_custom_url(custom_url))
+            with self.assertRaises(gdshortener.GDShortURLError):
+                self._shortener.shorten("http://www.example.com/", custom_url)
+        self.assertEqual(self._transport.requests, 0)
+
+    def testEquivalentURLsShareCache(self):
+        short_url, stat_url = self._shortener.shorten("http://www.example.com/")
+        self.assertEqual(self._shortener.shorten("HTTP://WWW.EXAMPLE.COM:80"), (short_url, stat_url))
+        self.assertEqual(self._shortener.shorten("www.example.com"), (short_url, stat_url))
+        self.assertEqual(self._transport.requests, 1)
+
+    def testNormalizeMany(self):
+        results = list(gdshortener.GDURLValidator().normalize_many(["example.com", "", "HTTP://A.B"] * 1000))
+        self.assertEqual(results[:3:2], ["http://example.com/", "http://a.b/"])
+        self.assertEqual(sum(isinstance(result, gdshortener.GDMalformedURLError) for result in results), 1000)
+
+
+class _ThreadNamingShortener(object):
+    """
+        Shortener of worker processes that answers with the name of the thread that served the call.
+    """
+
+    def shorten(self, url, custom_url=None, log_stat=False, verify_ssl=True):
+        return url, threading.current_thread().name
+
+
+class GDProcessPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self._server = StubGDServer().start()
+        self._directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self._server.stop()
+        shutil.rmtree(self._directory)
+
+    def testOrderedResultsWithSharedState(self):
+        cache = gdshortener.GDSQLiteCache(os.path.join(self._directory, "cache.sqlite"))
+        rate_limiter = gdshortener.GDFileRateLimiter(os.path.join(self._directory, "bucket"), rate=1000, capacity=1000)
+        urls = ["http://www.example.com/{0}".format(index) for index in range(40)]
+        urls[7] = ("http://www.example.com/7", "abc")
+        with gdshortener.GDProcessPool(gdshortener.GDBaseShortener,
+                                       {"shortener_url": self._server.url, "cache": cache, "rate_limiter": rate_limiter},
+                                       processes=2, chunk_size=3, max_workers=2, max_pending_chunks=2) as pool:
+            results = list(pool.ishorten_many(urls))
+            self.assertIsInstance(results[7], gdshortener.GDShortURLError)
+            short_urls = [result[0] for index, result in enumerate(results) if index != 7]
+            self.assertEqual(pool.lookup_many(short_urls), [url for index, url in enumerate(urls) if index != 7])
+            requests = self._server.counters["requests"]
+            self.assertEqual([result[0] for result in pool.shorten_many(urls[:7])], short_urls[:7])
+        self.assertEqual(self._server.counters["requests"], requests)
+        self.assertEqual(len(cache), 78)
+        self.assertLess(rate_limiter.reserve(1000), 1)
+        self.assertGreater(rate_limiter.reserve(), 0)
+
+    def testThreadsServeEveryChunk(self):
+        urls = ["http://www.example.com/{0}".format(index) for index in range(200)]
+        with gdshortener.GDProcessPool(_ThreadNamingShortener, processes=1, chunk_size=10, max_workers=3) as pool:
+            threads = set(thread for url, thread in pool.shorten_many(urls))
+        self.assertLessEqual(len(threads), 3)
+
+    def testPickledSharedState(self):
+        path = os.path.join(self._directory, "bucket")
+        rate_limiter = pickle.loads(pickle.dumps(gdshortener.GDFileRateLimiter(path, rate=10, capacity=2)))
+        self.assertEqual((rate_limiter.path, rate_limiter.rate, rate_limiter.capacity), (path, 10, 2))
+        cache = gdshortener.GDSQLiteCache(os.path.join(self._directory, "cache.sqlite"))
+        cache.set_lookup(("https://is.gd", "abc"), "http://www.example.com/")
+        self.assertEqual(pickle.loads(pickle.dumps(cache)).get_lookup(("https://is.gd", "abc")), "http://www.example.com/")
+
+    def testUnsharedState(self):
+        with self.assertRaises(ValueError):
+            gdshortener.GDProcessPool(shortener_kwargs={"cache": gdshortener.GDMemoryCache()})
+        with self.assertRaises(ValueError):
+            gdshortener.GDProcessPool(shortener_kwargs={"rate_limiter": gdshortener.GDRateLimiter(10)})
+        with self.assertRaises(ValueError):
+            gdshortener.GDProcessPool(processes=1, chunk_size=0)
+
+
+class GDStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self._transport = gdshortener.GDFakeTransport()
+        self._shortener = gdshortener.GDBaseShortener(shortener_url="https://is.gd", session=self._transport)
+
+    def testStatsAndRevalidation(self):
+        short_url, stats_url = self._shortener.shorten("http://www.example.com/?a=1&b=2", log_stat=True)
+        stats = self._shortener.stats(short_url)
+        self.assertEqual((stats.short_url, stats.url, stats.clicks), (short_url, "http://www.example.com/?a=1&b=2", 0))
+        self.assertEqual(stats.short_code, short_url.rpartition("/")[2])
+        # Unchanged pages are revalidated, changed ones are downloaded again
+        self.assertEqual(self._shortener.stats(stats.short_code).clicks, 0)
+        self._shortener.lookup(short_url)
+        self.assertEqual(self._shortener.stats(short_url).clicks, 1)
+        requests = self._transport.requests
+        self.assertEqual(self._shortener.stats(short_url, max_age=60).clicks, 1)
+        self.assertEqual(self._transport.requests, requests)
+        self.assertEqual(pickle.loads(pickle.dumps(stats)), stats)
+
+    def testStatsMany(self):
+        short_urls = [self._shortener.shorten("http://www.example.com/{0}".format(index), log_stat=True)[0]
+                      for index in range(20)]
+        short_urls[3] = self._shortener.shorten("http://www.example.com/nostats")[0]
+        results = self._shortener.stats_many(short_urls + [""], max_workers=4)
+        self.assertIsInstance(results[3], gdshortener.GDShortURLError)
+        self.assertIsInstance(results[20], gdshortener.GDMalformedURLError)
+        self.assertEqual([result.url for index, result in enumerate(results[:20]) if index != 3],
+                         ["http://www.example.com/{0}".format(index) for index in range(20) if index != 3])
+
+    def testParsePage(self):
+        page = b'<p>Original URL: <a class="x" href="http://a.b/?c=1&amp;d=2">link</a></p><td>Clicks</td><td>1,234</td>'
+        stats = gdshortener._stats_result((200, {"etag": '"x"'}, page), "https://is.gd", "abc", None)
+        self.assertEqual(stats.as_tuple()[:3], ("https://is.gd/abc", "http://a.b/?c=1&d=2", 1234))
+        self.assertEqual(stats.etag, '"x"')
+        with self.assertRaises(gdshortener.GDGenericError):
+            self._shortener._request("stats.php", {}, True, lambda response: gdshortener._stats_result(
+                (200, {}, b"<html></html>"), "https://is.gd", "abc", None), None, raw=True)
+
+    def testSQLiteCache(self):
+        directory = tempfile.mkdtemp()
+        try:
+            cache = gdshortener.GDSQLiteCache(os.path.join(directory, "cache.sqlite"))
+            shortener = gdshortener.GDBaseShortener(shortener_url="https://is.gd", session=self._transport, cache=cache)
+            short_url = shortener.shorten("http://www.example.com/", log_stat=True)[0]
+            stats = shortener.stats(short_url)
+            self.assertEqual(cache.get_stats(("https://is.gd", stats.short_code)), stats)
+            requests = self._transport.requests
+            shortener.stats(short_url, max_age=60)
+            self.assertEqual(self._transport.requests, requests)
+            cache.close()
+        finally:
+            shutil.rmtree(directory)
+
+
+class GDJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.mkdtemp()
+        self._path = os.path.join(self._directory, "journal")
+        self._transport = gdshortener.GDFakeTransport()
+        self._shortener = gdshortener.GDBaseShortener(shortener_url="https://is.gd", session=self._transport)
+
+    def tearDown(self):
+        shutil.rmtree(self._directory)
+
+    def testRecordAndReopen(self):
+        with gdshortener.GDJournal(self._path, sync_every=2) as journal:
+            journal.record("http://www.example.com/", None, True, ("https://is.gd/abc", "https://is.gd/stats.php?url=abc"))
+            journal.record("http://www.example.com/\t\nx", "alias", False, gdshortener.GDShortURLError("taken\tnow"))
+            journal.record("http://www.example.com/", "other", False, gdshortener.GDRateLimitError("slow down"))
+            self.assertEqual(journal.pending, 1)
+        # A line left incomplete by a crash is dropped
+        with open(self._path, "ab") as stream:
+            stream.write(b"https://is.gd/partial")
+        with gdshortener.GDJournal(self._path) as journal:
+            self.assertEqual(len(journal), 3)
+            self.assertEqual(journal.get("http://www.example.com/", log_stat=True),
+                             ("https://is.gd/abc", "https://is.gd/stats.php?url=abc"))
+            self.assertIsNone(journal.get("http://www.example.com/"))
+            error = journal.replay("http://www.example.com/\t\nx", "alias")
+            self.assertIsInstance(error, gdshortener.GDShortURLError)
+            self.assertEqual(error.error_description, "taken\tnow")
+            # Transient failures are retried
+            self.assertIsInstance(journal.get("http://www.example.com/", "other"), gdshortener.GDRateLimitError)
+            self.assertIsNone(journal.replay("http://www.example.com/", "other"))
+            with self.assertRaises(ValueError):
+                gdshortener.GDJournal(self._path)
+        with open(self._path, "rb") as stream:
+            self.assertTrue(stream.read().endswith(b"\n"))
+
+    def testResumeBulkShorten(self):
+        urls = ["http://www.example.com/{0}".format(index) for index in range(10)] + [("http://www.example.com/", "abc")]
+        with gdshortener.GDJournal(self._path) as journal:
+            first = self._shortener.shorten_many(urls[:6], journal=journal)
+        self._transport.inject(3)
+        with gdshortener.GDJournal(self._path) as journal:
+            results = self._shortener.shorten_many(urls, max_workers=1, journal=journal)
+            self.assertEqual(results[:6], first)
+            self.assertIsInstance(results[6], gdshortener.GDRateLimitError)
+            self.assertIsInstance(results[10], gdshortener.GDShortURLError)
+        self.assertEqual(self._transport.requests, 10)
+        with gdshortener.GDJournal(self._path) as journal:
+            results = self._shortener.shorten_many(urls, journal=journal)
+        self.assertIsInstance(results[6], gdshortener.GDShortenResult)
+        self.assertIsInstance(results[10], gdshortener.GDShortURLError)
+        self.assertEqual(self._transport.requests, 11)
+
+
+class GDLazyImportTest(unittest.TestCase):
+
+    def _loaded(self, code):
+        from benchmarks.import_benchmarks import HEAVY_MODULES
+        code += "; import sys; print(' '.join(sorted(sys.modules)))"
+        output = subprocess.check_output([sys.executable, "-c", code], cwd=os.path.dirname(os.path.dirname(__file__)) or ".")
+        return sorted(name for name in HEAVY_MODULES if name in output.decode("utf-8").split())
+
+    def testImportIsLight(self):
+        self.assertEqual(self._loaded("import gdshortener"), [])
+
+    def testOfflineUseIsLight(self):
+        self.assertEqual(self._loaded(
+            "import gdshortener; gdshortener.GDURLValidator().normalize('www.example.com'); "
+            "str(gdshortener.GDShortURLError('taken')); gdshortener.ISGDShortener(cache=gdshortener.GDMemoryCache())"), [])
+
+    def testHeavyModulesLoadOnFirstUse(self):
+        loaded = self._loaded("import gdshortener; gdshortener.GDSession()._thread_session()")
+        self.assertTrue(set(["requests", "urllib3"]).issubset(loaded))
+        self.assertIsNotNone(gdshortener._load_dependency("requests").Session)
+        if sys.version_info >= (3, 7):
+            self.assertIs(gdshortener.requests, gdshortener._load_dependency("requests"))
+        with self.assertRaises(AttributeError):
+            gdshortener.missing_attribute
+
+    def testLoadWithoutModuleGetattr(self):
+        # Python 3.6 has no module __getattr__: shortening must not depend on it
+        module_getattr = vars(gdshortener).pop("__getattr__")
+        orjson = vars(gdshortener).pop("orjson", None)
+        try:
+            self.assertEqual(gdshortener._decode_json(b'{"shorturl": "https://is.gd/abc"}'),
+                             {"shorturl": "https://is.gd/abc"})
+            self.assertIn("orjson", vars(gdshortener))
+        finally:
+            gdshortener.__getattr__ = module_getattr
+            gdshortener.orjson = orjson
+
+
+class GDAliasAllocatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self._transport = gdshortener.GDFakeTransport()
+        self._shortener = gdshortener.GDBaseShortener(shortener_url="https://is.gd", session=self._transport)
+        for alias in ("promo", "promo_1", "promo_2"):
+            self._shortener.shorten("http://www.example.org/" + alias, alias)
+        self._transport.requests = 0
+
+    def testAllocateSkipsKnownAliases(self):
+        allocator = gdshortener.GDAliasAllocator(self._shortener)
+        self.assertEqual(allocator.allocate("http://www.example.com/1", "promo"), ("https://is.gd/promo_3", None))
+        self.assertEqual((allocator.requests, allocator.collisions), (4, 3))
+        # Known taken aliases are skipped, owned ones are given back without any request
+        self.assertEqual(allocator.allocate("http://www.example.com/2", "promo"), ("https://is.gd/promo_4", None))
+        self.assertEqual(allocator.allocate("http://www.example.com/1", "promo", log_stat=True),
+                         ("https://is.gd/promo_3", "https://is.gd/stats.php?url=promo_3"))
+        self.assertEqual((allocator.allocations, allocator.requests, allocator.collisions), (3, 5, 3))
+        self.assertAlmostEqual(allocator.collision_rate, 0.6)
+        self.assertGreater(allocator.throughput, 0)
+        self.assertEqual(self._transport.requests, 5)
+
+    def testGiveUp(self):
+        allocator = gdshortener.GDAliasAllocator(self._shortener, max_attempts=2)
+        with self.assertRaises(gdshortener.GDShortURLError):
+            allocator.allocate("http://www.example.com/", "promo")
+        self.assertEqual(self._transport.requests, 2)
+
+    def testTemplateAndStem(self):
+        allocator = gdshortener.GDAliasAllocator(self._shortener, template="{stem}{random}")
+        short_url = allocator.allocate("http://www.example.com/", "promo")[0]
+        self.assertRegex(short_url, r"^https://is.gd/promo[a-z0-9]{4}$")
+        self.assertEqual(allocator.allocate("http://www.example.com/x", "a long stem, with (many) symbols!")[0],
+                         "https://is.gd/a_long_stem_with_many_symbols_")
+        self.assertEqual(len(gdshortener.GDAliasAllocator(self._shortener).allocate(
+            "http://www.example.com/y", "x" * 40)[0].rpartition("/")[2]), 30)
+
+    def testAllocateManyIsUnique(self):
+        allocator = gdshortener.GDAliasAllocator(self._shortener)
+        results = allocator.allocate_many([("http://www.example.com/{0}".format(index), "promo") for index in range(50)],
+                                          max_workers=8)
+        self.assertEqual(len(set(result[0] for result in results)), 50)
+        self.assertEqual(allocator.collisions, 3)
+
+    def testIndexPersistence(self):
+        index = gdshortener.GDAliasIndex(capacity=1000, error_rate=0.01)
+        for number in range(1000):
+            index.mark_taken("taken_{0}".format(number))
+        index.mark_owned("mine_1", "http://www.example.com/")
+        unusual_url = u"http://www.example.com/\x85\u2028\x0b\x1c\r"
+        index.mark_owned("mine_2", unusual_url, u"stem\u2029")
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "aliases")
+            index.save(path)
+            loaded = gdshortener.GDAliasIndex.load(path)
+            with open(path, "wb") as stream:
+                stream.write(b"garbage")
+            with self.assertRaises(ValueError):
+                gdshortener.GDAliasIndex.load(path)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual((loaded.taken, len(loaded), loaded.owner("mine_1")), (1000, 2, "http://www.example.com/"))
+        self.assertEqual(loaded.owner("mine_2"), unusual_url)
+        self.assertEqual(loaded.owned_alias(unusual_url, u"stem\u2029"), "mine_2")
+        self.assertTrue(all(loaded.is_taken("taken_{0}".format(number)) for number in range(1000)))
+        false_positives = sum(loaded.is_taken("free_{0}".format(number)) for number in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class GDLookupResolverTest(unittest.TestCase):
+
+    def setUp(self):
+        self._is_gd = gdshortener.GDFakeTransport()
+        self._v_gd = gdshortener.GDFakeTransport()
+        self._shorteners = [gdshortener.GDBaseShortener(shortener_url="http://is.gd", session=self._is_gd),
+                            gdshortener.GDBaseShortener(shortener_url="http://v.gd", session=self._v_gd)]
+        self._is_url = self._shorteners[0].shorten("http://www.example.com/is")[0]
+        self._v_url = self._shorteners[1].shorten("http://www.example.com/v")[0]
+        self._is_gd.requests = self._v_gd.requests = 0
+
+    def testExtractAndRoute(self):
+        resolver = gdshortener.GDLookupResolver(self._shorteners)
+        code = self._is_url.rpartition("/")[2]
+        lines = ["GET /?ref={0} 200".format(self._is_url),
+                 "see IS.GD/{0}, https://www.is.gd/{0} and {1}.".format(code, self._v_url),
+                 b"this.gd/abcdef is.gd/stats.php?url=abc http://is.gd/missing"]
+        self.assertEqual(resolver.resolve(lines)[:2], [(self._is_url, "http://www.example.com/is"),
+                                                       (self._v_url, "http://www.example.com/v")])
+        missing = resolver.resolve(["is.gd/missing is.gd/" + code])
+        self.assertEqual(missing, [])
+        self.assertEqual((resolver.scanned, resolver.found, resolver.duplicates, resolver.failed), (4, 7, 4, 1))
+        self.assertEqual((self._is_gd.requests, self._v_gd.requests), (2, 1))
+
+    def testErrorsAreYielded(self):
+        resolver = gdshortener.GDLookupResolver(self._shorteners)
+        result = resolver.resolve(["http://is.gd/missing"])
+        self.assertEqual(result[0][0], "http://is.gd/missing")
+        self.assertIsInstance(result[0][1], gdshortener.GDShortURLError)
+
+    def testWindow(self):
+        resolver = gdshortener.GDLookupResolver(self._shorteners, window=1)
+        lines = [self._is_url, self._v_url, self._is_url, self._is_url]
+        self.assertEqual([short_url for short_url, _ in resolver.iresolve(lines)],
+                         [self._is_url, self._v_url, self._is_url])
+        self.assertEqual(resolver.duplicates, 1)
+        self.assertEqual(len(gdshortener.GDLookupResolver(self._shorteners, window=0).resolve(lines)), 4)
+
+    def testStreamingInput(self):
+        consumed = []
+
+        def lines():
+            for index in itertools.count():
+                consumed.append(index)
+                yield "{0} {1}".format(index, self._is_url)
+
+        resolver = gdshortener.GDLookupResolver(self._shorteners, window=0, max_workers=2)
+        self.assertEqual(len(list(itertools.islice(resolver.iresolve(lines()), 10))), 10)
+        self.assertLessEqual(len(consumed), 16)
+
+    def testMisuse(self):
+        with self.assertRaises(ValueError):
+            gdshortener.GDLookupResolver([])
+        with self.assertRaises(ValueError):
+            gdshortener.GDLookupResolver(self._shorteners + self._shorteners[:1])
+        with self.assertRaises(ValueError):
+            gdshortener.GDLookupResolver(self._shorteners, window=-1)
+
+
+class GDResultTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self._transport = gdshortener.GDFakeTransport()
+        self._shortener = gdshortener.GDBaseShortener(shortener_url="http://is.gd", session=self._transport)
+
+    def testShortenResult(self):
+        result = self._shortener.shorten("http://www.example.com/", log_stat=True)
+        self.assertIsInstance(result, gdshortener.GDShortenResult)
+        self.assertEqual(result, ("http://is.gd/1", "http://is.gd/stats.php?url=1"))
+        short_url, stats_url = result
+        self.assertEqual((short_url, stats_url, result[0], len(result)),
+                         (result.short_url, result.stats_url, short_url, 2))
+        self.assertEqual(hash(result), hash(result.as_tuple()))
+        unpickled = pickle.loads(pickle.dumps(result))
+        self.assertEqual((unpickled, type(unpickled)), (result, gdshortener.GDShortenResult))
+        self.assertFalse(hasattr(result, "__dict__"))
+        # Code written for the tuples of earlier versions keeps working
+        self.assertIsInstance(result, tuple)
+        self.assertEqual(json.loads(json.dumps(result)), ["http://is.gd/1", "http://is.gd/stats.php?url=1"])
+        self.assertEqual(result.short_code, "1")
+        other = gdshortener.GDShortenResult("https://is.gd/1", "http://is.gd/stats.php?url=1")
+        self.assertEqual(other.stats_url, "http://is.gd/stats.php?url=1")
+        self.assertNotEqual(other, result)
+        self.assertEqual(gdshortener.GDShortenResult("http://is.gd/2").as_tuple(), ("http://is.gd/2", None))
+
+    def testLookupResult(self):
+        result = gdshortener.GDLookupResult("http://is.gd/1", "http://www.example.com/")
+        self.assertEqual(result, ("http://is.gd/1", "http://www.example.com/"))
+        self.assertIsNone(result.error)
+        failed = gdshortener.GDLookupResult("http://is.gd/2", gdshortener.GDShortURLError())
+        self.assertIsInstance(failed.error, gdshortener.GDShortURLError)
+        self.assertEqual(failed.short_code, "2")
+
+    def testShortenTable(self):
+        urls = ["http://www.example.com/{0}".format(index) for index in range(5)]
+        urls += ["", ("http://www.example.com/s", None, True)]
+        table = self._shortener.shorten_table(urls, max_workers=2)
+        self.assertEqual((len(table), table.errors), (7, 1))
+        self.assertEqual(table[0], ("http://www.example.com/0", "http://is.gd/1", None, 0))
+        self.assertEqual(table.row(5), (None, None, None, 1))
+        self.assertEqual(table[-1], ("http://www.example.com/s", "http://is.gd/6", "http://is.gd/stats.php?url=6", 0))
+        buffers = table.to_buffers()
+        self.assertEqual(list(buffers["short_code"][0][:4]), [0, 1, 2, 3])
+        self.assertEqual((len(buffers["url"][0]), buffers["url"][0][-1]), (8, len(buffers["url"][1])))
+        self.assertEqual(buffers["short_prefix"][1], ["", "http://is.gd/", "http://is.gd/stats.php?url="])
+        self.assertEqual(list(buffers["error_code"]), [0, 0, 0, 0, 0, 1, 0])
+        del buffers
+        lookups = self._shortener.lookup_table(["http://is.gd/1", "http://is.gd/missing"])
+        self.assertEqual(list(lookups), [("http://www.example.com/0", "http://is.gd/1", None, 0),
+                                         (None, "http://is.gd/missing", None, 2)])
+
+    def testExport(self):
+        table = gdshortener.GDResultTable()
+        table.append_lookup("http://is.gd/abc", u"http://www.example.com/?q=è,\"x\"")
+        table.append_shortened("http://www.example.com/", gdshortener.GDGenericError())
+        table.append_shortened("http://www.example.com/b", ("http://v.gd/b", "http://v.gd/stats.php?url=b"))
+        rows = list(table)
+        self.assertEqual([row[3] for row in rows], [0, 4, 0])
+        output = io.StringIO()
+        table.write_csv(output)
+        parsed = list(csv.reader(io.StringIO(output.getvalue())))
+        self.assertEqual(parsed[0], list(gdshortener.GDResultTable.FIELDS))
+        self.assertEqual([row[3] for row in parsed[1:]], ["0", "4", "0"])
+        self.assertEqual([tuple(value or None for value in row[:3]) + (int(row[3]),) for row in parsed[1:]], rows)
+        output = io.StringIO()
+        table.write_jsonl(output)
+        self.assertEqual([tuple(json.loads(line)[field] for field in gdshortener.GDResultTable.FIELDS)
+                          for line in output.getvalue().splitlines()], rows)
+        self.assertGreater(table.nbytes, 0)
+
+    def testRejectedRowLeavesTableIntact(self):
+        table = gdshortener.GDResultTable()
+        table.append_shortened("http://www.example.com/a", ("http://is.gd/a", None))
+        with self.assertRaises(ValueError):
+            table.append_shortened("http://www.example.com/x", ("http://is.gd/x", "http://is.gd/stats.php?url=y"))
+        table.append_shortened("http://www.example.com/b", ("http://is.gd/b", None))
+        self.assertEqual(list(table), [("http://www.example.com/a", "http://is.gd/a", None, 0),
+                                       ("http://www.example.com/b", "http://is.gd/b", None, 0)])
+        buffers = table.to_buffers()
+        self.assertEqual(list(buffers["short_code"][0]), [0, 1, 2])
+        self.assertEqual(bytes(buffers["url"][1]), b"http://www.example.com/ahttp://www.example.com/b")
+
+
+class GDPrioritySchedulerTest(unittest.TestCase):
+
+    class GatedShortener(object):
+
+        def shorten(self, url, custom_url=None, log_stat=False, verify_ssl=True, timeout=None, deadline=None):
+            with self.lock:
+                self.calls.append(url)
+                self.running[url[0]] = self.running.get(url[0], 0) + 1
+                self.peak[url[0]] = max(self.peak.get(url[0], 0), self.running[url[0]])
+            self.gate.wait(5)
+            time.sleep(self.delay)
+            with self.lock:
+                self.running[url[0]] -= 1
+            return "http://is.gd/" + url, None
+
+        def __init__(self, delay=0.0, open_gate=False):
+            self.delay = delay
+            self.gate = threading.Event()
+            if open_gate:
+                self.gate.set()
+            self.lock = threading.Lock()
+            self.calls = []
+            self.running = {}
+            self.peak = {}
+
+    def _wait_for_calls(self, shortener, count):
+        for _ in range(500):
+            if len(shortener.calls) >= count:
+                return
+            time.sleep(0.01)
+        self.fail("The shortener was not called")
+
+    def testPriority(self):
+        shortener = self.GatedShortener()
+        with gdshortener.GDPriorityScheduler(shortener, max_concurrency=1) as scheduler:
+            futures = [scheduler.submit("b0")]
+            self._wait_for_calls(shortener, 1)
+            futures += [scheduler.submit("b{0}".format(index), priority="batch") for index in range(1, 4)]
+            futures.append(scheduler.submit("i0", priority="interactive"))
+            shortener.gate.set()
+            self.assertEqual(futures[-1].result(), ("http://is.gd/i0", None))
+        self.assertEqual(shortener.calls, ["b0", "i0", "b1", "b2", "b3"])
+        metrics = scheduler.metrics()
+        self.assertEqual((metrics["batch"]["completed"], metrics["interactive"]["completed"]), (4, 1))
+        self.assertGreater(metrics["batch"]["wait_max"], metrics["interactive"]["wait_p50"])
+
+    def testTenantsTakeTurns(self):
+        shortener = self.GatedShortener()
+        with gdshortener.GDPriorityScheduler(shortener, max_concurrency=1) as scheduler:
+            scheduler.submit("x")
+            self._wait_for_calls(shortener, 1)
+            for url in ("a1", "a2", "a3"):
+                scheduler.submit(url, tenant="a")
+            for url in ("b1", "b2"):
+                scheduler.submit(url, tenant="b")
+            shortener.gate.set()
+        self.assertEqual(shortener.calls, ["x", "a1", "b1", "a2", "b2", "a3"])
+
+    def testClassConcurrency(self):
+        shortener = self.GatedShortener(delay=0.05, open_gate=True)
+        with gdshortener.GDPriorityScheduler(shortener, max_concurrency=4) as scheduler:
+            batch = [scheduler.submit("b{0}".format(index)) for index in range(8)]
+            interactive = [scheduler.submit("i{0}".format(index), priority="interactive") for index in range(2)]
+            for future in interactive:
+                future.result()
+            self.assertFalse(all(future.done() for future in batch))
+        self.assertEqual(shortener.peak["b"], 2)
+        self.assertLess(scheduler.metrics()["interactive"]["wait_max"], 0.04)
+
+    def testDeadlines(self):
+        shortener = self.GatedShortener()
+        with gdshortener.GDPriorityScheduler(shortener, max_concurrency=1) as scheduler:
+            scheduler.submit("x")
+            self._wait_for_calls(shortener, 1)
+            late = scheduler.submit("y", deadline=0.05)
+            time.sleep(0.1)
+            shortener.gate.set()
+            self.assertRaises(gdshortener.GDTimeoutError, late.result)
+            self.assertNotIn("y", shortener.calls)
+            # Requests that could not complete in time are rejected at once
+            shortener.delay = 0.1
+            scheduler.shorten("z")
+            early = scheduler.submit("w", deadline=0.05)
+            self.assertTrue(early.done())
+            self.assertRaises(gdshortener.GDTimeoutError, early.result)
+        self.assertEqual(scheduler.metrics()["batch"]["rejected"], 2)
+
+    def testRateShare(self):
+        shortener = self.GatedShortener(open_gate=True)
+        classes = [gdshortener.GDPriorityClass("batch", rate_share=0.5)]
+        with gdshortener.GDPriorityScheduler(shortener, classes, max_concurrency=2, rate=10) as scheduler:
+            started = time.time()
+            for future in [scheduler.submit("b{0}".format(index)) for index in range(7)]:
+                future.result()
+            # Five requests in a burst, then five per second
+            self.assertGreaterEqual(time.time() - started, 0.35)
+
+    def testAggregateRate(self):
+        shortener = self.GatedShortener(open_gate=True)
+        with gdshortener.GDPriorityScheduler(shortener, max_concurrency=4, rate=20) as scheduler:
+            started = time.time()
+            futures = [scheduler.submit("i{0}".format(index), priority="interactive") for index in range(15)]
+            futures += [scheduler.submit("b{0}".format(index), priority="batch") for index in range(15)]
+            for future in futures:
+                future.result()
+            # Twenty requests in a burst, then twenty per second for both classes together
+            self.assertGreaterEqual(time.time() - started, 0.45)
+
+    def testShortenerAndClose(self):
+        transport = gdshortener.GDFakeTransport()
+        shortener = gdshortener.GDBaseShortener(shortener_url="http://is.gd", session=transport)
+        scheduler = gdshortener.GDPriorityScheduler(shortener)
+        self.assertEqual(scheduler.shorten("http://www.example.com/", log_stat=True, priority="interactive"),
+                         ("http://is.gd/1", "http://is.gd/stats.php?url=1"))
+        self.assertIsInstance(scheduler.submit("").exception(), gdshortener.GDMalformedURLError)
+        self.assertRaises(ValueError, scheduler.submit, "http://www.example.com/", priority="unknown")
+        scheduler.close()
+        self.assertEqual(scheduler.metrics()["batch"]["failed"], 1)
+        self.assertRaises(ValueError, scheduler.submit, "http://www.example.com/")
+        gated = self.GatedShortener()
+        scheduler = gdshortener.GDPriorityScheduler(gated, max_concurrency=1)
+        scheduler.submit("x")
+        self._wait_for_calls(gated, 1)
+        pending = scheduler.submit("y")
+        threading.Timer(0.1, gated.gate.set).start()
+        scheduler.close(wait=False)
+        self.assertIsInstance(pending.exception(), gdshortener.GDGenericError)
+
+
+class GDBulkTest(unittest.TestCase):
+
+    def setUp(self):
+        self._server = StubGDServer(latency=0.05).start()
+        self._tested = gdshortener.GDBaseShortener(shortener_url=self._server.url)
+
+    def tearDown(self):
+        self._tested.close()
+        self._server.stop()
+
+    def testShortenManyKeepsOrderAndErrors(self):
+        self._tested.shorten(url="http://www.example.com/taken", custom_url="taken")
+        results = self._tested.shorten_many([
+            "http://www.example.com/0",
+            ("http://www.example.com/1", "taken"),
+            ("http://www.example.com/2", None, True),
+            "",
+            "http://www.example.com/4",
+        ])
+        self.assertEqual(len(results), 5)
+        self.assertTrue(results[0][0].startswith(self._server.url))
+        self.assertIsNone(results[0][1])
+        self.assertIsInstance(results[1], gdshortener.GDShortURLError)
+        self.assertIsNotNone(results[2][1])
+        self.assertIsInstance(results[3], gdshortener.GDMalformedURLError)
+        self.assertEqual(self._tested.lookup_many([results[0][0], results[4][0]]),
+                         ["http://www.example.com/0", "http://www.example.com/4"])
+
+    def testShortenManyIsConcurrent(self):
+        urls = ["http://www.example.com/{0}".format(index) for index in range(40)]
+        started = time.time()
+        results = self._tested.shorten_many(urls, max_workers=10)
+        elapsed = time.time() - started
+        self.assertFalse([result for result in results if isinstance(result, gdshortener.GDBaseException)])
+        # Serially this takes 40 * latency = 2 seconds
+        self.assertLess(elapsed, 1.0)
+
+    def testBulkCallsReuseThreads(self):
+        for batch in range(20):
+            self._tested.shorten_many(["http://www.example.com/{0}/{1}".format(batch, index) for index in range(5)],
+                                      max_workers=5)
+        self.assertLessEqual(len(self._tested._session._sessions), 5)
+        self.assertLessEqual(self._server.counters['connections'], 5)
+        self._tested.close()
+        self.assertEqual(len(self._tested._session._sessions), 0)
+        # A closed shortener could still be used
+        self.assertEqual(len(self._tested.shorten_many(["http://www.example.com/after-close"])), 1)
+
+
+class GDRateLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self._server = StubGDServer().start()
+        self._directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self._server.stop()
+        shutil.rmtree(self._directory)
+
+    def testPacing(self):
+        limiter = gdshortener.GDRateLimiter(rate=20, capacity=1)
+        with gdshortener.GDBaseShortener(shortener_url=self._server.url, rate_limiter=limiter) as shortener:
+            started = time.time()
+            shortener.shorten_many(["http://www.example.com/{0}".format(index) for index in range(6)], max_workers=6)
+            # First token is in the bucket, the other five are refilled at 20 per second
+            self.assertGreaterEqual(time.time() - started, 0.24)
+
+    def testStatsCountDouble(self):
+        charged = []
+
+        class RecordingLimiter(gdshortener.GDRateLimiter):
+            def reserve(self, tokens=1):
+                charged.append(tokens)
+                return 0
+
+        with gdshortener.GDBaseShortener(shortener_url=self._server.url, rate_limiter=RecordingLimiter(1)) as shortener:
+            shortened_url, stat_url = shortener.shorten(url="http://www.example.com/", log_stat=True)
+            shortener.shorten(url="http://www.example.com/other")
+            shortener.lookup(shortened_url)
+        self.assertEqual(charged, [2, 1, 1])
+
+    @unittest.skipIf(gdshortener.fcntl is None, "fcntl is not available")
+    def testFileBucketIsShared(self):
+        path = os.path.join(self._directory, "bucket")
+        first = gdshortener.GDFileRateLimiter(path, rate=10, capacity=2)
+        second = gdshortener.GDFileRateLimiter(path, rate=10, capacity=2)
+        self.assertEqual(first.reserve(2), 0)
+        self.assertAlmostEqual(second.reserve(1), 0.1, delta=0.02)
+        self.assertAlmostEqual(first.reserve(1), 0.2, delta=0.02)
+        second.refund(2)
+        self.assertAlmostEqual(second.reserve(1), 0.1, delta=0.02)
+
+    def testGiveUpOnDeadlineRefundsTokens(self):
+        limiter = gdshortener.GDRateLimiter(rate=10, capacity=1)
+        with gdshortener.GDBaseShortener(shortener_url=self._server.url, rate_limiter=limiter) as shortener:
+            shortener.shorten("http://www.example.com/")
+            time.sleep(0.1)
+            # Empty the bucket
+            self.assertEqual(limiter.reserve(1), 0)
+            for index in range(5):
+                self.assertRaises(gdshortener.GDTimeoutError, shortener.shorten,
+                                  "http://www.example.com/{0}".format(index), deadline=0.05)
+            started = time.time()
+            shortener.shorten("http://www.example.com/next")
+            # Only the token of the first request is missing from the bucket
+            self.assertLess(time.time() - started, 0.15)
+
+
+class GDRetryPolicyTest(unittest.TestCase):
+
+    def setUp(self):
+        self._server = StubGDServer().start()
+        self._policy = gdshortener.GDRetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.05)
+        self._tested = gdshortener.GDBaseShortener(shortener_url=self._server.url, retry_policy=self._policy)
+
+    def tearDown(self):
+        self._tested.close()
+        self._server.stop()
+
+    def testRetryOnRateLimit(self):
+        self._server.inject(3, times=2)
+        shortened_url, stat_url = self._tested.shorten(url="http://www.example.com/")
+        self.assertTrue(shortened_url.startswith(self._server.url))
+        self.assertEqual(self._policy.retries, 2)
+        self.assertEqual(self._policy.retries_by_code, {3: 2})
+        self.assertEqual(self._server.counters['requests'], 3)
+
+    def testGiveUpAfterMaxAttempts(self):
+        self._server.inject(4, times=5)
+        self.assertRaises(gdshortener.GDGenericError, self._tested.lookup, "http://www.example.com/none")
+        self.assertEqual(self._server.counters['requests'], 3)
+        self.assertEqual(self._policy.exhausted, 1)
+
+    def testURLErrorsAreNotRetried(self):
+        self._server.inject(2)
+        self.assertRaises(gdshortener.GDShortURLError, self._tested.shorten, "http://www.example.com/", "taken")
+        self.assertEqual(self._policy.retries, 0)
+        self.assertEqual(self._server.counters['requests'], 1)
+        self.assertRaises(ValueError, gdshortener.GDRetryPolicy, retry_codes=(1, 3))
+
+
+class GDConcurrencyLimiterTest(unittest.TestCase):
+
+    def testIncreaseWhileInUse(self):
+        limiter = gdshortener.GDConcurrencyLimiter(initial_limit=2, max_limit=4)
+        for _ in range(20):
+            for started in [limiter.acquire() for _ in range(limiter.limit)]:
+                limiter.release(started)
+        self.assertEqual((limiter.limit, limiter.in_flight), (4, 0))
+        self.assertEqual([(limit, reason) for _, limit, reason in limiter.history], [(3, "increase"), (4, "increase")])
+        # A limit that is not in use does not grow
+        limiter = gdshortener.GDConcurrencyLimiter(initial_limit=2, max_limit=4)
+        for _ in range(20):
+            limiter.release(limiter.acquire())
+        self.assertEqual(limiter.limit, 2)
+
+    def testBackOffOncePerOverload(self):
+        limiter = gdshortener.GDConcurrencyLimiter(initial_limit=8)
+        started = [limiter.acquire() for _ in range(4)]
+        limiter.release(started[0], gdshortener.GDRateLimitError())
+        self.assertEqual(limiter.limit, 4)
+        # Requests sent before the decrease were caused by the same overload
+        limiter.release(started[1], gdshortener.GDRateLimitError())
+        limiter.release(started[2], gdshortener.GDShortURLError())
+        self.assertEqual(limiter.limit, 4)
+        limiter.release(limiter.acquire(), gdshortener.GDTimeoutError())
+        self.assertEqual(limiter.limit, 2)
+        self.assertEqual([reason for _, _, reason in limiter.history], [3, 6])
+        self.assertEqual(limiter.in_flight, 1)
+
+    def testBackOffOnLatencySpike(self):
+        limiter = gdshortener.GDConcurrencyLimiter(initial_limit=4)
+        for _ in range(5):
+            limiter.acquire()
+            limiter.release(time.time() - 0.01)
+        self.assertAlmostEqual(limiter.latency, 0.01, delta=0.005)
+        limiter.acquire()
+        limiter.release(time.time() - 0.1)
+        self.assertEqual(limiter.limit, 2)
+        self.assertEqual(limiter.history[-1][2], "latency")
+
+    def testAcquireWaitsForSlot(self):
+        limiter = gdshortener.GDConcurrencyLimiter(initial_limit=1)
+        started = limiter.acquire()
+        self.assertRaises(gdshortener.GDTimeoutError, limiter.acquire, 0.05)
+        acquired = []
+        thread = threading.Thread(target=lambda: acquired.append(limiter.acquire(5)))
+        thread.start()
+        time.sleep(0.05)
+        self.assertEqual(acquired, [])
+        limiter.release(started)
+        thread.join()
+        self.assertEqual((len(acquired), limiter.in_flight), (1, 1))
+
+    def testAsyncCallers(self):
+        limiter = gdshortener.GDConcurrencyLimiter(initial_limit=3, max_limit=3)
+        running = []
+        peak = []
+
+        async def call():
+            started = await limiter.acquire_async()
+            running.append(1)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.pop()
+            limiter.release(started)
+
+        async def scenario():
+            await asyncio.gather(*[call() for _ in range(12)])
+            held = [await limiter.acquire_async() for _ in range(3)]
+            with self.assertRaises(gdshortener.GDTimeoutError):
+                await limiter.acquire_async(0.05)
+            for started in held:
+                limiter.release(started)
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(scenario())
+        loop.close()
+        self.assertEqual((max(peak), len(peak), limiter.in_flight), (3, 12, 0))
+        self.assertEqual(len(limiter._waiters), 0)
+
+    def testShortenerBacksOff(self):
+        transport = gdshortener.GDFakeTransport()
+        limiter = gdshortener.GDConcurrencyLimiter(initial_limit=4)
+        with gdshortener.GDBaseShortener(session=transport, concurrency_limiter=limiter) as shortener:
+            transport.inject(3)
+            self.assertRaises(gdshortener.GDRateLimitError, shortener.shorten, "http://www.example.com/")
+            self.assertEqual((limiter.limit, limiter.history[-1][2]), (2, 3))
+            results = shortener.shorten_many(["http://www.example.com/{0}".format(index) for index in range(20)],
+                                             max_workers=8)
+        self.assertFalse(any(isinstance(result, gdshortener.GDBaseException) for result in results))
+        self.assertEqual(limiter.in_flight, 0)
+        self.assertRaises(ValueError, gdshortener.GDConcurrencyLimiter, initial_limit=0)
+        self.assertRaises(ValueError, gdshortener.GDConcurrencyLimiter, decrease=1)
+
+
+class GDTimeoutTest(unittest.TestCase):
+
+    def setUp(self):
+        self._server = StubGDServer(latency=0.5).start()
+
+    def tearDown(self):
+        self._server.stop()
+
+    def testReadTimeout(self):
+        with gdshortener.GDBaseShortener(shortener_url=self._server.url, timeout=(1, 0.1)) as shortener:
+            started = time.time()
+            self.assertRaises(gdshortener.GDTimeoutError, shortener.shorten, "http://www.example.com/")
+            self.assertLess(time.time() - started, 0.4)
+            # Per call override
+            self.assertIsNotNone(shortener.shorten("http://www.example.com/", timeout=2)[0])
+
+    def testDeadlineStopsRetries(self):
+        self._server.latency = 0
+        self._server.inject(3, times=10)
+        policy = gdshortener.GDRetryPolicy(max_attempts=10, base_delay=0.1, max_delay=0.1, jitter=False)
+        with gdshortener.GDBaseShortener(shortener_url=self._server.url, retry_policy=policy, deadline=0.35) as shortener:
+            started = time.time()
+            self.assertRaises(gdshortener.GDRateLimitError, shortener.shorten, "http://www.example.com/")
+            self.assertLess(time.time() - started, 0.35)
+            self.assertLess(self._server.counters['requests'], 5)
+
+    def testDeadlineCapsRateLimitWait(self):
+        self._server.latency = 0
+        limiter = gdshortener.GDRateLimiter(rate=1, capacity=1)
+        with gdshortener.GDBaseShortener(shortener_url=self._server.url, rate_limiter=limiter) as shortener:
+            shortener.shorten("http://www.example.com/")
+            self.assertRaises(gdshortener.GDTimeoutError, shortener.shorten, "http://www.example.com/other", deadline=0.5)
+
+
+class GDMemoryCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self._server = StubGDServer().start()
+
+    def tearDown(self):
+        self._server.stop()
+
+    def testShortenPopulatesBothDirections(self):
+        cache = gdshortener.GDMemoryCache()
+        with gdshortener.GDBaseShortener(shortener_url=self._server.url, cache=cache) as shortener:
+            first = shortener.shorten(url="http://www.example.com/")
+            self.assertEqual(shortener.shorten(url="http://www.example.com/"), first)
+            self.assertEqual(shortener.lookup(first[0]), "http://www.example.com/")
+            # A stats enabled shorten is a different request
+            self.assertIsNotNone(shortener.shorten(url="http://www.example.com/", log_stat=True)[1])
+        self.assertEqual(self._server.counters['requests'], 2)
+        self.assertEqual(cache.hits, 2)
+        self.assertEqual(cache.misses, 2)
+
+    def testLeastRecentlyUsedEviction(self):
+        cache = gdshortener.GDMemoryCache(maxsize=2)
+        cache.set_lookup(("http://is.gd", "a"), "http://a/")
+        cache.set_lookup(("http://is.gd", "b"), "http://b/")
+        cache.get_lookup(("http://is.gd", "a"))
+        cache.set_lookup(("http://is.gd", "c"), "http://c/")
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get_lookup(("http://is.gd", "b")))
+        self.assertEqual(cache.get_lookup(("http://is.gd", "a")), "http://a/")
+
+    def testExpiration(self):
+        cache = gdshortener.GDMemoryCache(ttl=0.05)
+        cache.set_lookup(("http://is.gd", "a"), "http://a/")
+        self.assertEqual(cache.get_lookup(("http://is.gd", "a")), "http://a/")
+        time.sleep(0.1)
+        self.assertIsNone(cache.get_lookup(("http://is.gd", "a")))
+
+
+def _fill_sqlite_cache(path, offset):
+    cache = gdshortener.GDSQLiteCache(path)
+    for index in range(offset, offset + 200):
+        cache.set_shortened(("http://is.gd", "http://www.example.com/{0}".format(index), None, False),
+                            ("http://is.gd/c{0}".format(index), None))
+    cache.close()
+
+
+class GDSQLiteCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self._server = StubGDServer().start()
+        self._directory = tempfile.mkdtemp()
+        self._path = os.path.join(self._directory, "cache.sqlite")
+
+    def tearDown(self):
+        self._server.stop()
+        shutil.rmtree(self._directory)
+
+    def testSurvivesRestart(self):
+        cache = gdshortener.GDSQLiteCache(self._path)
+        with gdshortener.GDBaseShortener(shortener_url=self._server.url, cache=cache) as shortener:
+            shortened_url, stat_url = shortener.shorten(url="http://www.example.com/", custom_url="custom")
+        cache.close()
+        cache = gdshortener.GDSQLiteCache(self._path)
+        with gdshortener.GDBaseShortener(shortener_url=self._server.url, cache=cache) as shortener:
+            self.assertEqual(shortener.shorten(url="http://www.example.com/", custom_url="custom"), (shortened_url, None))
+            self.assertEqual(shortener.lookup(shortened_url), "http://www.example.com/")
+        self.assertEqual(self._server.counters['requests'], 1)
+        self.assertEqual(cache.hits, 2)
+        cache.close()
+
+    def testBulkImport(self):
+        cache = gdshortener.GDSQLiteCache(self._path)
+        stored = cache.import_shortened(((("http://is.gd", "http://www.example.com/{0}".format(index), None, False),
+                                          ("http://is.gd/c{0}".format(index), None)) for index in range(2500)),
+                                        batch_size=1000)
+        self.assertEqual(stored, 2500)
+        self.assertEqual(cache.get_shortened(("http://is.gd", "http://www.example.com/42", None, False)),
+                         ("http://is.gd/c42", None))
+        self.assertEqual(cache.get_lookup(("http://is.gd", "c2499")), "http://www.example.com/2499")
+        self.assertIsNone(cache.get_lookup(("http://v.gd", "c2499")))
+        cache.close()
+
+    def testConcurrentProcesses(self):
+        processes = [multiprocessing.Process(target=_fill_sqlite_cache, args=(self._path, offset))
+                     for offset in (0, 200, 400, 600)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual([process.exitcode for process in processes], [0, 0, 0, 0])
+        cache = gdshortener.GDSQLiteCache(self._path)
+        self.assertEqual(len(cache), 1600)
+        cache.close()
+
+    def testOpenWhileAnotherWriterHoldsTheDatabase(self):
+        import sqlite3
+        holder = sqlite3.connect(self._path, check_same_thread=False)
+        holder.execute("CREATE TABLE other (value TEXT)")
+        holder.execute("BEGIN IMMEDIATE")
+        releaser = threading.Timer(0.3, holder.commit)
+        releaser.start()
+        try:
+            # Switching to WAL fails at once while another connection is writing
+            cache = gdshortener.GDSQLiteCache(self._path, busy_timeout=5)
+        finally:
+            releaser.join()
+            holder.close()
+        cache.set_lookup(("http://is.gd", "abc"), "http://www.example.com/")
+        self.assertEqual(cache.get_lookup(("http://is.gd", "abc")), "http://www.example.com/")
+        cache.close()
+
+    def testConnectionsOfExitedThreadsAreClosed(self):
+        cache = gdshortener.GDSQLiteCache(self._path)
+        with gdshortener.GDBaseShortener(shortener_url=self._server.url, cache=cache) as shortener:
+            for batch in range(30):
+                shortener.shorten_many(["http://www.example.com/{0}/{1}".format(batch, index) for index in range(10)],
+                                       max_workers=5)
+                self.assertLessEqual(len(cache._connections), 6)
+        self.assertEqual(len(cache), 600)
+        cache.close()
+        self.assertEqual(len(cache._connections), 0)
+
+
+class GDCoalescingTest(unittest.TestCase):
+
+    def setUp(self):
+        self._server = StubGDServer(latency=0.2).start()
+        self._tested = gdshortener.GDBaseShortener(shortener_url=self._server.url)
+
+    def tearDown(self):
+        self._tested.close()
+        self._server.stop()
+
+    def _concurrently(self, function, *args):
+        outcomes = []
+
+        def worker():
+            try:
+                outcomes.append(function(*args))
+            except gdshortener.GDBaseException as ex:
+                outcomes.append(ex)
+
+        threads = [threading.Thread(target=worker) for index in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    def testIdenticalCallsShareRequest(self):
+        outcomes = self._concurrently(self._tested.shorten, "http://www.example.com/")
+        self.assertEqual(len(set(outcomes)), 1)
+        self.assertEqual(self._server.counters['requests'], 1)
+        self.assertEqual(self._tested.coalesced, 7)
+
+    def testIdenticalCallsShareError(self):
+        self._server.inject(3)
+        outcomes = self._concurrently(self._tested.lookup, "http://www.example.com/c1")
+        self.assertEqual([type(outcome) for outcome in outcomes], [gdshortener.GDRateLimitError] * 8)
+        self.assertEqual(self._server.counters['requests'], 1)
+
+    def testAsyncLeaderCancelled(self):
+        calls = []
+
+        async def call():
+            calls.append(None)
+            await asyncio.sleep(0.2)
+            return "http://www.example.com/"
+
+        async def scenario():
+            flight = gdshortener._AsyncSingleFlight()
+            leader = asyncio.ensure_future(flight.do("key", None, call))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(flight.do("key", None, call))
+            await asyncio.sleep(0.05)
+            leader.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            self.assertEqual(await follower, "http://www.example.com/")
+            self.assertEqual(await flight.do("key", None, call), "http://www.example.com/")
+            self.assertEqual(flight._calls, {})
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(scenario())
+        loop.close()
+        self.assertEqual(len(calls), 2)
+
+    def testDisabled(self):
+        with gdshortener.GDBaseShortener(shortener_url=self._server.url, coalesce=False) as shortener:
+            self._concurrently(shortener.shorten, "http://www.example.com/")
+            self.assertEqual(shortener.coalesced, 0)
+        self.assertEqual(self._server.counters['requests'], 8)
+
+
+class GDCommandLineTest(unittest.TestCase):
+
+    def setUp(self):
+        self._server = StubGDServer().start()
+        self._directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self._server.stop()
+        shutil.rmtree(self._directory)
+
+    def _write(self, name, content):
+        path = os.path.join(self._directory, name)
+        with open(path, "w") as stream:
+            stream.write(content)
+        return path
+
+    def _read_jsonl(self, path):
+        with open(path) as stream:
+            return [json.loads(line) for line in stream]
+
+    def testShortenAndLookup(self):
+        source = self._write("urls.txt", "http://www.example.com/0\n\n# comment\nhttp://www.example.com/1\n")
+        output = os.path.join(self._directory, "out.jsonl")
+        self.assertEqual(gdshortener.main([source, "-o", output, "--shortener-url", self._server.url, "--log-stat"]), 0)
+        rows = self._read_jsonl(output)
+        self.assertEqual([row["url"] for row in rows], ["http://www.example.com/0", "http://www.example.com/1"])
+        self.assertTrue(all(row["stats_url"] for row in rows))
+
+        short_urls = self._write("short.csv", "short_url\n{0}\n{1}/missing\n".format(rows[1]["short_url"], self._server.url))
+        output = os.path.join(self._directory, "lookup.csv")
+        self.assertEqual(gdshortener.main([short_urls, "-o", output, "--output-format", "csv", "--lookup",
+                                           "--shortener-url", self._server.url]), 1)
+        with open(output) as stream:
+            rows = list(csv.DictReader(stream))
+        self.assertEqual(rows[0]["url"], "http://www.example.com/1")
+        self.assertEqual(rows[1]["error_code"], "2")
+
+    def testResumeFromCheckpoint(self):
+        source = self._write("urls.jsonl", "".join(json.dumps({"url": "http://www.example.com/{0}".format(index)}) + "\n"
+                                                   for index in range(5)))
+        output = self._write("out.jsonl", "previous\n")
+        checkpoint = self._write("checkpoint", "3")
+        gdshortener.main([source, "-o", output, "--checkpoint", checkpoint, "--checkpoint-every", "1",
+                          "--shortener-url", self._server.url])
+        with open(output) as stream:
+            lines = stream.read().splitlines()
+        self.assertEqual(lines[0], "previous")
+        self.assertEqual([json.loads(line)["url"] for line in lines[1:]], ["http://www.example.com/3", "http://www.example.com/4"])
+        with open(checkpoint) as stream:
+            self.assertEqual(stream.read(), "5 {0}".format(os.path.getsize(output)))
+        self.assertEqual(self._server.counters["requests"], 2)
+
+    def testResumeDropsResultsWrittenAfterCheckpoint(self):
+        source = self._write("urls.txt", "".join("http://www.example.com/{0}\n".format(index) for index in range(5)))
+        output = self._write("out.jsonl", "first\nsecond\nafter checkpoint\n")
+        checkpoint = self._write("checkpoint", "2 {0}".format(len("first\nsecond\n")))
+        gdshortener.main([source, "-o", output, "--checkpoint", checkpoint, "--checkpoint-every", "2",
+                          "--shortener-url", self._server.url])
+        with open(output) as stream:
+            lines = stream.read().splitlines()
+        self.assertEqual(lines[:2], ["first", "second"])
+        self.assertEqual([json.loads(line)["url"] for line in lines[2:]],
+                         ["http://www.example.com/{0}".format(index) for index in range(2, 5)])
+
+    def testResumeFromJournal(self):
+        source = self._write("urls.txt", "http://www.example.com/0\nhttp://www.example.com/1\n")
+        output = os.path.join(self._directory, "out.jsonl")
+        journal = os.path.join(self._directory, "journal")
+        arguments = [source, "-o", output, "--journal", journal, "--shortener-url", self._server.url]
+        self.assertEqual(gdshortener.main(arguments), 0)
+        first = self._read_jsonl(output)
+        self.assertEqual(gdshortener.main(arguments), 0)
+        self.assertEqual(self._read_jsonl(output), first)
+        self.assertEqual(self._server.counters["requests"], 2)
+
+    def testAdaptiveConcurrency(self):
+        source = self._write("urls.txt", "".join("http://www.example.com/{0}\n".format(index) for index in range(10)))
+        output = os.path.join(self._directory, "out.jsonl")
+        self.assertEqual(gdshortener.main([source, "-o", output, "--adaptive", "-w", "4", "--shortener-url",
+                                           self._server.url]), 0)
+        self.assertEqual(len(self._read_jsonl(output)), 10)
+
+
+class GDDecodingTest(unittest.TestCase):
+
+    def setUp(self):
+        self._orjson = gdshortener._load_dependency("orjson")
+
+    def tearDown(self):
+        gdshortener.orjson = self._orjson
+
+    def testDecodeFromBytes(self):
+        content = u'{"url": "http://www.example.com/\u00e8"}'.encode("utf-8")
+        for backend in (self._orjson, None):
+            gdshortener.orjson = backend
+            self.assertEqual(gdshortener._decode_json(content), {"url": u"http://www.example.com/\u00e8"})
+
+    def testResults(self):
+        self.assertEqual(gdshortener._lookup_result({"url": "http://www.example.com/a%20b?c=1&amp;d=2"}),
+                         "http://www.example.com/a b?c=1&d=2")
+        self.assertEqual(gdshortener._lookup_result({"url": "http://www.example.com/"}), "http://www.example.com/")
+        self.assertEqual(gdshortener._shorten_result({"shorturl": "https://is.gd/abc"}, "https://is.gd", True),
+                         ("https://is.gd/abc", "https://is.gd/stats.php?url=abc"))
+        self.assertEqual(gdshortener._shorten_result({"shorturl": "https://is.gd/abc"}, "https://is.gd", False),
+                         ("https://is.gd/abc", None))
+
+    def testErrorTable(self):
+        for error_code, error_class in ((1, gdshortener.GDMalformedURLError), (2, gdshortener.GDShortURLError),
+                                        (3, gdshortener.GDRateLimitError), (4, gdshortener.GDGenericError)):
+            with self.assertRaises(error_class):
+                gdshortener._lookup_result({"errorcode": error_code, "errormessage": "error"})
+        with self.assertRaises(gdshortener.GDBaseException) as context:
+            gdshortener._shorten_result({"errorcode": 9, "errormessage": "unknown"}, "https://is.gd", False)
+        self.assertEqual(context.exception.error_code, 9)
+
+
+class GDBenchmarkTest(unittest.TestCase):
+
+    def testSmoke(self):
+        from benchmarks import run_benchmarks
+        report = run_benchmarks.run(operations=20, workers=4, latency=0, error_rate=0.1, label="smoke")
+        self.assertEqual(report["label"], "smoke")
+        for name in ("shorten", "lookup", "shorten_many", "lookup_many"):
+            result = report["results"][name]
+            self.assertEqual(result["operations"], 20)
+            self.assertTrue(result["p50"] <= result["p95"] <= result["p99"])
+        self.assertTrue(sum(result["errors"] for result in report["results"].values()) > 0)
+        self.assertIn("shorten_many", run_benchmarks.compare(report, json.loads(json.dumps(report))))
+
+    def testFakeTransport(self):
+        from benchmarks import run_benchmarks
+        report = run_benchmarks.run(operations=20, workers=4, transport="fake")
+        self.assertEqual(sorted(report["results"]), ["lookup", "lookup_many", "shorten", "shorten_many"])
+        self.assertEqual(sum(result["errors"] for result in report["results"].values()), 0)
+
+    def testInstrumentationSmoke(self):
+        from benchmarks import instrumentation_benchmarks
+        results = instrumentation_benchmarks.run(number=10, repeat=1)
+        self.assertEqual(sorted(results), ["cache_hit", "fake_request"])
+        self.assertEqual(sorted(results["cache_hit"]), ["bare", "disabled", "disabled_overhead_ns", "memory", "prometheus"])
+
+    def testDecodeSmoke(self):
+        from benchmarks import decode_benchmarks
+        results = decode_benchmarks.run(number=10, repeat=1)
+        self.assertEqual(sorted(results), ["error", "lookup", "lookup_escaped", "shorten"])
+        self.assertTrue(all(result["current_ns"] > 0 for result in results.values()))
+
+    def testValidationSmoke(self):
+        from benchmarks import validation_benchmarks
+        results = validation_benchmarks.run(size=10, repeat=1)
+        self.assertEqual(sorted(results), ["canonical", "custom_url", "denormalized", "invalid"])
+
+    def testProcessSmoke(self):
+        from benchmarks import process_benchmarks
+        report = process_benchmarks.run(operations=50, processes=(1, 2), chunk_size=10)
+        self.assertEqual(report["processes"][1]["scaling"], 1.0)
+        self.assertEqual(report["processes"][2]["operations"], 50)
+
+    def testJournalSmoke(self):
+        from benchmarks import journal_benchmarks
+        results = journal_benchmarks.run(lines=100, sync_every=(1, 10))
+        self.assertEqual(sorted(results), [1, 10])
+        self.assertEqual(results[1]["bytes"], results[10]["bytes"])
+
+    @unittest.skipIf(sys.version_info < (3, 7), "python -X importtime needs Python 3.7")
+    def testImportSmoke(self):
+        from benchmarks import import_benchmarks
+        results = import_benchmarks.run(runs=1)
+        self.assertEqual(results["heavy_modules"], [])
+        self.assertGreater(results["gdshortener+network"]["best_ms"], results["gdshortener"]["best_ms"])
+
+    def testAliasSmoke(self):
+        from benchmarks import alias_benchmarks
+        results = alias_benchmarks.run(allocations=100, stems=2, taken=3, max_workers=2)
+        self.assertEqual(results["warm"]["collision_rate"], 0)
+        self.assertGreater(results["cold"]["collision_rate"], 0)
+
+    def testResolverSmoke(self):
+        from benchmarks import resolver_benchmarks
+        results = resolver_benchmarks.run(lines=(500, 1000), codes=20, window=100, max_workers=2)
+        self.assertEqual([result["resolved"] for result in results], [40, 40])
+        self.assertLess(results[1]["lookups_per_found"], results[0]["lookups_per_found"])
+
+    def testConcurrencySmoke(self):
+        from benchmarks import concurrency_benchmarks
+        results = concurrency_benchmarks.run(urls=200, workers=(2, 32), capacity=4, reject_above=8, service_time=0.001)
+        self.assertEqual(results[0]["rate_limited"], 0)
+        self.assertGreater(results[1]["rate_limited"], results[2]["rate_limited"])
+        self.assertTrue(results[2]["adaptive"])
+
+    def testResultSmoke(self):
+        from benchmarks import result_benchmarks
+        report = result_benchmarks.run(results=2000)
+        self.assertLess(report["table"]["bytes_per_result"], report["results"]["bytes_per_result"])
+        self.assertLess(report["table"]["bytes_per_result"], report["tuples"]["bytes_per_result"])
+
+    def testSchedulerSmoke(self):
+        from benchmarks import scheduler_benchmarks
+        fifo, scheduler = scheduler_benchmarks.run(batch=200, interactive=5, workers=4, service_time=0.002,
+                                                   interval=0.005)
+        self.assertLess(scheduler["interactive_p95_ms"], fifo["interactive_p95_ms"])
+        self.assertGreater(scheduler["batch_throughput"], 0)
+
+    def testPercentile(self):
+        from benchmarks import run_benchmarks
+        values = list(range(1, 101))
+        self.assertEqual(run_benchmarks.percentile(values, 0.5), 50)
+        self.assertEqual(run_benchmarks.percentile(values, 0.99), 99)
+        self.assertEqual(run_benchmarks.percentile([7], 0.95), 7)
+        self.assertIsNone(run_benchmarks.percentile([], 0.5))
+
+
+@unittest.skipIf(gdshortener._load_dependency("aiohttp") is None, "aiohttp is not installed")
+class GDAsyncTest(unittest.TestCase):
+
+    def setUp(self):
+        self._server = StubGDServer(latency=0.05).start()
+        self._loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self._loop.close()
+        self._server.stop()
+
+    def testShortenAndLookup(self):
+        async def scenario():
+            async with gdshortener.AsyncGDBaseShortener(shortener_url=self._server.url) as shortener:
+                shortened_url, stat_url = await shortener.shorten(url="http://www.example.com/?a=1&b=2", log_stat=True)
+                self.assertEqual(stat_url, "{0}/stats.php?url={1}".format(self._server.url, shortened_url.rsplit('/', 1)[1]))
+                self.assertEqual(await shortener.lookup(shortened_url), "http://www.example.com/?a=1&b=2")
+                with self.assertRaises(gdshortener.GDMalformedURLError):
+                    await shortener.shorten(url="")
+                with self.assertRaises(gdshortener.GDShortURLError):
+                    await shortener.shorten(url="http://www.example.com/other", custom_url=shortened_url.rsplit('/', 1)[1])
+
+        self._loop.run_until_complete(scenario())
+
+    def testTimeout(self):
+        async def scenario():
+            self._server.latency = 0.5
+            async with gdshortener.AsyncGDBaseShortener(shortener_url=self._server.url, timeout=(1, 0.1)) as shortener:
+                with self.assertRaises(gdshortener.GDTimeoutError):
+                    await shortener.shorten(url="http://www.example.com/")
+                self.assertIsNotNone((await shortener.shorten(url="http://www.example.com/", timeout=2))[0])
+
+        self._loop.run_until_complete(scenario())
+
+    def testIdenticalCallsShareRequest(self):
+        async def scenario():
+            async with gdshortener.AsyncGDBaseShortener(shortener_url=self._server.url) as shortener:
+                results = await asyncio.gather(*[shortener.shorten(url="http://www.example.com/") for index in range(5)])
+                return results, shortener.coalesced
+
+        results, coalesced = self._loop.run_until_complete(scenario())
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(coalesced, 4)
+        self.assertEqual(self._server.counters['requests'], 1)
+
+    def testShortenManyIsConcurrent(self):
+        async def scenario():
+            async with gdshortener.AsyncGDBaseShortener(shortener_url=self._server.url) as shortener:
+                started = time.time()
+                results = await shortener.shorten_many(["http://www.example.com/{0}".format(index) for index in range(40)] + [""],
+                                                       max_concurrency=10)
+                elapsed = time.time() - started
+                lookups = await shortener.lookup_many([result[0] for result in results[:-1]])
+            return results, elapsed, lookups
+
+        results, elapsed, lookups = self._loop.run_until_complete(scenario())
+        self.assertIsInstance(results[-1], gdshortener.GDMalformedURLError)
+        self.assertEqual(lookups, ["http://www.example.com/{0}".format(index) for index in range(40)])
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(self._server.counters['connections'], 10)
+
+
 if __name__ == "__main__":
     # import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
@@ -0,0 +1,211 @@
+"""
+    Local stub of the `is.gd - v.gd <http://is.gd/developers.php>`_ API, used to test and benchmark the module without network access.
+"""
+
+import itertools
+import json
+import random
+import threading
+import time
+
+from html import escape
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs
+
+_ALPHABET_ = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+_STATS_PAGE_ = '''<html>
+<head><title>Statistics for {short_url}</title></head>
+<body>
+<h1>Statistics for <a href="{short_url}">{short_url}</a></h1>
+<p>Original URL: <a href="{url}">{url}</a></p>
+<p>Total clicks: <b>{clicks}</b></p>
+</body>
+</html>
+'''
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.stub.count('connections')
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        stub = self.server.stub
+        stub.count('requests')
+        if stub.latency:
+            time.sleep(stub.latency)
+        parsed = urlparse(self.path)
+        params = dict((key, values[0]) for key, values in parse_qs(parsed.query).items())
+        if parsed.path == '/stats.php':
+            page = stub.stats(params)
+            self._reply(200 if page is not None else 404, 'text/html; charset=utf-8', (page or '').encode('utf-8'))
+            return
+        if parsed.path not in ('/create.php', '/forward.php'):
+            self._reply(404, 'text/plain', b'')
+            return
+        failure = stub.next_failure()
+        if failure is not None:
+            response = {'errorcode': failure, 'errormessage': 'Injected error {0}'.format(failure)}
+        elif parsed.path == '/create.php':
+            response = stub.create(params)
+        else:
+            response = stub.forward(params)
+        self._reply(200, 'application/json', json.dumps(response).encode('utf-8'))
+
+    def _reply(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StubGDServer(object):
+    """
+        Threaded HTTP server that mimics ``create.php``, ``forward.php`` and ``stats.php`` of .gd services.
+
+        Short codes are generated from a counter, so the same URL always maps to the same code.
+        Counters of accepted connections and served requests are kept in :attr:`counters`.
+
+        :param latency: Seconds waited before answering every request
+        :type latency: float.
+        :param error_rate: Probability that an API request is answered with an error picked from *error_codes*
+        :type error_rate: float.
+        :param error_codes: Error codes injected at random
+        :type error_codes: tuple of int.
+        :param rate_limit: API requests accepted every second; further requests get error code 3 (``None`` for no limit)
+        :type rate_limit: int.
+        :param seed: Seed of the random generator used to inject errors
+        :type seed: int.
+    """
+
+    @property
+    def url(self):
+        return 'http://{0}:{1}'.format(*self._server.server_address)
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    def inject(self, error_code, times=1):
+        """
+            Answer the next *times* API requests with *error_code*.
+        """
+        with self._lock:
+            self._failures.extend([error_code] * times)
+
+    def next_failure(self):
+        """
+            Return the error code the current API request has to be answered with, or ``None``.
+        """
+        with self._lock:
+            if self._failures:
+                return self._failures.pop(0)
+            if self.rate_limit is not None:
+                now = time.time()
+                if now - self._window_start >= 1:
+                    self._window_start, self._window_requests = now, 0
+                self._window_requests += 1
+                if self._window_requests > self.rate_limit:
+                    self.counters['rate_limited'] = self.counters.get('rate_limited', 0) + 1
+                    return 3
+            if self.error_rate and self._random.random() < self.error_rate:
+                return self._random.choice(self.error_codes)
+        return None
+
+    def create(self, params):
+        url = params.get('url')
+        if not url:
+            return {'errorcode': 1, 'errormessage': 'Please specify a URL to shorten.'}
+        with self._lock:
+            code = params.get('shorturl')
+            if code is not None:
+                if self._urls.get(code, url) != url:
+                    return {'errorcode': 2, 'errormessage': 'The shortened URL you picked already exists.'}
+            elif url in self._codes:
+                code = self._codes[url]
+            else:
+                code = self._next_code()
+            self._urls[code] = url
+            self._codes.setdefault(url, code)
+            if params.get('logstats') == '1':
+                self.clicks.setdefault(code, 0)
+        return {'shorturl': '{0}/{1}'.format(self.url, code)}
+
+    def forward(self, params):
+        code = params.get('shorturl', '').rstrip('/').rsplit('/', 1)[-1]
+        with self._lock:
+            url = self._urls.get(code)
+            if code in self.clicks:
+                self.clicks[code] += 1
+        if url is None:
+            return {'errorcode': 2, 'errormessage': 'The shortened URL you specified does not exist.'}
+        return {'url': url}
+
+    def stats(self, params):
+        """
+            Return the stats page of a stats enabled short code, or ``None`` if it has no stats.
+        """
+        code = params.get('url', '')
+        with self._lock:
+            if code not in self.clicks:
+                return None
+            return _STATS_PAGE_.format(short_url=escape('{0}/{1}'.format(self.url, code)), url=escape(self._urls[code]),
+                                       clicks=self.clicks[code])
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _next_code(self):
+        # Custom short codes could have taken a generated one already: those are skipped
+        for value in itertools.count(len(self._urls) + 1):
+            code = ''
+            while value:
+                value, digit = divmod(value, len(_ALPHABET_))
+                code = _ALPHABET_[digit] + code
+            if 'c' + code not in self._urls:
+                return 'c' + code
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0, error_rate=0, error_codes=(1, 2, 3, 4), rate_limit=None,
+                 seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_codes = tuple(error_codes)
+        self.rate_limit = rate_limit
+        self.counters = {}
+        self.clicks = {}
+        self._urls = {}
+        self._codes = {}
+        self._failures = []
+        self._random = random.Random(seed)
+        self._window_start = time.time()
+        self._window_requests = 0
+        self._lock = threading.Lock()
+        self._server = _ThreadingHTTPServer((host, port), _StubHandler)
+        self._server.stub = self
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True